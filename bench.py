@@ -0,0 +1,286 @@
+"""滤镜 / 编码性能对比
+
+用法示例:
+    python -m bench blur                      # 全分辨率模糊 vs 1/2、1/4、1/8 分辨率模糊
+    python -m bench blur --mode 16:9 --size 1080x1920 --seconds 20 --downscale 1,4 --encode
+    python -m bench suite -o before.json      # 完整矩阵：样片 × 比例 × 排版 × preset × 并发
+    python -m bench suite --sources 720_square --cases pad,blur60 --jobs 1 -o after.json
+    python -m bench compare before.json after.json --threshold 5
+
+输入是 ffmpeg 自带的 lavfi testsrc2 / sine 测试源，不需要样片也不需要联网；blur 默认输出到 null
+复用器只测滤镜，加 --encode 时连同 libx264 编码一起计时。suite 先用测试源生成固定的样片
+(缓存在 cache_dir()/bench 下)，再用 VideoWorker 实际生成的命令编码到 null 复用器，记录 fps、
+墙钟时间、CPU 时间和峰值内存。compare 对比两份结果，fps 下降或 CPU 时间上升超过阈值即标记为退化。
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import subprocess
+import threading
+
+from worker import VideoWorker, get_ffmpeg_exe, probe_video, cache_dir, ffmpeg_version, NO_WINDOW
+from progress import run_ffmpeg, ProgressParser
+
+# suite 使用的固定样片：名称 -> (宽, 高)
+SOURCES = {
+    "4k_landscape": (3840, 2160),
+    "1080_portrait": (1080, 1920),
+    "720_square": (720, 720),
+}
+# 排版 / 滤镜用例：名称 -> 叠加到任务配置上的参数
+CASES = {
+    "pad": {},
+    "blur20": {"blur": True, "blur_sigma": 20},
+    "blur60": {"blur": True, "blur_sigma": 60},
+    "blur100": {"blur": True, "blur_sigma": 100},
+    "eq": {"brightness": 0.1, "contrast": 1.2, "saturation": 1.3},
+    "rotate90": {"rotate": 90},
+}
+SAMPLE_RATE = 30
+
+
+def lavfi_input(size, seconds, rate=30):
+    return ['-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={rate}:duration={seconds}"]
+
+
+def run_graph(vf, size, seconds, encode=False, preset="ultrafast", threads=0):
+    """用测试图案跑一遍滤镜链，返回 {"frames", "elapsed", "fps", "speed"}；失败时抛 RuntimeError"""
+    cmd = [get_ffmpeg_exe(), '-y', *lavfi_input(size, seconds), '-vf', vf, '-threads', str(threads)]
+    if encode:
+        cmd += ['-c:v', 'libx264', '-preset', preset, '-crf', '25']
+    cmd += ['-f', 'null', '-']
+    last = {}
+    start = time.time()
+    code, err = run_ffmpeg(cmd, float(seconds), last.update)
+    elapsed = time.time() - start
+    if code != 0:
+        raise RuntimeError(f"FFmpeg Error {code}: {err.splitlines()[-1] if err else ''}")
+    frames = last.get('frame', 0)
+    return {
+        "frames": frames,
+        "elapsed": round(elapsed, 3),
+        "fps": round(frames / elapsed, 1) if elapsed else 0.0,
+        "speed": round(seconds / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def bench_blur(args):
+    base = None
+    print(f"{'downscale':>9}  {'fps':>8}  {'speed':>7}  {'相对':>6}")
+    for factor in args.downscale:
+        cfg = {"mode": args.mode, "blur": True, "blur_sigma": args.sigma, "blur_downscale": factor}
+        vf = VideoWorker("bench", cfg, args.seconds).build_filter()
+        r = run_graph(vf, args.size, args.seconds, args.encode, args.preset)
+        if base is None:
+            base = r["fps"] or 1.0
+        print(f"{factor:>9}  {r['fps']:>8.1f}  {r['speed']:>6.2f}x  {r['fps'] / base:>5.2f}x")
+    return 0
+
+
+def make_source(name, seconds, directory):
+    """生成 (或复用) 固定的测试样片：testsrc2 画面 + 440Hz sine 音频，H.264 + AAC"""
+    w, h = SOURCES[name]
+    path = os.path.join(directory, f"{name}_{seconds}s.mp4")
+    if os.path.exists(path):
+        return path
+    tmp = path + ".tmp.mp4"
+    cmd = [get_ffmpeg_exe(), '-y', '-v', 'error',
+           '-f', 'lavfi', '-i', f"testsrc2=size={w}x{h}:rate={SAMPLE_RATE}:duration={seconds}",
+           '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+           '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(SAMPLE_RATE * 2), '-pix_fmt', 'yuv420p',
+           '-c:a', 'aac', '-b:a', '128k', '-shortest', '-fflags', '+bitexact', tmp]
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, creationflags=NO_WINDOW)
+    if result.returncode != 0:
+        raise RuntimeError(f"生成样片失败 {name}: {result.stderr.decode('utf-8', 'replace').strip()}")
+    os.replace(tmp, path)
+    return path
+
+
+def _measure(cmd):
+    """运行一个 ffmpeg 进程，返回 (returncode, 实际输出帧数, CPU 秒, 峰值 RSS MB)。
+
+    帧数取自 -progress 的 frame=，与 run_graph 相同；wait4 不可用 (Windows) 时后两项为 None。
+    """
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, creationflags=NO_WINDOW)
+    parser = ProgressParser()
+    for raw in iter(process.stdout.readline, b''):
+        parser.feed_line(raw.decode('ascii', 'replace'))
+    process.stdout.close()
+    frames = parser.last['frame'] if parser.last else 0
+    if not hasattr(os, "wait4"):
+        return process.wait(), frames, None, None
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 上 ru_maxrss 单位是 KB，macOS 上是字节
+    rss = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return process.returncode, frames, usage.ru_utime + usage.ru_stime, rss
+
+
+def run_case(src, meta, config, jobs):
+    """同一命令并发跑 jobs 份，返回一条结果记录"""
+    worker = VideoWorker(src, dict(config, passthrough=False, segment=False), meta["duration"], meta)
+    cmd = worker.build_command('-')
+    cmd = cmd[:-1] + ['-f', 'null', '-']
+    stats = [None] * jobs
+
+    def one(i):
+        stats[i] = _measure(cmd)
+
+    start = time.time()
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(jobs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.time() - start
+    failed = [code for code, _, _, _ in stats if code != 0]
+    if failed:
+        raise RuntimeError(f"FFmpeg Error {failed[0]}: {' '.join(cmd)}")
+    # 按实际输出的帧数计算，滤镜丢帧 / 补帧或源比预期短时 fps 也准确
+    frames = sum(f for _, f, _, _ in stats)
+    cpu = [c for _, _, c, _ in stats if c is not None]
+    rss = [r for _, _, _, r in stats if r is not None]
+    return {
+        "frames": frames,
+        "fps": round(frames / wall, 2) if wall else 0.0,
+        "wall": round(wall, 3),
+        "cpu": round(sum(cpu), 3) if cpu else None,
+        "peak_rss_mb": round(max(rss), 1) if rss else None,
+    }
+
+
+def bench_suite(args):
+    directory = args.work or os.path.join(cache_dir(), "bench")
+    os.makedirs(directory, exist_ok=True)
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "ffmpeg": ffmpeg_version(),
+            "seconds": args.seconds,
+        },
+        "results": [],
+    }
+    for name in args.sources:
+        src = make_source(name, args.seconds, directory)
+        # 直接探测，不走元数据缓存，保证每次结果都来自当前样片
+        meta = probe_video(src, use_cache=False)
+        for mode in args.modes:
+            for case in args.cases:
+                for preset in args.presets:
+                    for jobs in args.jobs:
+                        config = dict(CASES[case], mode=mode, preset=preset, crf=25)
+                        key = f"{name}/{mode}/{case}/{preset}/j{jobs}"
+                        try:
+                            r = run_case(src, meta, config, jobs)
+                        except RuntimeError as e:
+                            r = {"error": str(e)}
+                        report["results"].append(dict(id=key, source=name, mode=mode, case=case,
+                                                      preset=preset, jobs=jobs, **r))
+                        if "error" in r:
+                            print(f"{key:<44} 失败: {r['error']}")
+                        else:
+                            print(f"{key:<44} {r['fps']:>8.1f} fps  {r['wall']:>7.2f}s  "
+                                  f"cpu {r['cpu'] or 0:>7.2f}s  rss {r['peak_rss_mb'] or 0:>7.1f}MB")
+                        sys.stdout.flush()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+    return 1 if any("error" in r for r in report["results"]) else 0
+
+
+def _pct(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare_reports(before, after, threshold=5.0):
+    """按用例 id 对比两份 suite 结果，返回 [(id, 旧 fps, 新 fps, fps 变化%, cpu 变化% 或 None, 是否退化)]"""
+    old = {r["id"]: r for r in before["results"] if "error" not in r}
+    rows = []
+    for r in after["results"]:
+        o = old.get(r["id"])
+        if o is None or "error" in r:
+            continue
+        fps = _pct(o["fps"], r["fps"])
+        cpu = _pct(o["cpu"], r["cpu"]) if o.get("cpu") and r.get("cpu") else None
+        regressed = fps < -threshold or (cpu is not None and cpu > threshold)
+        rows.append((r["id"], o["fps"], r["fps"], fps, cpu, regressed))
+    return rows
+
+
+def bench_compare(args):
+    reports = []
+    for path in (args.before, args.after):
+        with open(path, 'r', encoding='utf-8') as f:
+            reports.append(json.load(f))
+    rows = compare_reports(reports[0], reports[1], args.threshold)
+    for key, old, new, fps, cpu, regressed in rows:
+        cpu_text = f"cpu {cpu:+6.1f}%" if cpu is not None else "cpu    n/a"
+        print(f"{key:<44} {old:>8.1f} -> {new:>8.1f} fps  {fps:+6.1f}%  {cpu_text}"
+              + ("  <-- 退化" if regressed else ""))
+    bad = sum(1 for row in rows if row[-1])
+    print(f"{len(rows)} 个用例，{bad} 个退化 (阈值 {args.threshold}%)")
+    return 1 if bad else 0
+
+
+def _int_list(text):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def _choice_list(choices):
+    def parse(text):
+        items = [x.strip() for x in text.split(",") if x.strip()]
+        for x in items:
+            if x not in choices:
+                raise argparse.ArgumentTypeError(f"未知取值 {x}，可选: {', '.join(choices)}")
+        return items
+    return parse
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="python -m bench", description="滤镜 / 编码性能对比")
+    sub = p.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("blur", help="对比不同 blur_downscale 下背景模糊滤镜链的速度")
+    b.add_argument("--mode", choices=["9:16", "16:9"], default="9:16")
+    b.add_argument("--size", default="1920x1080", help="测试图案分辨率，默认横屏 1080p")
+    b.add_argument("--seconds", type=int, default=10)
+    b.add_argument("--sigma", type=int, default=60)
+    b.add_argument("--downscale", type=_int_list, default=[1, 2, 4, 8], help="逗号分隔，第一个作为基准")
+    b.add_argument("--encode", action="store_true", help="连同 libx264 编码一起计时")
+    b.add_argument("--preset", default="ultrafast")
+    b.set_defaults(func=bench_blur)
+
+    s = sub.add_parser("suite", help="完整基准矩阵，结果写入 JSON")
+    s.add_argument("-o", "--output", default="bench.json")
+    s.add_argument("--sources", type=_choice_list(list(SOURCES)), default=list(SOURCES))
+    s.add_argument("--modes", type=_choice_list(["9:16", "16:9"]), default=["9:16", "16:9"])
+    s.add_argument("--cases", type=_choice_list(list(CASES)), default=list(CASES))
+    s.add_argument("--presets", type=lambda t: [x for x in t.split(",") if x], default=["ultrafast", "fast"])
+    s.add_argument("--jobs", type=_int_list, default=[1, 2], help="并发数列表")
+    s.add_argument("--seconds", type=int, default=5, help="样片时长")
+    s.add_argument("--work", help="样片目录，默认 cache_dir()/bench")
+    s.set_defaults(func=bench_suite)
+
+    c = sub.add_parser("compare", help="对比两份 suite 结果，有退化时返回 1")
+    c.add_argument("before")
+    c.add_argument("after")
+    c.add_argument("--threshold", type=float, default=5.0, help="fps 下降 / CPU 时间上升超过该百分比即为退化")
+    c.set_defaults(func=bench_compare)
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,700 @@
+"""多机分布式编码：任务服务器 + 无界面工作节点 (TCP)
+
+服务器跑在发起批处理的机器上 (python -m engine ./clips --listen 0.0.0.0:7655 --token 口令，
+或 python main1.py --listen 0.0.0.0:7655 并设置环境变量 YASUO_CLUSTER_TOKEN)，默认本机也作为一个节点参与编码。
+只给端口时只监听本机回环地址；监听其他地址必须设置口令，否则任何能连上的机器都能领取 (流式模式下还会收到) 源文件。
+其他机器运行工作节点连进来分担任务:
+    python -m cluster server-host:7655 --jobs 4                      # 共享存储：按同样的路径读源文件、写输出
+    python -m cluster server-host:7655 --path-map /mnt/nas=Z:/nas    # 挂载点不同时替换路径前缀 (可重复)
+    python -m cluster server-host:7655 --stream                      # 没有共享存储：源文件和输出经连接传输
+节点用与本机相同的 VideoWorker / RenditionWorker 构造 ffmpeg 命令，进度实时回传给服务器汇总；
+任务结束时附带在节点上测得的性能数据 (telemetry.JobStats)，服务器补上排队时间后记录。
+
+协议：每条消息是一行 JSON；带 "size" 字段的消息后面紧跟 size 字节的文件内容。
+  节点 -> 服务器: hello {name, slots, stream, token} / ping / start {id, output} / progress {id, percent, ...}
+                  / output {id, index, suffix, size}+内容 / done {id, output, stats} / error {id, message, cancelled, stats}
+  服务器 -> 节点: job {id, file, config, meta, size?}+内容 / cancel / pause / resume {id} / pong
+心跳：节点每 HEARTBEAT 秒发一次 ping，服务器回 pong；任何一方超过 DEAD_AFTER 秒没收到对方的消息就断开连接。
+服务器把断开节点上的任务放回队首重新分派 (每个任务最多 MAX_ATTEMPTS 次)，节点取消手上的任务后重连。
+每次分派用新的任务 id，已经重新分派的任务不会再被旧节点的迟到消息改写。
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import shutil
+import socket
+import argparse
+import ipaddress
+import itertools
+import threading
+from collections import deque
+
+from worker import VideoWorker, RenditionWorker, probe_video, output_path, cache_dir, CANCELLED
+from outputs import get_allocator, temp_path
+from jobctl import JobControl
+from telemetry import JobStats
+import supervisor
+
+PORT = 7655
+HEARTBEAT = 2.0
+DEAD_AFTER = 10.0
+# 节点失联时任务重新分派的次数上限 (含第一次)
+MAX_ATTEMPTS = 3
+# 节点断线后重连的间隔
+RECONNECT = 3.0
+CHUNK = 1024 * 1024
+LOST = "节点失联"
+
+
+def parse_address(text, host="127.0.0.1"):
+    """"host:port" / ":port" / "port" -> (host, port)，没有主机名时为本机回环地址"""
+    text = str(text)
+    name, sep, port = text.rpartition(":")
+    return (name or host) if sep else host, int(port)
+
+
+def is_loopback(host):
+    """host 是否只在本机可达 (localhost / 127.x / ::1)"""
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        pass
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (OSError, ValueError):
+        return False
+
+
+class Channel:
+    """一条连接：JSON 行消息，可附带文件内容；send 可在任意线程调用，recv 只在读线程调用。
+
+    last_active 为最近一次收到数据或对方收下一块文件内容的时间 (对方不读时 sendall 会阻塞)，
+    心跳据此判断连接是否还活着：单向传大文件期间对方的心跳消息可能排在后面。
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.rfile = sock.makefile("rb")
+        self.last_active = time.time()
+        self._lock = threading.Lock()
+
+    def send(self, msg, path=None):
+        size = os.path.getsize(path) if path else None
+        if size is not None:
+            msg = dict(msg, size=size)
+        line = (json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            self.sock.sendall(line)
+            if path:
+                with open(path, "rb") as f:
+                    while size > 0:
+                        chunk = f.read(min(CHUNK, size))
+                        if not chunk:
+                            # 发送途中文件被截短：补零保持协议同步，接收方按失败处理
+                            chunk = bytes(min(CHUNK, size))
+                        self.sock.sendall(chunk)
+                        size -= len(chunk)
+                        self.last_active = time.time()
+
+    def recv(self):
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("connection closed")
+        self.last_active = time.time()
+        return json.loads(line)
+
+    def recv_file(self, path, size):
+        """把消息后面的 size 字节写到 path (path 为 None 时读掉丢弃)"""
+        f = open(path, "wb") if path else None
+        try:
+            while size > 0:
+                chunk = self.rfile.read(min(CHUNK, size))
+                if not chunk:
+                    raise ConnectionError("connection closed")
+                if f:
+                    f.write(chunk)
+                size -= len(chunk)
+                self.last_active = time.time()
+        finally:
+            if f:
+                f.close()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _Node:
+    def __init__(self, chan, name, slots, stream):
+        self.chan = chan
+        self.name = name
+        self.slots = slots
+        self.stream = stream
+        self.running = set()     # 分派 id
+        self.alive = True
+
+
+def _suffixes(job):
+    """任务各输出的文件名后缀 (与节点上 RenditionWorker.suffixes 一致)；单输出为 [None]"""
+    config = dict(job["config"])
+    renditions = config.pop("renditions", None)
+    if not renditions:
+        return [None]
+    return RenditionWorker(job["file"], renditions, config, 0).suffixes()
+
+
+class JobServer:
+    """任务服务器：接受节点连接，把批处理任务分派给有空闲名额的节点并汇总进度。
+
+    run() 的事件与 engine.BatchEngine 相同 (start / progress / done / error / cancelled，带 node 字段)，
+    另有 node (节点加入 / 离开) 和 requeued (节点失联，任务重新排队)。
+    """
+    def __init__(self, address, token=None, emit=None):
+        self.address = address
+        self.token = token
+        self.nodes = []
+        self._cond = threading.Condition()
+        self._queue = deque()       # 等待分派的任务
+        self._jobs = {}             # 源路径 -> 任务状态
+        self._dispatched = {}       # 分派 id -> 任务状态
+        self._emit = emit           # emit(event, **fields)
+        self._journal = None
+        self._telemetry = None
+        self._ids = itertools.count(1)
+        self._sock = None
+        self._closed = False
+
+    def start(self):
+        """开始监听，返回实际绑定的地址；监听非回环地址而没有口令时抛出 ValueError"""
+        if not self.token and not is_loopback(self.address[0]):
+            raise ValueError(f"监听 {self.address[0]} 需要设置口令 (--token 或环境变量 YASUO_CLUSTER_TOKEN)")
+        self._sock = socket.create_server(self.address)
+        self.address = self._sock.getsockname()[:2]
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._monitor, daemon=True).start()
+        return self.address
+
+    def close(self):
+        self._closed = True
+        if self._sock is not None:
+            self._sock.close()
+        with self._cond:
+            nodes = list(self.nodes)
+        for node in nodes:
+            node.chan.close()
+
+    def capacity(self):
+        with self._cond:
+            return sum(n.slots for n in self.nodes)
+
+    def emit(self, event, **fields):
+        if self._emit:
+            self._emit(event, **fields)
+
+    # ---- 批处理 ----
+    def run(self, jobs, emit=None, journal=None, telemetry=None):
+        """jobs 为 [(源路径, config, meta)]，meta 为 None 时由节点探测；阻塞到全部结束，按输入顺序返回结果"""
+        with self._cond:
+            self._emit = emit or self._emit
+            self._journal = journal
+            self._telemetry = telemetry
+            order = []
+            now = time.time()
+            for path, config, meta in jobs:
+                job = {"file": path, "config": config, "meta": meta, "attempts": 0, "node": None,
+                       "id": None, "outputs": [], "start": None, "result": None, "strategy": None, "queued": now,
+                       "reported": False}
+                self._jobs[path] = job
+                self._queue.append(job)
+                order.append(job)
+        self._dispatch()
+        with self._cond:
+            while not all(job["reported"] for job in order):
+                self._cond.wait()
+            for job in order:
+                self._jobs.pop(job["file"], None)
+        return [job["result"] for job in order]
+
+    def _dispatch(self):
+        sends = []
+        with self._cond:
+            while self._queue:
+                free = [n for n in self.nodes if len(n.running) < n.slots]
+                if not free:
+                    break
+                node = max(free, key=lambda n: n.slots - len(n.running))
+                job = self._queue.popleft()
+                job["attempts"] += 1
+                job["id"] = str(next(self._ids))
+                job["node"] = node
+                job["start"] = time.time()
+                self._dispatched[job["id"]] = job
+                node.running.add(job["id"])
+                sends.append((node, job))
+        for node, job in sends:
+            # 流式传输源文件可能很久，放到单独的线程里发送
+            threading.Thread(target=self._send_job, args=(node, job), daemon=True).start()
+
+    def _send_job(self, node, job):
+        msg = {"type": "job", "id": job["id"], "file": job["file"], "config": job["config"], "meta": job["meta"]}
+        if node.stream and not os.path.isfile(job["file"]):
+            self._finish(job, error=f"source not found: {job['file']}")
+            return
+        try:
+            node.chan.send(msg, job["file"] if node.stream else None)
+        except OSError as e:
+            self._drop(node, str(e))
+
+    def _finish(self, job, ok=False, output=None, error=None, cancelled=False, stats=None):
+        with self._cond:
+            if job["result"] is not None:
+                return
+            self._dispatched.pop(job["id"], None)
+            node = job["node"]
+            if node is not None:
+                node.running.discard(job["id"])
+            elapsed = round(time.time() - job["start"], 3) if job["start"] else 0
+            job["result"] = {"file": job["file"], "ok": ok, "output": output, "error": error,
+                             "strategy": job["strategy"], "node": node.name if node else None,
+                             "attempts": job["attempts"], "elapsed": elapsed}
+            if stats:
+                # 节点只知道它那边的排队时间，加上在服务器队列里等待分派的时间
+                wait = stats.get("queue_wait", 0) + (job["start"] - job["queued"] if job["start"] else 0)
+                stats = job["result"]["stats"] = dict(stats, file=job["file"], queue_wait=round(wait, 3),
+                                                      node=job["result"]["node"], attempts=job["attempts"])
+        path = job["file"]
+        if stats and self._telemetry:
+            self._telemetry.job(stats)
+        if self._journal:
+            if ok:
+                self._journal.finish(path, output)
+            else:
+                self._journal.fail(path, error)
+        fields = {"node": node.name} if node else {}
+        if ok:
+            self.emit("done", file=path, output=output, elapsed=elapsed, strategy=job["strategy"], **fields)
+        elif cancelled:
+            self.emit("cancelled", file=path, elapsed=elapsed, **fields)
+        else:
+            self.emit("error", file=path, message=error, elapsed=elapsed, **fields)
+        # 日志、遥测和事件都处理完才让 run() 返回，summary 不会抢在最后一个 done 之前
+        with self._cond:
+            job["reported"] = True
+            self._cond.notify_all()
+        self._dispatch()
+
+    def _requeue(self, job, reason):
+        # 调用方持有 self._cond
+        self._dispatched.pop(job["id"], None)
+        for output in job["outputs"]:
+            get_allocator().release(output)
+        job["outputs"], job["node"] = [], None
+        if job["attempts"] >= MAX_ATTEMPTS:
+            return False
+        self._queue.appendleft(job)
+        return True
+
+    # ---- 任务控制 (可在任意线程调用) ----
+    def cancel(self, path):
+        with self._cond:
+            job = self._jobs.get(path)
+            if job is None or job["result"] is not None:
+                return False
+            queued = job in self._queue
+            if queued:
+                self._queue.remove(job)
+            node = job["node"]
+        if queued:
+            self._finish(job, error=CANCELLED, cancelled=True)
+        elif node is not None:
+            self._send(node, {"type": "cancel", "id": job["id"]})
+        return True
+
+    def pause(self, path):
+        return self._control(path, "pause", "paused")
+
+    def resume(self, path):
+        return self._control(path, "resume", "resumed")
+
+    def _control(self, path, command, event):
+        with self._cond:
+            job = self._jobs.get(path)
+            node = job and job["result"] is None and job["node"]
+        if not node:
+            return False
+        self._send(node, {"type": command, "id": job["id"]})
+        self.emit(event, file=path, node=node.name)
+        return True
+
+    def promote(self, path):
+        with self._cond:
+            job = self._jobs.get(path)
+            if job is None or job not in self._queue:
+                return False
+            self._queue.remove(job)
+            self._queue.appendleft(job)
+            return True
+
+    def state(self, path):
+        """"queued" / "running" / None"""
+        with self._cond:
+            job = self._jobs.get(path)
+            if job is None or job["result"] is not None:
+                return None
+            return "running" if job["node"] is not None else "queued"
+
+    def _send(self, node, msg):
+        try:
+            node.chan.send(msg)
+        except OSError as e:
+            self._drop(node, str(e))
+
+    # ---- 连接 ----
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, addr = self._sock.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(Channel(sock), addr), daemon=True).start()
+
+    def _serve(self, chan, addr):
+        node = None
+        try:
+            chan.sock.settimeout(DEAD_AFTER)
+            hello = chan.recv()
+            chan.sock.settimeout(None)
+            if hello.get("type") != "hello" or (
+                    self.token and not hmac.compare_digest(str(hello.get("token") or "").encode(), self.token.encode())):
+                chan.close()
+                return
+            node = _Node(chan, hello.get("name") or f"{addr[0]}:{addr[1]}", max(1, int(hello.get("slots", 1))),
+                         bool(hello.get("stream")))
+            with self._cond:
+                self.nodes.append(node)
+            self.emit("node", node=node.name, state="joined", slots=node.slots, stream=node.stream)
+            self._dispatch()
+            while True:
+                self._handle(node, chan.recv())
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if node is not None:
+                self._drop(node, str(e) or type(e).__name__)
+            else:
+                chan.close()
+
+    def _drop(self, node, reason):
+        with self._cond:
+            if not node.alive:
+                return
+            node.alive = False
+            if node in self.nodes:
+                self.nodes.remove(node)
+            lost = [self._dispatched[i] for i in node.running if i in self._dispatched]
+            node.running.clear()
+            failed = [job for job in lost if not self._requeue(job, reason)]
+        node.chan.close()
+        self.emit("node", node=node.name, state="lost", reason=reason)
+        for job in lost:
+            if job not in failed:
+                if self._journal: self._journal.queue(job["file"], job["config"])
+                self.emit("requeued", file=job["file"], node=node.name, attempts=job["attempts"])
+        for job in failed:
+            self._finish(job, error=f"{LOST}: {reason}")
+        self._dispatch()
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(HEARTBEAT)
+            with self._cond:
+                dead = [n for n in self.nodes if time.time() - n.chan.last_active > DEAD_AFTER]
+            for node in dead:
+                self._drop(node, "heartbeat timeout")
+
+    def _handle(self, node, msg):
+        kind = msg.get("type")
+        if kind == "ping":
+            node.chan.send({"type": "pong"})
+            return
+        with self._cond:
+            job = self._dispatched.get(msg.get("id"))
+            if job is not None and job["node"] is not node:
+                job = None
+        if kind == "output":
+            # 流式模式的输出：服务器这边分配输出名，内容写到临时文件，完整收到后替换上去
+            if job is None:
+                node.chan.recv_file(None, msg["size"])
+                return
+            # 后缀由服务器按任务参数推算，不信任节点发来的 (可能含 ../ 写到输出目录之外)
+            suffixes = _suffixes(job)
+            index = msg.get("index")
+            if index != len(job["outputs"]) or index >= len(suffixes) or msg.get("suffix") != suffixes[index]:
+                raise ValueError(f"unexpected output {index!r} {msg.get('suffix')!r}")
+            output = output_path(job["file"], job["config"], suffixes[index])
+            job["outputs"].append(output)
+            if len(job["outputs"]) == 1 and self._journal:
+                self._journal.start(job["file"], output)
+            node.chan.recv_file(temp_path(output), msg["size"])
+            return
+        if job is None:
+            return
+        path = job["file"]
+        if kind == "start":
+            job["strategy"] = msg.get("strategy")
+            if msg.get("output") is not None:
+                job["outputs"] = msg["output"] if isinstance(msg["output"], list) else [msg["output"]]
+                if self._journal: self._journal.start(path, msg["output"])
+            self.emit("start", file=path, node=node.name, duration=msg.get("duration"),
+                      threads=msg.get("threads"), strategy=job["strategy"], attempts=job["attempts"])
+        elif kind == "progress":
+            fields = {k: v for k, v in msg.items() if k not in ("type", "id")}
+            self.emit("progress", file=path, node=node.name, **fields)
+        elif kind == "done":
+            output = msg.get("output")
+            if node.stream:
+                # 节点报告的是它工作目录里的路径，换成服务器这边收到的输出
+                outputs = job["outputs"]
+                for p in outputs:
+                    get_allocator().commit(p)
+                output = outputs if isinstance(output, list) else outputs[0]
+            self._finish(job, ok=True, output=output, stats=msg.get("stats"))
+        elif kind == "error":
+            if node.stream:
+                for output in job["outputs"]:
+                    get_allocator().release(output)
+            self._finish(job, error=msg.get("message"), cancelled=msg.get("cancelled", False), stats=msg.get("stats"))
+
+
+class WorkerNode:
+    """无界面工作节点：连接服务器，领取任务在本机编码，把进度和结果发回去。
+
+    共享存储模式下源文件和输出按 (path_map 替换后的) 同一路径读写；stream=True 时源文件随任务
+    一起传来，编码结果写在 work_dir 里，完成后传回服务器再删除。
+    """
+    def __init__(self, address, jobs=None, name=None, stream=False, path_map=None, work_dir=None, token=None):
+        from scheduler import EncodeScheduler
+        self.address = address
+        self.name = name or socket.gethostname()
+        self.stream = stream
+        self.path_map = path_map or []      # [(服务器路径前缀, 本机路径前缀)]
+        self.work_dir = work_dir or os.path.join(cache_dir(), "cluster")
+        self.token = token
+        self.scheduler = EncodeScheduler(max_jobs=jobs, adaptive=False)
+        # 服务器按 slots 分派，本机调度器只负责分线程和绑核，不再另外限制并发
+        self.slots = jobs or self.scheduler.target
+        self.scheduler.target = self.slots
+        self.controls = {}
+        self._chan = None
+        self._stopped = False
+
+    # ---- 路径映射 ----
+    def _local(self, path):
+        for remote, local in self.path_map:
+            if path.startswith(remote):
+                return os.path.normpath(local + path[len(remote):])
+        return path
+
+    def _remote(self, path):
+        if isinstance(path, list):
+            return [self._remote(p) for p in path]
+        for remote, local in self.path_map:
+            local = os.path.normpath(local)
+            if path.startswith(local):
+                sep = "\\" if "\\" in remote and "/" not in remote else "/"
+                return remote + path[len(local):].replace(os.sep, sep)
+        return path
+
+    # ---- 连接 ----
+    def start(self):
+        """在后台线程里运行 serve_forever"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        if self._chan is not None:
+            self._chan.close()
+
+    def serve_forever(self):
+        while not self._stopped:
+            try:
+                sock = socket.create_connection(self.address, timeout=DEAD_AFTER)
+            except OSError:
+                time.sleep(RECONNECT)
+                continue
+            sock.settimeout(None)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            chan = self._chan = Channel(sock)
+            try:
+                chan.send({"type": "hello", "name": self.name, "slots": self.slots, "stream": self.stream,
+                           "token": self.token, "pid": os.getpid()})
+                threading.Thread(target=self._heartbeat, args=(chan,), daemon=True).start()
+                while True:
+                    self._handle(chan, chan.recv())
+            except (OSError, ValueError):
+                pass
+            finally:
+                chan.close()
+                # 服务器会把这些任务重新分派，这里不再继续跑
+                for control in list(self.controls.values()):
+                    control.cancel()
+            if not self._stopped:
+                time.sleep(RECONNECT)
+
+    def _heartbeat(self, chan):
+        while True:
+            time.sleep(HEARTBEAT)
+            if time.time() - chan.last_active > DEAD_AFTER:
+                chan.close()
+                return
+            try:
+                chan.send({"type": "ping"})
+            except OSError:
+                return
+
+    def _handle(self, chan, msg):
+        kind = msg.get("type")
+        if kind == "job":
+            source = None
+            if "size" in msg:
+                directory = os.path.join(self.work_dir, msg["id"])
+                os.makedirs(directory, exist_ok=True)
+                source = os.path.join(directory, os.path.basename(msg["file"].replace("\\", "/")))
+                chan.recv_file(source, msg["size"])
+            threading.Thread(target=self._run_job, args=(chan, msg, source), daemon=True).start()
+        elif kind in ("cancel", "pause", "resume"):
+            control = self.controls.get(msg.get("id"))
+            if control is not None:
+                getattr(control, kind)()
+
+    def _send(self, chan, msg, path=None):
+        try:
+            chan.send(msg, path)
+        except OSError:
+            # 连接已断：serve_forever 会取消任务并重连，服务器会重新分派
+            pass
+
+    def _run_job(self, chan, msg, source):
+        job_id = msg["id"]
+        received = time.time()
+        slot = self.scheduler.acquire()
+        control = self.controls[job_id] = JobControl()
+        control.slot = slot
+        path = source or self._local(msg["file"])
+        stats = JobStats(path, received)
+        control.usage = stats.usage
+        result = {}
+        try:
+            config = dict(msg["config"], threads=slot.threads)
+            if source:
+                config["out_dir"] = os.path.join(os.path.dirname(source), "out")
+            elif config.get("out_dir"):
+                config["out_dir"] = self._local(config["out_dir"])
+            meta = msg.get("meta") or probe_video(path)
+            if not meta:
+                raise ValueError("no video stream")
+            stats.probe_time = time.time() - received - stats.queue_wait
+            renditions = config.pop("renditions", None)
+            if renditions:
+                w = RenditionWorker(path, renditions, config, meta["duration"], meta)
+            else:
+                w = VideoWorker(path, config, meta["duration"], meta)
+            last = {}
+
+            def on_start(out):
+                self._send(chan, {"type": "start", "id": job_id, "output": None if source else self._remote(out),
+                                  "duration": meta["duration"], "threads": slot.threads, "strategy": w.strategy})
+
+            def on_stats(ev, index=None):
+                if not index:
+                    stats.feed(ev)
+                if ev['percent'] != last.get(index):
+                    last[index] = ev['percent']
+                    extra = {} if index is None else {"rendition": index}
+                    self._send(chan, {"type": "progress", "id": job_id, "percent": ev['percent'], "fps": ev['fps'],
+                                      "speed": ev['speed'], "eta": ev['eta'], "out_time": ev['out_time'],
+                                      "total_size": ev['total_size'], **extra})
+
+            w.on_start = on_start
+            w.on_stats = on_stats if not renditions else lambda i, ev: on_stats(ev, i)
+            w.on_fps = slot.report_fps
+            w.on_finished = lambda out: result.update(output=out)
+            w.on_error = lambda err: result.update(error=err)
+            w.control = control
+            stats.begin()
+            w.run()
+            stats.end()
+            status = "ok" if "output" in result else "cancelled" if control.cancelled else "error"
+            # 流式模式下输出随后删除，先在这里统计大小
+            result["stats"] = stats.record(status, meta["duration"], result.get("output"), strategy=w.strategy,
+                                           threads=slot.threads, preset=config.get("preset"))
+            if "output" in result and source:
+                outputs = result["output"] if renditions else [result["output"]]
+                suffixes = w.suffixes() if renditions else [None]
+                for i, (out, suffix) in enumerate(zip(outputs, suffixes)):
+                    self._send(chan, {"type": "output", "id": job_id, "index": i, "suffix": suffix}, out)
+        except Exception as e:
+            result["error"] = CANCELLED if control.cancelled else str(e)
+            result.setdefault("stats", stats.record("cancelled" if control.cancelled else "error",
+                                                    threads=slot.threads))
+        finally:
+            self.controls.pop(job_id, None)
+            self.scheduler.release(slot)
+            if source:
+                shutil.rmtree(os.path.dirname(source), ignore_errors=True)
+        if "output" in result:
+            self._send(chan, {"type": "done", "id": job_id, "output": self._remote(result["output"]),
+                              "stats": result["stats"]})
+        else:
+            self._send(chan, {"type": "error", "id": job_id, "message": result.get("error"),
+                              "cancelled": control.cancelled, "stats": result.get("stats")})
+
+
+def parse_path_map(text):
+    """/mnt/nas=Z:/nas -> ("/mnt/nas", "Z:/nas")"""
+    remote, sep, local = text.partition("=")
+    if not sep or not remote or not local:
+        raise argparse.ArgumentTypeError(f"无效的路径映射: {text}")
+    return remote, local
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="python -m cluster", description="分布式编码的工作节点")
+    p.add_argument("server", help="任务服务器地址 host:port")
+    p.add_argument("-j", "--jobs", type=int, help="本节点同时运行的任务数，默认按 CPU 核数")
+    p.add_argument("--name", help="节点名，默认主机名")
+    p.add_argument("--stream", action="store_true", help="不使用共享存储：源文件和输出经连接传输")
+    p.add_argument("--path-map", action="append", type=parse_path_map, default=[],
+                   help="服务器路径前缀=本机路径前缀，可重复")
+    p.add_argument("--work-dir", help="--stream 时存放源文件和输出的目录，默认缓存目录下的 cluster")
+    p.add_argument("--token", default=os.environ.get("YASUO_CLUSTER_TOKEN"),
+                   help="与服务器 --token 相同的口令 (默认取环境变量 YASUO_CLUSTER_TOKEN)")
+    p.add_argument("--nice", type=int, default=0, help="ffmpeg 的 nice 值")
+    p.add_argument("--mem-limit", type=int, help="每个 ffmpeg 进程的内存上限 (MB)")
+    p.add_argument("--no-pin", action="store_true", help="不把并发任务绑定到互不重叠的 CPU 上")
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    supervisor.configure(pin=not args.no_pin, nice=args.nice,
+                         mem_limit=args.mem_limit * 1024 * 1024 if args.mem_limit else None)
+    supervisor.install_signal_handlers()
+    supervisor.sweep_orphans()
+    node = WorkerNode(parse_address(args.server, "127.0.0.1"), jobs=args.jobs, name=args.name, stream=args.stream,
+                      path_map=args.path_map, work_dir=args.work_dir, token=args.token)
+    try:
+        node.serve_forever()
+    except KeyboardInterrupt:
+        node.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,541 @@
+"""无界面批量转换引擎 + 命令行入口
+
+用法示例:
+    python -m engine ./clips "/mnt/in/**/*.mov" --mode 9:16 --blur --blur-sigma 60 --crf 25 --jobs 8
+    python -m engine ./clips --config '{"mode": "16:9", "preset": "fast"}'
+    python -m engine ./clips --journal night.json        # 中途崩溃后: python -m engine --journal night.json --resume
+    python -m engine /share/in --watch --out-dir /share/out   # 常驻监视，输出镜像目录结构
+    python -m engine ./clips --rendition mode=9:16,blur=1 --rendition mode=16:9 --rendition mode=16:9,crf=30
+    python -m engine ./clips --preset auto --deadline 2h     # 试编码测速，选能在 2 小时内跑完的最慢 preset
+    python -m engine ./clips --estimate-only                  # 只估算耗时和输出大小 (--estimate-sample 先试编码校准)
+    python -m engine ./clips --nice 10 --mem-limit 2048       # 低优先级运行，每个 ffmpeg 最多 2 GB 内存
+    python -m engine ./clips --listen 0.0.0.0:7655 --token s3cret  # 任务服务器：其他机器 python -m cluster host:7655 分担
+    python -m engine ./clips --metrics runs.jsonl --metrics-prom /var/lib/node_exporter/textfile/yasuo.prom \
+        --metrics-label release=1.4.2                         # 每个任务和每批的性能数据 (见 telemetry.py)
+
+stdout 每行输出一个 JSON 事件 (start / progress / done / error / cancelled / skip / summary，监视模式另有
+watch / queued，--preset auto 时开始前另有 tune / plan，--listen 时另有 node / requeued，各事件带 node 字段)，方便脚本解析。批处理开始前输出一条 estimate
+(预计耗时、完成时间、输出大小、输出磁盘空间是否够)，之后每完成一个任务输出一条修正后的 eta。
+给出 --rendition (或 config 里的 "renditions" 列表) 时每个源只解码一次，同时输出所有规格，
+progress 事件带 rendition 序号，done 事件的 output 为路径列表。
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import threading
+
+from worker import VideoWorker, RenditionWorker, probe_video, cache_dir, VIDEO_EXTS, CANCELLED
+from filtergraph import BLUR_DOWNSCALE
+from scheduler import EncodeScheduler
+from journal import JobJournal
+from jobctl import JobControl, cancel_all
+import supervisor
+
+# 与 ui.UIHandler.start_all 构造的 config 保持一致
+DEFAULT_CONFIG = {
+    "mode": "9:16",
+    "blur": False,
+    "blur_sigma": 60,
+    "blur_downscale": 1,
+    "crf": 25,
+    "preset": "ultrafast",
+    "passthrough": True,
+}
+
+
+def collect_inputs(items):
+    """把文件 / 通配符 / 目录展开成去重后的视频文件列表 (保持输入顺序)"""
+    files, seen = [], set()
+
+    def add(p):
+        p = os.path.abspath(p)
+        # 以点开头的是隐藏文件或正在写入的临时输出 (outputs.temp_path)
+        if p not in seen and p.lower().endswith(VIDEO_EXTS) and not os.path.basename(p).startswith("."):
+            seen.add(p)
+            files.append(p)
+
+    for item in items:
+        if os.path.isdir(item):
+            for root, dirs, names in os.walk(item):
+                # 跳过自己的输出目录，避免把转换结果再转一遍
+                dirs[:] = sorted(d for d in dirs if d != "Converted_Videos")
+                for n in sorted(names):
+                    add(os.path.join(root, n))
+        elif os.path.isfile(item):
+            add(item)
+        else:
+            for p in sorted(glob.glob(item, recursive=True)):
+                if os.path.isfile(p):
+                    add(p)
+    return files
+
+
+class BatchEngine:
+    """有界工作池：每个工作线程驱动一个 ffmpeg 子进程。
+
+    并发数与每个任务的编码线程数由 EncodeScheduler 按 CPU 核数决定，
+    max_workers 只作为上限 (None 表示不限，完全自适应)。
+    """
+    def __init__(self, config, max_workers=None, on_event=None, journal=None, telemetry=None):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.scheduler = EncodeScheduler(max_jobs=max_workers)
+        self.on_event = on_event
+        self.journal = journal
+        self._lock = threading.Lock()
+        self.results = []
+        self.job_configs = {}   # 续跑时每个文件沿用日志里记录的参数
+        self.planner = None     # planner.BatchPlan，由 estimate() 创建
+        self._progress = {}
+        self.controls = {}      # 运行中任务的 jobctl.JobControl，见 cancel / pause / resume
+        self.server = None      # cluster.JobServer：设置后任务分派到各节点，不在本进程里编码
+        self.telemetry = telemetry  # telemetry.Telemetry：记录每个任务和每批的耗时与资源占用
+        self.queued_at = {}     # 路径 -> 入队时间，用于统计排队时间
+
+    def emit(self, event, **fields):
+        if self.on_event:
+            fields["event"] = event
+            with self._lock:
+                self.on_event(fields)
+
+    def run_one(self, path, slot):
+        start = time.time()
+        result = {"file": path, "ok": False, "output": None, "error": None, "strategy": None}
+        job = self.journal.get(path) if self.journal else None
+        stats = None
+        if self.telemetry:
+            from telemetry import JobStats
+            stats = JobStats(path, self.queued_at.pop(path, None))
+        try:
+            # 日志里已有探测结果时直接使用，不再探测
+            meta = (job or {}).get("meta") or probe_video(path)
+            if not meta:
+                raise ValueError("no video stream")
+        except Exception as e:
+            result["error"] = f"probe failed: {e}"
+            self.emit("error", file=path, message=result["error"])
+            if self.journal: self.journal.fail(path, result["error"])
+            if stats:
+                stats.probe_time = time.time() - start
+                result["stats"] = stats.record("error", threads=slot.threads)
+                self.telemetry.job(result["stats"])
+            return result
+        if stats: stats.probe_time = time.time() - start
+        if self.journal: self.journal.set_meta(path, meta)
+
+        config = dict(self.job_configs.get(path, self.config), threads=slot.threads)
+        renditions = config.pop("renditions", None)
+        if renditions:
+            # 多规格输出：一次解码，split 给每个输出各自编码
+            w = RenditionWorker(path, renditions, config, meta["duration"], meta)
+        else:
+            w = VideoWorker(path, config, meta["duration"], meta)
+        result["strategy"] = w.strategy
+        self.emit("start", file=path, duration=meta["duration"], threads=slot.threads, strategy=w.strategy)
+        last = {}
+
+        def on_stats(ev, index=None):
+            if stats and not index:
+                stats.feed(ev)
+            # 同一百分比只上报一次，避免刷屏
+            if ev['percent'] != last.get(index):
+                last[index] = ev['percent']
+                self._progress[path] = ev['percent']
+                extra = {} if index is None else {"rendition": index, "output": ev['output']}
+                self.emit("progress", file=path, percent=ev['percent'], fps=ev['fps'], speed=ev['speed'],
+                          eta=ev['eta'], out_time=ev['out_time'], total_size=ev['total_size'], **extra)
+
+        def on_finished(out):
+            result["ok"], result["output"] = True, out
+
+        def on_error(msg):
+            result["error"] = msg
+
+        w.on_stats = on_stats if not renditions else lambda i, ev: on_stats(ev, i)
+        if self.journal:
+            w.on_start = lambda out: self.journal.start(path, out)
+        w.on_fps = slot.report_fps
+        w.on_finished = on_finished
+        w.on_error = on_error
+        w.control = control = JobControl()
+        control.slot = slot
+        self.controls[path] = control
+        if self.planner: self.planner.start(path)
+        if stats:
+            control.usage = stats.usage
+            stats.begin()
+        try:
+            w.run()
+        finally:
+            self.controls.pop(path, None)
+
+        result["elapsed"] = round(time.time() - start, 3)
+        if stats:
+            stats.end()
+            status = "ok" if result["ok"] else "cancelled" if control.cancelled else "error"
+            result["stats"] = stats.record(status, meta["duration"], result["output"], strategy=w.strategy,
+                                           threads=slot.threads, preset=config.get("preset"))
+            self.telemetry.job(result["stats"])
+        if self.journal:
+            if result["ok"]:
+                self.journal.finish(path, result["output"])
+            else:
+                self.journal.fail(path, result["error"])
+        if result["ok"]:
+            self.emit("done", file=path, output=result["output"], elapsed=result["elapsed"],
+                      strategy=result["strategy"])
+        elif control.cancelled:
+            self.emit("cancelled", file=path, elapsed=result["elapsed"])
+        else:
+            self.emit("error", file=path, message=result["error"], elapsed=result["elapsed"])
+        if self.planner:
+            self._progress.pop(path, None)
+            if result["ok"]:
+                from planner import output_size
+                self.planner.finish(path, result["elapsed"], output_size(result["output"]), slot.threads)
+            else:
+                self.planner.finish(path, 0, 0)
+            self.emit("eta", **self.planner.summary(dict(self._progress)))
+        return result
+
+    # ---- 任务控制 (可在任意线程调用) ----
+    def cancel(self, path):
+        """取消任务：运行中的结束 ffmpeg 进程组并删除未写完的输出，排队中的直接移出队列"""
+        if self.server is not None:
+            return self.server.cancel(path)
+        control = self.controls.get(path)
+        if control is not None:
+            control.cancel()
+            return True
+        if self.scheduler.withdraw(path):
+            if self.journal: self.journal.fail(path, CANCELLED)
+            self.emit("cancelled", file=path)
+            return True
+        return False
+
+    def pause(self, path):
+        """暂停运行中的任务 (SIGSTOP)，它的并发名额先让给排队的任务"""
+        if self.server is not None:
+            return self.server.pause(path)
+        control = self.controls.get(path)
+        if control is not None and control.pause():
+            self.emit("paused", file=path)
+            return True
+        return False
+
+    def resume(self, path):
+        if self.server is not None:
+            return self.server.resume(path)
+        control = self.controls.get(path)
+        if control is not None and control.resume():
+            self.emit("resumed", file=path)
+            return True
+        return False
+
+    def promote(self, path):
+        """把排队中的任务移到队首"""
+        if self.server is not None:
+            return self.server.promote(path)
+        return self.scheduler.promote(path)
+
+    def estimate(self, files, sample=False):
+        """开始前估算每个任务和整批的耗时、输出大小，检查输出磁盘空间；返回 estimate 事件的内容"""
+        from planner import BatchPlan
+        jobs = []
+        for path in files:
+            job = self.journal.get(path) if self.journal else None
+            try:
+                meta = (job or {}).get("meta") or probe_video(path)
+            except Exception:
+                meta = None
+            jobs.append((path, meta, self.job_configs.get(path, self.config)))
+        threads = self.scheduler.threads_per_job(len(files))
+        self.planner = BatchPlan(jobs, self.scheduler.target, threads)
+        if sample:
+            # 对批次中的几个文件试编码，用实测速度校准经验值 / 历史记录
+            from tune import pick_samples, measure_preset, _transcoded
+            picks = pick_samples(_transcoded([(p, m) for p, m, _ in jobs], self.config))
+            if picks:
+                m = measure_preset(picks, self.config, self.config.get("preset", "ultrafast"),
+                                   self.scheduler.target, threads)
+                self.planner.calibrate(picks, m["speed"], self.scheduler.target)
+
+        def out_dir(path):
+            config = self.job_configs.get(path, self.config)
+            return config.get("out_dir") or os.path.join(os.path.dirname(path), "Converted_Videos")
+
+        summary = self.planner.summary()
+        summary["disk"] = [{"dir": d, "free": free, "need": need}
+                           for d, free, need in self.planner.disk_shortfall(out_dir)]
+        summary["files"] = [{"file": p, "seconds": j["seconds"], "bytes": j["bytes"], "basis": j["basis"]}
+                            for p, j in self.planner.jobs.items()]
+        self.emit("estimate", **summary)
+        return summary
+
+    def tune(self, files, deadline):
+        """--preset auto：按截止时间试编码测速，把选出的 preset 写回配置，返回 tune.autotune 的结果"""
+        from tune import autotune
+        jobs = [(path, ((self.journal.get(path) if self.journal else None) or {}).get("meta")) for path in files]
+        plan = autotune(jobs, self.config, deadline, concurrency=self.scheduler.target,
+                        threads=self.scheduler.threads_per_job(len(files)),
+                        on_measure=lambda m: self.emit("tune", **m))
+        self.config["preset"] = plan["preset"]
+        for config in self.job_configs.values():
+            if config.get("preset") == "auto":
+                config["preset"] = plan["preset"]
+        self.emit("plan", preset=plan["preset"], projected=plan["projected"], meets=plan["meets"],
+                  work=plan["work"], finish=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(plan["finish"])))
+        return plan
+
+    def run_remote(self, files):
+        """--listen：任务交给 cluster.JobServer 分派到各节点 (本机节点也经由它)，结果格式同 run_one"""
+        jobs = []
+        for path in files:
+            job = self.journal.get(path) if self.journal else None
+            meta = (job or {}).get("meta")
+            if meta is None:
+                # 探测不了的交给节点自己探测，失败时作为该任务的错误返回
+                try:
+                    meta = probe_video(path)
+                except Exception:
+                    meta = None
+                if meta and self.journal: self.journal.set_meta(path, meta)
+            jobs.append((path, self.job_configs.get(path, self.config), meta))
+        return self.server.run(jobs, emit=self.emit, journal=self.journal, telemetry=self.telemetry)
+
+    def run(self, files):
+        start = time.time()
+        for path in files:
+            self.queued_at[path] = start
+        if self.journal:
+            for path in files:
+                self.journal.add(path)
+            self.journal.queue_many((path, self.job_configs.get(path, self.config)) for path in files)
+        if self.server is not None:
+            results = self.run_remote(files)
+        else:
+            results = self.scheduler.run(files, self.run_one)
+        # 排队时被取消的任务没有运行结果
+        self.results = [r or {"file": f, "ok": False, "output": None, "error": CANCELLED, "strategy": None}
+                        for r, f in zip(results, files)]
+        ok = sum(1 for r in self.results if r["ok"])
+        summary = {
+            "total": len(self.results),
+            "ok": ok,
+            "failed": len(self.results) - ok,
+            "elapsed": round(time.time() - start, 3),
+            "concurrency": self.server.capacity() if self.server is not None else self.scheduler.target,
+            "failures": [{"file": r["file"], "error": r["error"]} for r in self.results if not r["ok"]],
+        }
+        self.emit("summary", **summary)
+        if self.telemetry:
+            # 本机编码时按本机核数计算 CPU 利用率；分布式时各节点核数不同，不计算
+            self.telemetry.batch([r["stats"] for r in self.results if r.get("stats")], summary,
+                                 cpus=None if self.server is not None else os.cpu_count())
+        for path in files:
+            self.queued_at.pop(path, None)
+        return summary
+
+
+def print_event(ev):
+    sys.stdout.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+def parse_rendition(text):
+    """mode=16:9,crf=23,blur=1 -> {"mode": "16:9", "crf": 23, "blur": True}"""
+    spec = {}
+    for item in text.split(","):
+        key, sep, value = item.partition("=")
+        key = key.strip().replace("-", "_")
+        if not sep or key not in ("mode", "blur", "blur_sigma", "blur_downscale", "crf", "preset"):
+            raise argparse.ArgumentTypeError(f"无效的输出规格: {item}")
+        if key == "blur":
+            spec[key] = value.strip().lower() in ("1", "true", "yes", "on")
+        elif key in ("mode", "preset"):
+            spec[key] = value.strip()
+        else:
+            spec[key] = int(value)
+    if spec.get("mode", "9:16") not in ("9:16", "16:9"):
+        raise argparse.ArgumentTypeError(f"无效的比例: {spec['mode']}")
+    return spec
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="python -m engine", description="无界面批量视频比例转换")
+    p.add_argument("inputs", nargs="*", help="视频文件、通配符或目录")
+    p.add_argument("--config", help="JSON 字符串或 JSON 文件路径，格式同界面 start_all 的 config")
+    p.add_argument("--mode", choices=["9:16", "16:9"])
+    p.add_argument("--blur", action="store_true", default=None, help="背景模糊")
+    p.add_argument("--blur-sigma", type=int)
+    p.add_argument("--blur-downscale", type=int,
+                   help=f"在 1/N 分辨率上模糊背景，越大越快 (如 {BLUR_DOWNSCALE})，画面会略有不同；默认 1 为全分辨率")
+    p.add_argument("--crf", type=int)
+    p.add_argument("--preset", help="x264 preset；auto 表示按 --deadline 试编码后自动选择")
+    p.add_argument("--deadline", help="--preset auto 的截止时间：45m / 2h / 1h30m / 23:30 (不带单位按分钟)")
+    p.add_argument("--tune-only", action="store_true", help="--preset auto 时只测速并输出 plan 事件，不转换")
+    p.add_argument("--estimate-only", action="store_true", help="只输出 estimate 事件 (预计耗时和输出大小)，不转换")
+    p.add_argument("--estimate-sample", action="store_true", help="估算前先试编码几个片段校准速度")
+    p.add_argument("--ignore-disk", action="store_true", help="预计输出超过磁盘剩余空间时仍然开始")
+    p.add_argument("--no-passthrough", dest="passthrough", action="store_false", default=None,
+                   help="总是重新编码 (默认源已符合目标规格时直接复制视频 / 音频流)")
+    p.add_argument("--rendition", action="append", type=parse_rendition, dest="renditions",
+                   help="一个输出规格，如 mode=16:9,crf=23,blur=1,preset=fast；可重复，一次解码输出全部规格")
+    p.add_argument("--out-dir", help="输出目录，默认源文件旁的 Converted_Videos")
+    p.add_argument("--journal", help="任务日志文件：记录每个任务的参数和状态，崩溃后可用 --resume 续跑")
+    p.add_argument("--resume", action="store_true",
+                   help="按 --journal 恢复上次的队列：跳过已校验完成的输出，删除未写完的输出后重新编码")
+    p.add_argument("--watch", action="store_true",
+                   help="常驻监视 inputs 中的目录，新文件写完即转换；配合 --out-dir 时输出镜像源目录结构")
+    p.add_argument("--settle", type=float, default=5.0, help="--watch: 文件多少秒不再变化才算写完")
+    p.add_argument("--poll", action="store_true", help="--watch: 不用 inotify，定时扫描")
+    p.add_argument("--poll-interval", type=float, default=10.0,
+                   help="--watch: 没有 inotify (或 --poll) 时扫描整个目录树的间隔秒数 (默认 10)")
+    p.add_argument("-j", "--jobs", type=int, help="同时运行的 ffmpeg 进程数上限，默认按 CPU 核数自适应")
+    p.add_argument("--nice", type=int, default=0, help="ffmpeg 的 nice 值 (Windows 下 >0 为低于正常优先级)")
+    p.add_argument("--mem-limit", type=int, help="每个 ffmpeg 进程的内存上限 (MB)，超出时该任务失败")
+    p.add_argument("--no-pin", action="store_true", help="不把并发任务绑定到互不重叠的 CPU 上")
+    p.add_argument("--listen", metavar="[HOST:]PORT",
+                   help="作为任务服务器，把任务分派给用 python -m cluster 连进来的工作节点 (见 cluster.py)；"
+                        "只给端口时只监听 127.0.0.1，监听其他地址须同时设置 --token")
+    p.add_argument("--local-jobs", type=int,
+                   help="--listen 时本机节点同时运行的任务数，0 表示本机不参与编码 (默认同 --jobs)")
+    p.add_argument("--token", default=os.environ.get("YASUO_CLUSTER_TOKEN"),
+                   help="--listen 时节点须提供的口令 (默认取环境变量 YASUO_CLUSTER_TOKEN)")
+    p.add_argument("--metrics", metavar="FILE",
+                   help="把每个任务和每批的性能数据 (排队 / 探测 / 编码耗时、fps、CPU、内存、字节数) 追加到 JSON 行文件")
+    p.add_argument("--metrics-prom", metavar="FILE",
+                   help="同时写 Prometheus 文本格式文件，供 node exporter 的 textfile collector 采集 (文件名须以 .prom 结尾)")
+    p.add_argument("--metrics-label", action="append", default=[], metavar="KEY=VALUE",
+                   help="附加到性能数据上的标签，如 release=1.4.2；可重复 (默认已带 host / cpus / ffmpeg)")
+    return p
+
+
+def load_config(args):
+    config = {}
+    if args.config:
+        if os.path.isfile(args.config):
+            with open(args.config, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        else:
+            config.update(json.loads(args.config))
+    # 命令行参数优先于 --config
+    for key, val in (("mode", args.mode), ("blur", args.blur), ("blur_sigma", args.blur_sigma),
+                     ("blur_downscale", args.blur_downscale),
+                     ("crf", args.crf), ("preset", args.preset), ("out_dir", args.out_dir),
+                     ("passthrough", args.passthrough), ("renditions", args.renditions)):
+        if val is not None:
+            config[key] = val
+    return config
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.journal:
+        parser.error("--resume 需要同时指定 --journal")
+    supervisor.configure(pin=not args.no_pin, nice=args.nice,
+                         mem_limit=args.mem_limit * 1024 * 1024 if args.mem_limit else None)
+    supervisor.install_signal_handlers()
+    supervisor.sweep_orphans()
+    telemetry = None
+    if args.metrics or args.metrics_prom:
+        from telemetry import Telemetry, parse_label
+        try:
+            labels = dict(parse_label(t) for t in args.metrics_label)
+        except ValueError as e:
+            parser.error(str(e))
+        telemetry = Telemetry(args.metrics, args.metrics_prom, labels)
+    deadline = None
+    if args.deadline:
+        from tune import parse_deadline
+        try:
+            deadline = parse_deadline(args.deadline)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.watch:
+        if args.listen:
+            parser.error("--watch 不支持 --listen")
+        if not args.inputs or not all(os.path.isdir(p) for p in args.inputs):
+            parser.error("--watch 需要至少一个已存在的目录")
+        # 常驻模式默认总是记录任务日志，重启后不重复转换
+        journal = JobJournal(args.journal or os.path.join(cache_dir(), "journal_watch.json"))
+        config = load_config(args)
+        if config.get("preset") == "auto":
+            parser.error("--watch 不支持 --preset auto (没有确定的批次可供估算)")
+        out_root = config.pop("out_dir", None)
+        engine = BatchEngine(config, max_workers=args.jobs, on_event=print_event, journal=journal,
+                             telemetry=telemetry)
+        from watch import serve
+        try:
+            serve(engine, args.inputs, out_root and os.path.abspath(out_root), args.settle, args.poll,
+                  poll_interval=args.poll_interval)
+        except KeyboardInterrupt:
+            cancel_all()
+        return 0
+
+    journal = JobJournal(args.journal) if args.journal else None
+    engine = BatchEngine(load_config(args), max_workers=args.jobs, on_event=print_event, journal=journal,
+                         telemetry=telemetry)
+    if args.listen:
+        from cluster import JobServer, WorkerNode, parse_address
+        engine.server = JobServer(parse_address(args.listen), token=args.token, emit=engine.emit)
+        try:
+            host, port = engine.server.start()
+        except ValueError as e:
+            parser.error(str(e))
+        if args.local_jobs != 0:
+            # 本机也作为一个 (共享存储的) 节点，经回环连接领取任务
+            WorkerNode((host if host not in ("0.0.0.0", "::") else "127.0.0.1", port),
+                       jobs=args.local_jobs or args.jobs, name="local", token=args.token).start()
+
+    files = collect_inputs(args.inputs)
+    if journal:
+        done = set()
+        for job in journal.restore():
+            if job["state"] == "done":
+                done.add(job["path"])
+            elif args.resume:
+                if job["path"] not in files:
+                    files.append(job["path"])
+                if job["config"] and not args.inputs:
+                    engine.job_configs[job["path"]] = job["config"]
+        # 上次已完成且输出校验通过的文件不再重复转换
+        for path in done:
+            if path in files:
+                files.remove(path)
+                print_event({"event": "skip", "file": path, "output": journal.get(path)["output"]})
+    if not files:
+        print_event({"event": "summary", "total": 0, "ok": 0, "failed": 0, "elapsed": 0, "failures": []})
+        # 续跑时全部已完成也算成功
+        return 0 if journal and (args.resume or done) else 1
+    if "auto" in [engine.config.get("preset")] + [c.get("preset") for c in engine.job_configs.values()]:
+        if deadline is None:
+            parser.error("--preset auto 需要同时指定 --deadline")
+        engine.tune(files, deadline)
+        if args.tune_only:
+            return 0
+    estimate = engine.estimate(files, sample=args.estimate_sample)
+    if args.estimate_only:
+        return 0
+    if estimate["disk"] and not args.ignore_disk:
+        sys.stderr.write("输出磁盘空间不足 (--ignore-disk 可强制开始): "
+                         + "; ".join(f"{d['dir']} 剩余 {d['free']} 字节，预计需要 {d['need']} 字节"
+                                     for d in estimate["disk"]) + "\n")
+        return 1
+    try:
+        summary = engine.run(files)
+    except KeyboardInterrupt:
+        # ffmpeg 在独立的进程组里收不到 Ctrl+C，由这里结束；稍等工作线程删掉未写完的输出再退出
+        cancel_all()
+        deadline = time.time() + 5
+        while engine.controls and time.time() < deadline:
+            time.sleep(0.1)
+        return 130
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import functools
+
+# "快速模糊" 在 1/4 分辨率上做背景模糊 (见 blur_background)；默认 1 即原来的全分辨率模糊，输出与以前一致
+BLUR_DOWNSCALE = 4
+# 调色参数的中性值：等于中性值的项不生成 eq
+EQ_NEUTRAL = {"brightness": 0.0, "contrast": 1.0, "saturation": 1.0}
+
+
+def target_size(mode):
+    return (1080, 1920) if mode == "9:16" else (1920, 1080)
+
+
+def display_size(meta):
+    """探测到的宽高按旋转元数据换算成播放时的宽高 (ffmpeg 解码时会自动旋转)"""
+    w, h = meta.get('width', 0), meta.get('height', 0)
+    return (h, w) if meta.get('rotation', 0) % 180 == 90 else (w, h)
+
+
+def blur_background(target_w, target_h, sigma, downscale=1):
+    """模糊背景的滤镜链：铺满 → 裁切到目标尺寸 → 高斯模糊。
+
+    downscale > 1 时先把背景缩小 downscale 倍、用等效的 sigma / downscale 模糊，再放大回目标尺寸；
+    模糊本身就抹掉了高频细节，放大后与全分辨率模糊看不出区别，但 gblur 的计算量降到约 1/downscale²。
+    downscale = 1 即原来的全分辨率模糊。
+    """
+    downscale = max(1, int(downscale or 1))
+    if downscale == 1:
+        return (f"scale={target_w}:{target_h}:force_original_aspect_ratio=increase,"
+                f"crop={target_w}:{target_h},gblur=sigma={sigma}")
+    # 缩小后的尺寸保持偶数，yuv420p 下色度平面才能整除
+    w = max(2, target_w // downscale // 2 * 2)
+    h = max(2, target_h // downscale // 2 * 2)
+    return (f"scale={w}:{h}:force_original_aspect_ratio=increase:flags=fast_bilinear,"
+            f"crop={w}:{h},gblur=sigma={sigma / downscale:g},"
+            f"scale={target_w}:{target_h}:flags=bilinear")
+
+
+def _rotate(config):
+    try:
+        return int(config.get('rotate') or 0) % 360
+    except (TypeError, ValueError):
+        return 0
+
+
+def _eq(config):
+    parts = []
+    for key, neutral in EQ_NEUTRAL.items():
+        value = float(config.get(key, neutral))
+        if abs(value - neutral) > 1e-6:
+            parts.append(f"{key}={value:.2f}")
+    return ":".join(parts)
+
+
+def has_pixel_filters(config):
+    """是否有旋转 / 调色等必须逐像素处理的步骤 (有则不能直接复制视频流)"""
+    return bool(_rotate(config) or _eq(config))
+
+
+def compile_filter(config, width, height):
+    """把任务配置和源视频 (播放方向的) 宽高编译成 -vf 滤镜链。
+
+    config 用到的键：mode、blur、blur_sigma、blur_downscale、rotate (0/90/180/270，顺时针)、
+    brightness / contrast / saturation。同一批任务里配置和分辨率相同的文件共用一次编译结果。
+    """
+    return _compile(config.get('mode', "9:16"), int(width), int(height),
+                    bool(config.get('blur', False)), config.get('blur_sigma', 60),
+                    config.get('blur_downscale', 1), _rotate(config), _eq(config))
+
+
+def _even(v):
+    return max(2, int(round(v / 2)) * 2)
+
+
+def _geometry(mode, width, height, rotate):
+    """返回 (旋转后宽, 旋转后高, 是否需要排版)"""
+    tw, th = target_size(mode)
+    rw, rh = (height, width) if rotate in (90, 270) else (width, height)
+    # 不知道源尺寸时按需要排版处理，滤镜本身会按实际尺寸缩放
+    needs_layout = not (rw and rh) or abs(rw / rh - tw / th) > 0.01
+    return rw, rh, needs_layout
+
+
+def _needed_factor(mode, rw, rh, needs_layout, blur):
+    """该输出真正需要的分辨率相对源的比例 (未知尺寸返回 None)。
+
+    不排版时就是目标尺寸；黑边只需 "装得下" 的尺寸；模糊背景需要 "铺满" 的尺寸
+    (前景装得下的尺寸一定不比它大)。
+    """
+    if not (rw and rh):
+        return None
+    tw, th = target_size(mode)
+    if not needs_layout or blur:
+        return max(tw / rw, th / rh)
+    return min(tw / rw, th / rh)
+
+
+def _pixel_stages(rotate, eq):
+    chain = []
+    # 180° 用 hflip + vflip：vflip 只改行指针不拷贝像素，比两次 transpose 少一整遍内存搬运
+    if rotate == 90:
+        chain.append("transpose=1")
+    elif rotate == 180:
+        chain.append("hflip,vflip")
+    elif rotate == 270:
+        chain.append("transpose=2")
+    if eq:
+        chain.append("eq=" + eq)
+    return chain
+
+
+def _layout(mode, needs_layout, blur, sigma, downscale, tag=""):
+    """排版到目标尺寸的滤镜；tag 用于区分同一张图里多份模糊分支的标签"""
+    tw, th = target_size(mode)
+    if not needs_layout:
+        return f"scale={tw}:{th}"
+    if blur:
+        bg = blur_background(tw, th, sigma, downscale)
+        fg = f"scale={tw}:-2" if mode == "9:16" else f"scale=-2:{th}"
+        return (f"split=2[main{tag}][bg{tag}];[bg{tag}]{bg}[bgblur{tag}];"
+                f"[main{tag}]{fg}:force_original_aspect_ratio=decrease[fg{tag}];"
+                f"[bgblur{tag}][fg{tag}]overlay=(W-w)/2:(H-h)/2")
+    return (f"scale={tw}:{th}:force_original_aspect_ratio=decrease,"
+            f"pad={tw}:{th}:(ow-iw)/2:(oh-ih)/2:black")
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(mode, width, height, blur, sigma, downscale, rotate, eq):
+    tw, th = target_size(mode)
+    rw, rh, needs_layout = _geometry(mode, width, height, rotate)
+    factor = _needed_factor(mode, rw, rh, needs_layout, blur)
+
+    chain = []
+    stages = _pixel_stages(rotate, eq)
+    # 先缩小再做旋转和调色：4K 源只在需要的像素数上付出代价。eq 是逐像素的仿射变换，
+    # 与缩放交换顺序结果不变。放大时则相反，放到最后再做。没有旋转 / 调色时不预先缩小：
+    # 排版里的缩放本来就一步到位，多一遍缩放只会更慢 (前景还要重采样两次)
+    downscaled = bool(stages) and factor is not None and factor < 1
+    if downscaled and not needs_layout:
+        sw, sh = (th, tw) if rotate in (90, 270) else (tw, th)
+        chain.append(f"scale={sw}:{sh}")
+    elif downscaled:
+        chain.append(f"scale={_even(width * factor)}:{_even(height * factor)}")
+
+    chain += stages
+
+    if needs_layout or not downscaled:
+        chain.append(_layout(mode, needs_layout, blur, sigma, downscale))
+    chain.append("format=yuv420p")
+    return ",".join(chain)
+
+
+def rendition_key(spec):
+    """单个输出规格中影响滤镜的部分"""
+    return (spec.get('mode', "9:16"), bool(spec.get('blur', False)), spec.get('blur_sigma', 60),
+            spec.get('blur_downscale', 1))
+
+
+def compile_renditions(config, specs, width, height):
+    """一次解码输出多个规格：返回 -filter_complex 图，第 i 个输出的标签为 [v{i}]。
+
+    旋转和调色取自 config，所有输出共用；有旋转 / 调色时源先缩小到各输出中需要的最大尺寸，再 split
+    给每个输出各自排版。相同排版的输出 (只有 crf / preset 不同) 共用同一条分支。
+    """
+    return _compile_renditions(tuple(rendition_key(s) for s in specs), int(width), int(height),
+                               _rotate(config), _eq(config))
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_renditions(keys, width, height, rotate, eq):
+    layouts = list(dict.fromkeys(keys))
+    geos = [_geometry(mode, width, height, rotate) for mode, *_ in layouts]
+    factors = [_needed_factor(mode, rw, rh, nl, blur) for (mode, blur, *_), (rw, rh, nl) in zip(layouts, geos)]
+
+    shared = []
+    stages = _pixel_stages(rotate, eq)
+    # 与 _compile 相同：只有共用的旋转 / 调色时才在 split 之前缩小
+    if stages and all(f is not None for f in factors) and max(factors) < 1:
+        f = max(factors)
+        shared.append(f"scale={_even(width * f)}:{_even(height * f)}")
+    shared += stages
+    shared.append(f"split={len(layouts)}" + "".join(f"[s{i}]" for i in range(len(layouts))))
+
+    graph = ["[0:v]" + ",".join(shared)]
+    for i, ((mode, blur, sigma, downscale), (rw, rh, nl)) in enumerate(zip(layouts, geos)):
+        # 同一排版被多个输出使用时再 split 一次
+        users = [k for k, key in enumerate(keys) if key == layouts[i]]
+        tail = "format=yuv420p"
+        if len(users) > 1:
+            tail += f",split={len(users)}" + "".join(f"[v{k}]" for k in users)
+        else:
+            tail += f"[v{users[0]}]"
+        graph.append(f"[s{i}]" + _layout(mode, nl, blur, sigma, downscale, tag=str(i)) + "," + tail)
+    return ";".join(graph)
@@ -0,0 +1,147 @@
+import os
+import sys
+import signal
+import atexit
+import weakref
+import threading
+import subprocess
+
+# 取消后等待 ffmpeg 自行退出的秒数，超时强制结束
+KILL_TIMEOUT = 3.0
+
+_live = weakref.WeakSet()
+
+
+def group_kwargs():
+    """Popen 参数：让 ffmpeg 自成进程组，取消 / 暂停时连同它可能拉起的子进程一起处理"""
+    if sys.platform == "win32":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _signal(process, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _nt_call(process, name):
+    # Windows 没有 SIGSTOP：用 ntdll 未公开但稳定的 NtSuspendProcess / NtResumeProcess
+    try:
+        import ctypes
+        getattr(ctypes.windll.ntdll, name)(int(process._handle))
+    except (OSError, AttributeError):
+        pass
+
+
+def _suspend(process):
+    if sys.platform == "win32":
+        _nt_call(process, "NtSuspendProcess")
+    else:
+        _signal(process, signal.SIGSTOP)
+
+
+def _resume(process):
+    if sys.platform == "win32":
+        _nt_call(process, "NtResumeProcess")
+    else:
+        _signal(process, signal.SIGCONT)
+
+
+def _terminate(process):
+    if process.poll() is not None:
+        return
+    if sys.platform == "win32":
+        process.terminate()
+    else:
+        _signal(process, signal.SIGTERM)
+
+    def force():
+        if process.poll() is None:
+            if sys.platform == "win32":
+                process.kill()
+            else:
+                _signal(process, signal.SIGKILL)
+    timer = threading.Timer(KILL_TIMEOUT, force)
+    timer.daemon = True
+    timer.start()
+
+
+class JobControl:
+    """一个任务的控制句柄，任意线程都可以调用 cancel / pause / resume。
+
+    任务运行期间由 progress.run_ffmpeg 把启动的 ffmpeg 进程 attach 进来 (分段编码时可能同时有多个)，
+    操作对所有已 attach 的进程生效；取消之后再启动的进程会被立即结束。暂停时如果绑定了调度槽位 (slot)，
+    该槽位不再占用并发名额，调度器可以先启动排队中的其他任务。
+    """
+    def __init__(self):
+        self.cancelled = False
+        self.paused = False
+        self.slot = None
+        self.usage = None   # telemetry.ProcessUsage：设置后 run_ffmpeg 记录各 ffmpeg 进程的 CPU 时间和峰值内存
+        self._procs = set()
+        self._lock = threading.Lock()
+        _live.add(self)
+
+    def attach(self, process):
+        with self._lock:
+            self._procs.add(process)
+            if self.cancelled:
+                _terminate(process)
+            elif self.paused:
+                _suspend(process)
+
+    def detach(self, process):
+        with self._lock:
+            self._procs.discard(process)
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            for p in self._procs:
+                # 暂停中的进程收不到 SIGTERM 的处理机会，先让它继续
+                if self.paused:
+                    _resume(p)
+                _terminate(p)
+        self._set_slot_paused(False)
+
+    def pause(self):
+        with self._lock:
+            if self.cancelled or self.paused:
+                return False
+            self.paused = True
+            for p in self._procs:
+                _suspend(p)
+        self._set_slot_paused(True)
+        return True
+
+    def resume(self):
+        with self._lock:
+            if not self.paused:
+                return False
+            self.paused = False
+            for p in self._procs:
+                _resume(p)
+        self._set_slot_paused(False)
+        return True
+
+    @property
+    def cpus(self):
+        """调度槽位分到的 CPU 编号，ffmpeg 由 supervisor 绑定到这些核上"""
+        return self.slot.cpus if self.slot is not None else None
+
+    def _set_slot_paused(self, paused):
+        if self.slot is not None:
+            self.slot.set_paused(paused)
+
+
+def cancel_all():
+    """结束所有任务的 ffmpeg 进程 (关闭窗口 / 进程退出时调用，避免留下孤儿进程)"""
+    for control in list(_live):
+        control.cancel()
+
+
+atexit.register(cancel_all)
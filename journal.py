@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import threading
+
+from worker import cache_dir
+from outputs import temp_path
+
+# 任务状态：
+#   pending  已加入列表，还没开始批处理
+#   queued   已进入某次批处理 (记录了当时的转换参数)，等待执行
+#   running  正在编码，output 为正在写入的文件
+#   done     完成，size 为输出文件大小，用于重启后校验
+#   failed   失败，error 为原因
+HISTORY_LIMIT = 20
+
+
+def _size(output):
+    """输出文件大小；多规格任务的 output 是路径列表，返回大小列表。任一文件不存在返回 None"""
+    try:
+        if isinstance(output, list):
+            return [os.path.getsize(p) for p in output]
+        return os.path.getsize(output)
+    except (OSError, TypeError):
+        return None
+
+
+def _new_job(path):
+    return {"path": path, "state": "pending", "config": None, "meta": None,
+            "output": None, "size": None, "error": None, "history": []}
+
+
+class JobJournal:
+    """批处理任务日志，记录每个任务的参数、状态变化和输出路径。
+
+    由两部分组成：快照 (path) 和快照之后的增量 (path + ".log"，每行一条 JSON 更新)。
+    每次更新只在增量末尾追加一行并 fsync，一万个任务的批处理也不用反复重写整个文件；
+    增量过长时把当前状态写到临时文件、fsync 后 os.replace 成新快照再清空增量，磁盘上
+    要么是旧快照要么是新快照。每条更新带递增序号，快照记录自己包含到哪一条，重放时
+    跳过旧的，因此在换快照和清空增量之间崩溃也不会重复应用。重启后用 restore() 恢复队列。
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "journal.json")
+        self.log_path = self.path + ".log"
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._seq = 0
+        self._log_lines = 0
+        self._log = None
+        self._load()
+
+    # ---- 持久化 ----
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._seq = data.get("seq", 0)
+            for job in data.get("jobs", []):
+                self._jobs[job["path"]] = job
+        except (OSError, ValueError, KeyError, TypeError):
+            self._jobs, self._seq = {}, 0
+        torn = False
+        try:
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能只写了一半
+                        torn = True
+                        break
+                    if entry["seq"] > self._seq:
+                        self._apply(entry)
+                        self._seq = entry["seq"]
+                    self._log_lines += 1
+        except OSError:
+            pass
+        if torn:
+            # 立即换新快照，免得后续追加接在半行后面
+            self._snapshot()
+
+    def _apply(self, entry):
+        path = entry["path"]
+        if entry.get("op") == "remove":
+            self._jobs.pop(path, None)
+            return
+        if entry.get("op") == "clear":
+            self._jobs = {}
+            return
+        job = self._jobs.setdefault(path, _new_job(path))
+        job.update(entry.get("fields", {}))
+        state = entry.get("state")
+        if state and (state != job["state"] or not job["history"]):
+            job["state"] = state
+            job["history"] = (job["history"] + [[state, entry["t"]]])[-HISTORY_LIMIT:]
+
+    def _append(self, entry, sync=True):
+        self._seq += 1
+        entry["seq"] = self._seq
+        entry["t"] = round(time.time(), 3)
+        self._apply(entry)
+        try:
+            if self._log is None:
+                self._log = open(self.log_path, 'a', encoding='utf-8')
+            self._log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._log.flush()
+            if sync:
+                os.fsync(self._log.fileno())
+            self._log_lines += 1
+        except OSError:
+            # 日志写不进去不能影响转换本身
+            return
+        if self._log_lines > max(1000, 2 * len(self._jobs)):
+            self._snapshot()
+
+    def _sync(self):
+        try:
+            if self._log is not None:
+                os.fsync(self._log.fileno())
+        except OSError:
+            pass
+
+    def _snapshot(self):
+        tmp = self.path + ".tmp"
+        data = {"version": 1, "seq": self._seq, "jobs": list(self._jobs.values())}
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            # 快照已包含全部更新，清空增量
+            if self._log is not None:
+                self._log.close()
+            self._log = open(self.log_path, 'w', encoding='utf-8')
+            self._log_lines = 0
+        except OSError:
+            pass
+
+    def _update(self, path, state=None, sync=True, **fields):
+        with self._lock:
+            self._append({"path": path, "state": state, "fields": fields}, sync)
+
+    # ---- 状态变化 ----
+    def add(self, path, meta=None):
+        with self._lock:
+            if path not in self._jobs:
+                # 只是加入列表，不必每条都落盘，后续状态变化时一并 fsync
+                self._append({"path": path, "state": "pending", "fields": {"meta": meta}}, sync=False)
+
+    def set_meta(self, path, meta):
+        with self._lock:
+            if path in self._jobs:
+                self._append({"path": path, "fields": {"meta": meta}}, sync=False)
+
+    def queue(self, path, config, source=None):
+        # source: 源文件的 [大小, mtime_ns]，监视模式据此判断文件是否被替换过
+        self._update(path, "queued", config=config, source=source, output=None, size=None, error=None)
+
+    def queue_many(self, jobs):
+        """批量 queue：jobs 为 [(路径, config)]，整批只 fsync 一次 (开始一万个任务的批处理不必 fsync 一万次)"""
+        with self._lock:
+            for path, config in jobs:
+                self._append({"path": path, "state": "queued", "fields": {
+                    "config": config, "source": None, "output": None, "size": None, "error": None}}, sync=False)
+            self._sync()
+
+    def start(self, path, output):
+        self._update(path, "running", output=output)
+
+    def finish(self, path, output):
+        self._update(path, "done", output=output, size=_size(output))
+
+    def fail(self, path, error):
+        self._update(path, "failed", error=error)
+
+    def remove(self, path):
+        with self._lock:
+            if path in self._jobs:
+                self._append({"path": path, "op": "remove"})
+
+    def clear(self):
+        with self._lock:
+            self._append({"path": None, "op": "clear"})
+            self._snapshot()
+
+    # ---- 查询 ----
+    def get(self, path):
+        with self._lock:
+            job = self._jobs.get(path)
+            return dict(job) if job else None
+
+    def entries(self):
+        with self._lock:
+            return [dict(job) for job in self._jobs.values()]
+
+    def restore(self):
+        """重启后整理日志并返回全部任务 (保持加入顺序)。
+
+        源文件已不存在的任务直接丢弃；done 的输出文件还在且大小一致才算完成；running 说明上次
+        在编码途中退出。不完整的输出一律删除，任务重新排队。
+        """
+        with self._lock:
+            for path, job in list(self._jobs.items()):
+                if not os.path.exists(path):
+                    del self._jobs[path]
+                    continue
+                output = job.get("output")
+                if job["state"] == "done":
+                    size = _size(output)
+                    incomplete = size is None or size != job.get("size")
+                else:
+                    incomplete = job["state"] == "running"
+                if incomplete:
+                    # 删掉不完整的输出 (编码中断或被截断，以及写了一半的临时文件) 后重新排队
+                    for p in (output if isinstance(output, list) else [output]):
+                        for q in ((p, temp_path(p)) if p else ()):
+                            if os.path.exists(q):
+                                try:
+                                    os.remove(q)
+                                except OSError:
+                                    pass
+                    job.update(state="queued", output=None, size=None)
+                    job["history"] = (job["history"] + [["queued", round(time.time(), 3)]])[-HISTORY_LIMIT:]
+            self._snapshot()
+            return [dict(job) for job in self._jobs.values()]
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
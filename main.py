@@ -1,12 +1,20 @@
 # main.py
+# startup 必须最先导入：--profile-startup 要从这里开始给 import 计时
+import startup
+startup.begin()
+
 import sys
 import os
 import customtkinter as ctk
+startup.mark("import customtkinter")
 from ui import UIHandler
+import supervisor
+startup.mark("import ui")
 
 class MainWindow(ctk.CTk):
     def __init__(self):
         super().__init__()
+        startup.mark("create window")
 
         # 1. 窗口基本设置
         self.title("视频比例转换器")
@@ -24,17 +32,25 @@ class MainWindow(ctk.CTk):
             except Exception:
                 pass # 某些系统不支持 iconbitmap 时静默跳过
 
+        # 转换任务降低优先级，保证桌面流畅；结束上次崩溃遗留的 ffmpeg 要扫描缓存目录，放到窗口画出之后
+        supervisor.configure(nice=supervisor.DESKTOP_NICE)
+        supervisor.install_signal_handlers()
+        startup.after_first_paint(self, supervisor.sweep_orphans)
+
         # 3. 初始化线程池模拟 (CTk 模式下主要靠 threading，这里保留引用以兼容 UI 逻辑)
         self.pool = None 
 
         # 4. 初始化 UI 处理器
         self.ui = UIHandler(self, self.pool)
+        startup.mark("build ui")
 
         # 5. 绑定退出事件 (确保关闭窗口时结束所有子进程)
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
     def on_closing(self):
-        # 可以在这里添加清理逻辑
+        # 结束所有 ffmpeg 进程组 (暂停中的也会先恢复再结束)，不留孤儿进程
+        from jobctl import cancel_all
+        cancel_all()
         self.destroy()
         sys.exit(0)
 
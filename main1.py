@@ -1,14 +1,27 @@
+# startup 必须最先导入：--profile-startup 要从这里开始给 import 计时
+import startup
+startup.begin()
+
 import customtkinter as ctk
 import os
-import json
 import subprocess
 import threading
 import queue
-import re
 import sys
-import time
 from tkinterdnd2 import DND_FILES, TkinterDnD
-from tkinter import filedialog
+from tkinter import filedialog, messagebox, Menu
+startup.mark("import customtkinter")
+
+# scheduler / segments / progress 只在转换时用到，到时再导入
+from uibus import UIUpdateBus
+from vlist import JobRecord, JobTable, VirtualList
+from worker import SEGMENT_THRESHOLD, probe_video, choose_strategy, audio_args, cache_dir, CANCELLED
+from filtergraph import compile_filter, display_size, has_pixel_filters, target_size
+from journal import JobJournal
+from outputs import get_allocator, temp_path
+from jobctl import JobControl, cancel_all
+import supervisor
+startup.mark("import modules")
 
 # ────────────────────────────────────────────────
 # 全局配置
@@ -71,22 +84,28 @@ class SlateButton(ctk.CTkButton):
             self.configure(text_color=BTN_START_COLOR, border_color=BTN_START_BORDER)
 
 
+def open_record_folder(rec):
+    target = rec.output if rec.output else rec.path
+    folder = os.path.dirname(target)
+    if os.path.exists(folder):
+        if sys.platform == "win32":
+            os.startfile(folder)
+        else:
+            subprocess.Popen(["open", folder])
+
+
 class TaskRow(ctk.CTkFrame):
-    def __init__(self, master, index, path, remove_cb):
+    """任务列表的一行。列表是虚拟的：只创建可见行数量的 TaskRow，滚动时用 show() 换绑到不同的 JobRecord"""
+    def __init__(self, master, remove_cb, menu_cb=None):
         super().__init__(master, fg_color="transparent", height=55, corner_radius=0)
         self.pack_propagate(False)
-        self.path = path
-        self.duration = 0
-        self.width = 0
-        self.height = 0
-        self.output_full_path = ""
-        self.last_update_time = 0
-
-        self.idx_cell = self._add_col(CW[0], str(index), "center", FONT_MAIN, "#475569")
+        self.rec = None
+
+        self.idx_cell = self._add_col(CW[0], "", "center", FONT_MAIN, "#475569")
         self._v_sep()
-        self.name_cell = self._add_col(CW[1], os.path.basename(path), "w", FONT_MAIN, "#cbd5e1", padx=15)
+        self.name_cell = self._add_col(CW[1], "", "w", FONT_MAIN, "#cbd5e1", padx=15)
         self._v_sep()
-        self.info_cell = self._add_col(CW[2], "读取中...", "center", FONT_INFO, "#64748b")
+        self.info_cell = self._add_col(CW[2], "", "center", FONT_INFO, "#64748b")
         self._v_sep()
 
         self.p_box = ctk.CTkFrame(self, width=CW[3], fg_color="transparent")
@@ -97,7 +116,7 @@ class TaskRow(ctk.CTkFrame):
         self.pbar.place(relx=0.35, rely=0.5, anchor="center")
         self.p_text = ctk.CTkLabel(self.p_box, text="等待", font=FONT_INFO, text_color="#475569", width=60, cursor="hand2")
         self.p_text.place(relx=0.82, rely=0.5, anchor="center")
-        self.p_text.bind("<Button-1>", lambda e: self.open_folder())
+        self.p_text.bind("<Button-1>", lambda e: open_record_folder(self.rec) if self.rec else None)
         self._v_sep()
 
         self.btn_box = ctk.CTkFrame(self, width=CW[4], fg_color="transparent")
@@ -106,37 +125,24 @@ class TaskRow(ctk.CTkFrame):
         self.del_btn = ctk.CTkButton(
             self.btn_box, text="✕", width=35, height=30, fg_color="transparent",
             hover_color="#ef4444", text_color="#475569", font=FONT_BOLD,
-            command=lambda: remove_cb(path, self)
+            command=lambda: remove_cb(self.rec.path, self) if self.rec else None
         )
         self.del_btn.place(relx=0.5, rely=0.5, anchor="center")
 
         ctk.CTkFrame(self, height=1, fg_color=COLOR_GRID).place(relx=0, rely=1, relwidth=1, y=-1)
-        info_queue.put((self, path))
 
-    def update_index(self, new_idx):
-        self.idx_cell.configure(text=str(new_idx))
+        # 右键菜单：暂停 / 继续 / 取消 / 优先处理
+        if menu_cb:
+            for w in (self, self.idx_cell, self.name_cell, self.info_cell, self.p_box):
+                w.bind("<Button-3>", lambda e: menu_cb(self.rec, e) if self.rec else None)
 
-    def update_status(self, progress, status_text=None, color=None, force=False):
-        now = time.time()
-        if not force and now - self.last_update_time < 0.1:
-            return
-        self.last_update_time = now
-        self.pbar.set(progress / 100)
-        if status_text:
-            self.p_text.configure(text=status_text)
-        else:
-            self.p_text.configure(text=f"{int(progress)}%")
-        if color:
-            self.p_text.configure(text_color=color)
-
-    def open_folder(self):
-        target = self.output_full_path if self.output_full_path else self.path
-        folder = os.path.dirname(target)
-        if os.path.exists(folder):
-            if sys.platform == "win32":
-                os.startfile(folder)
-            else:
-                subprocess.Popen(["open", folder])
+    def show(self, rec, index):
+        self.rec = rec
+        self.idx_cell.configure(text=str(index))
+        self.name_cell.configure(text=os.path.basename(rec.path))
+        self.info_cell.configure(text=rec.info)
+        self.pbar.set(rec.progress / 100)
+        self.p_text.configure(text=rec.status or f"{int(rec.progress)}%", text_color=rec.color or "#475569")
 
     def _add_col(self, w, txt, anchor, font, color, padx=0):
         cell = ctk.CTkFrame(self, width=w, fg_color="transparent", corner_radius=0)
@@ -150,25 +156,104 @@ class TaskRow(ctk.CTkFrame):
         ctk.CTkFrame(self, width=1, fg_color=COLOR_GRID).pack(side="left", fill="y")
 
 
+TITLE = "视频批量编辑工具"
+
+
 class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
-    def __init__(self):
+    def __init__(self, listen=None):
         super().__init__()
-        self.TkdndVersion = TkinterDnD._require(self)
-        self.title("视频批量编辑工具")
+        startup.mark("create window")
+        self.title(TITLE)
         self.geometry("1180x720")
         self.configure(fg_color=BG_MAIN)
 
         self.selected_ratio = "9:16"
-        self.selected_preset = "快 1080p30"
+        self.selected_preset = "标准 1080p30"
         self.custom_save_path = ""
-        self.tasks = {}
+        self.tasks = JobTable()
         self.is_running = False
         self.last_config_snapshot = None
+        self.plan = None    # 本批的耗时 / 输出大小估算 (planner.BatchPlan)
+        self._estimate_after = None
+        self.scheduler = None
+        self.controls = {}  # 路径 -> 运行中任务的 JobControl
+        self.queued = set() # 已交给调度器、还没开始的路径
+        self.server = None  # --listen 时的 cluster.JobServer，任务分派到各节点
+
+        # 转换任务降低优先级，保证桌面流畅
+        supervisor.configure(nice=supervisor.DESKTOP_NICE)
+        supervisor.install_signal_handlers()
+        if listen:
+            self._listen(listen)
+
+        # 工作线程不直接调用 after()/configure()，统一经由 bus 在主线程批量更新
+        self.bus = UIUpdateBus(self)
+        self.bus.start()
 
         self.setup_ui()
+        self.protocol("WM_DELETE_WINDOW", self.on_closing)
+        threading.Thread(target=self._info_worker, daemon=True).start()
+        startup.mark("build ui")
+
+        # 窗口先画出来，参数行、拖放支持 (加载 tkdnd 的 Tcl 扩展)、整理任务日志和遗留进程清理随后再做；
+        # 日志对象先建好，参数行建好之前不读参数控件
+        self.journal = JobJournal(os.path.join(cache_dir(), "journal_main1.json"))
+        self.params_ready = False
+        self.restored = False
+        startup.after_first_paint(self, self._build_params)
+        startup.after_first_paint(self, self._enable_dnd)
+        startup.after_first_paint(self, self._restore_jobs)
+        startup.after_first_paint(self, supervisor.sweep_orphans)
+
+    def _listen(self, address):
+        # 作为任务服务器，其他机器运行 python -m cluster 连进来分担转换；本机也作为一个节点
+        from cluster import JobServer, WorkerNode, parse_address
+        token = os.environ.get("YASUO_CLUSTER_TOKEN")
+        server = JobServer(parse_address(address), token=token)
+        try:
+            host, port = server.start()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("任务服务器", f"无法监听 {address}: {e}")
+            return
+        self.server = server
+        # 绑定通配地址时经回环连接，否则连实际绑定的地址
+        WorkerNode((host if host not in ("0.0.0.0", "::") else "127.0.0.1", port), name="local", token=token).start()
+
+    def _enable_dnd(self):
+        self.TkdndVersion = TkinterDnD._require(self)
         self.drop_target_register(DND_FILES)
         self.dnd_bind('<<Drop>>', self.on_drop)
-        threading.Thread(target=self._info_worker, daemon=True).start()
+
+    def _restore_jobs(self):
+        # 任务日志：崩溃或断电后重启时恢复列表，并续跑中断的批处理
+        if self.restored:
+            return
+        self.restored = True
+        resume = {}
+        for job in self.journal.restore():
+            if job["path"] in self.tasks:
+                continue
+            rec = JobRecord(job["path"])
+            if job["meta"]:
+                # 日志里有探测结果，直接使用，不再排队探测
+                self._fill_info(rec, job["meta"])
+            else:
+                info_queue.put((rec, rec.path))
+            if job["state"] == "done":
+                rec.output, rec.progress, rec.status, rec.color = job["output"], 100, "✓ 完成", "#10b981"
+            elif job["state"] == "queued" and job["config"]:
+                resume[rec.path] = job["config"]
+            self.tasks.append(rec)
+        self.task_list.refresh()
+        if resume:
+            self.after(500, self._resume, resume)
+
+    def _resume(self, resume):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.start_btn.configure(state="disabled", fg_color="#334155", text_color="#93c5fd", text="转换中...")
+        threading.Thread(target=self._run_all, args=(None, 8, resume), daemon=True).start()
 
     def setup_ui(self):
         ctrl = ctk.CTkFrame(self, fg_color="transparent")
@@ -192,9 +277,13 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self._label(g_preset, "预设").pack(side="left", padx=(0, ITEM_GAP))
         btn_ultrafast = SlateButton(g_preset, "极快 1080p30", command=lambda: self._switch_preset("极快 1080p30"))
         btn_ultrafast.pack(side="left", padx=(0, ITEM_GAP))
-        btn_medium = SlateButton(g_preset, "快 1080p30", is_selected=True, command=lambda: self._switch_preset("快 1080p30"))
-        btn_medium.pack(side="left")
-        self.preset_btns = [btn_ultrafast, btn_medium]
+        # 这一档实际是 x264 的 medium (比 ultrafast 慢数倍)，原来的 "快" 名不副实
+        btn_medium = SlateButton(g_preset, "标准 1080p30", is_selected=True, command=lambda: self._switch_preset("标准 1080p30"))
+        btn_medium.pack(side="left", padx=(0, ITEM_GAP))
+        # 自动：按截止时间试编码测速后选 preset
+        btn_auto = SlateButton(g_preset, "自动", command=lambda: self._switch_preset("自动"))
+        btn_auto.pack(side="left")
+        self.preset_btns = [btn_ultrafast, btn_medium, btn_auto]
 
         action_group = ctk.CTkFrame(row_top, fg_color="transparent")
         action_group.pack(side="right", anchor="e")
@@ -205,10 +294,39 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
         self.start_btn = SlateButton(action_group, "开始转换", mode="start", command=self.start_conversion)
         self.start_btn.pack(side="left", padx=ITEM_GAP)
 
-        # 第二行
-        row = ctk.CTkFrame(ctrl, fg_color="transparent")
-        row.pack(fill="x")
+        # 第二行 (参数输入) 在窗口画出后由 _build_params 填充，先占住高度，避免下方表格跳动
+        self.param_row = ctk.CTkFrame(ctrl, fg_color="transparent", height=32)
+        self.param_row.pack(fill="x")
+        self.param_row.pack_propagate(False)
+
+        # 表格区域
+        self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
+        self.content_frame.pack(fill="both", expand=True, padx=20, pady=(0, 25))
+
+        self.table_box = ctk.CTkFrame(self.content_frame, fg_color="#111827", corner_radius=8, border_width=1, border_color=BORDER_COLOR)
+        self.table_box.pack(fill="both", expand=True)
+
+        self.header = ctk.CTkFrame(self.table_box, fg_color="#1e293b", height=45, corner_radius=0)
+        self.header.pack(fill="x", padx=1, pady=(1, 0))
+        self.header.pack_propagate(False)
+        for i, t in enumerate(["序号", "文件名", "详细信息", "转换进度", "操作"]):
+            side = "left" if i < 4 else "right"
+            cell = ctk.CTkFrame(self.header, width=CW[i], fg_color="transparent")
+            cell.pack_propagate(False)
+            cell.pack(side=side, fill="y")
+            ctk.CTkLabel(cell, text=t, font=FONT_BOLD, text_color="#cbd5e1").pack(fill="both", expand=True)
+            if i < 3:
+                ctk.CTkFrame(self.header, width=1, fg_color=COLOR_GRID).pack(side="left", fill="y")
+
+        # 虚拟列表：一万个文件也只有一屏的 TaskRow 控件
+        self.task_list = VirtualList(self.table_box, self.tasks, 55, lambda parent: TaskRow(parent, self.remove_task, self.show_task_menu),
+                                     lambda w, rec, i: w.show(rec, i), corner_radius=0)
+        self.task_list.pack(fill="both", expand=True, padx=1, pady=1)
+
+        self.update_idletasks()
 
+    def _build_params(self):
+        row = self.param_row
         params = [
             ("背景模糊", "blur", "80", self._bind_scroll_event, (1, 150)),
             ("旋转", "rotate", "0", self._bind_rotate_scroll, None),
@@ -257,30 +375,7 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
             entry = getattr(self, entry_name)
             entry.bind("<FocusOut>", lambda e, ent=entry: ent.configure(insertontime=0))
             entry.bind("<FocusIn>", lambda e, ent=entry: ent.configure(insertontime=600))
-
-        # 表格区域
-        self.content_frame = ctk.CTkFrame(self, fg_color="transparent")
-        self.content_frame.pack(fill="both", expand=True, padx=20, pady=(0, 25))
-
-        self.table_box = ctk.CTkFrame(self.content_frame, fg_color="#111827", corner_radius=8, border_width=1, border_color=BORDER_COLOR)
-        self.table_box.pack(fill="both", expand=True)
-
-        self.header = ctk.CTkFrame(self.table_box, fg_color="#1e293b", height=45, corner_radius=0)
-        self.header.pack(fill="x", padx=1, pady=(1, 0))
-        self.header.pack_propagate(False)
-        for i, t in enumerate(["序号", "文件名", "详细信息", "转换进度", "操作"]):
-            side = "left" if i < 4 else "right"
-            cell = ctk.CTkFrame(self.header, width=CW[i], fg_color="transparent")
-            cell.pack_propagate(False)
-            cell.pack(side=side, fill="y")
-            ctk.CTkLabel(cell, text=t, font=FONT_BOLD, text_color="#cbd5e1").pack(fill="both", expand=True)
-            if i < 3:
-                ctk.CTkFrame(self.header, width=1, fg_color=COLOR_GRID).pack(side="left", fill="y")
-
-        self.scroll = ctk.CTkScrollableFrame(self.table_box, fg_color="transparent", corner_radius=0)
-        self.scroll.pack(fill="both", expand=True, padx=1, pady=1)
-
-        self.update_idletasks()
+        self.params_ready = True
 
     # ────────────────────────────────────────────────
     # 绑定方法
@@ -340,112 +435,164 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
     # ────────────────────────────────────────────────
 
     def get_unique_path(self, dir_path, base_name, ext, mode_str):
-        suffix = f"_{mode_str.replace(':', '_')}"
-        candidate = os.path.join(dir_path, f"{base_name}{suffix}{ext}")
-        if not os.path.exists(candidate):
-            return candidate
-        counter = 1
-        while True:
-            candidate = os.path.join(dir_path, f"{base_name}{suffix}_{counter}{ext}")
-            if not os.path.exists(candidate):
-                return candidate
-            counter += 1
+        # 目录只扫描一次，名字在所有工作线程间原子地占住 (见 outputs.py)，不再逐个 exists 试探
+        return get_allocator().reserve(dir_path, f"{base_name}_{mode_str.replace(':', '_')}", ext)
 
-    def _run_ffmpeg(self, row, cfg):
+    def _job_config(self):
+        """在主线程读取界面上的转换参数 (工作线程不能直接访问 Tk 控件)"""
+        cfg = {'mode': self.selected_ratio, 'preset': 'ultrafast' if "极快" in self.selected_preset else 'medium'}
+        if self.selected_preset == "自动":
+            cfg['preset'] = 'auto'
         try:
-            sigma = int(self.blur_in.get())
-            crf = int(self.qual_in.get())
-            rot_val = self.rotate_in.get()
-            do_rotate = self.rotate_check.get()
-            do_blur = self.blur_check.get()
-
-            do_brightness = self.brightness_check.get()
-            brightness = float(self.brightness_in.get()) / 100.0 if do_brightness else 0.0
-
-            do_contrast = self.contrast_check.get()
-            contrast = float(self.contrast_in.get()) if do_contrast else 1.0
-
-            do_saturation = self.saturation_check.get()
-            saturation = float(self.saturation_in.get()) if do_saturation else 1.0
+            cfg['blur'] = bool(self.blur_check.get())
+            cfg['blur_sigma'] = int(self.blur_in.get())
+            cfg['crf'] = int(self.qual_in.get())
+            if self.rotate_check.get() and self.rotate_in.get() in ["90", "180", "270"]:
+                cfg['rotate'] = int(self.rotate_in.get())
+            if self.brightness_check.get():
+                cfg['brightness'] = float(self.brightness_in.get()) / 100.0
+            if self.contrast_check.get():
+                cfg['contrast'] = float(self.contrast_in.get())
+            if self.saturation_check.get():
+                cfg['saturation'] = float(self.saturation_in.get())
         except Exception:
-            sigma, crf, rot_val, do_rotate, do_blur = 80, 25, "90", False, False
-            brightness, contrast, saturation = 0.0, 1.0, 1.0
-
-        curr_w, curr_h = row.width, row.height
-        if do_rotate and rot_val in ["90", "270"]:
-            curr_w, curr_h = row.height, row.width
-
-        is_target_v = cfg['mode'] == "9:16"
-        tw, th = (1080, 1920) if is_target_v else (1920, 1080)
-        needs_layout = abs((curr_w / curr_h) - (tw / th)) > 0.01
-
-        vf_chain = []
-
-        eq_parts = []
-        if do_brightness:
-            eq_parts.append(f"brightness={brightness:.2f}")
-        if do_contrast:
-            eq_parts.append(f"contrast={contrast:.2f}")
-        if do_saturation:
-            eq_parts.append(f"saturation={saturation:.2f}")
-        if eq_parts:
-            vf_chain.append("eq=" + ":".join(eq_parts))
-
-        if do_rotate:
-            if rot_val == "90": vf_chain.append("transpose=1")
-            elif rot_val == "180": vf_chain.append("transpose=1,transpose=1")
-            elif rot_val == "270": vf_chain.append("transpose=2")
-
-        if needs_layout:
-            if do_blur:
-                blur_vf = f"split=2[main][bg];[bg]scale={'tw' if not is_target_v else '-1'}:{th}:force_original_aspect_ratio=increase,crop={tw}:{th},gblur=sigma={sigma}[bgblur];[main]scale={tw if is_target_v else '-2'}:{'-2' if is_target_v else th}:force_original_aspect_ratio=decrease[fg];[bgblur][fg]overlay=(W-w)/2:(H-h)/2"
-                vf_chain.append(blur_vf.replace('tw', str(tw)))
-            else:
-                vf_chain.append(f"scale={tw}:{th}:force_original_aspect_ratio=decrease,pad={tw}:{th}:(ow-iw)/2:(oh-ih)/2:black")
-        else:
-            vf_chain.append(f"scale={tw}:{th}")
+            cfg = {'mode': cfg['mode'], 'preset': cfg['preset'], 'blur': False, 'blur_sigma': 80, 'crf': 25}
+        return cfg
+
+    def _run_ffmpeg(self, row, cfg, slot=None):
+        self.queued.discard(row.path)
+        control = self.controls[row.path] = JobControl()
+        control.slot = slot
+        try:
+            self._encode(row, cfg, slot, control)
+        finally:
+            self.controls.pop(row.path, None)
 
-        vf_chain.append("format=yuv420p")
+    def _encode(self, row, cfg, slot, control):
+        crf = cfg.get('crf', 25)
+        tw, th = target_size(cfg['mode'])
+        # 滤镜链统一由 filtergraph 编译，同一批里配置和分辨率相同的文件只编译一次
+        w, h = display_size(row.meta) if row.meta else (row.width, row.height)
+        vf = compile_filter(cfg, w, h)
 
         out_dir = self.custom_save_path if self.custom_save_path else os.path.dirname(row.path)
         base_n = os.path.splitext(os.path.basename(row.path))[0]
         out_path = self.get_unique_path(out_dir, base_n, ".mp4", cfg['mode'])
-        row.output_full_path = out_path
+        row.output = out_path
+        self.journal.start(row.path, out_path)
+        if self.plan: self.plan.start(row.path)
+
+        # 先写临时文件，成功后才替换到占好的输出路径上
+        tmp_path = temp_path(out_path)
+
+        # 显式指定每个任务的编码线程数，由调度器按 CPU 核数平分
+        threads = slot.threads if slot else 0
+        # 源已是目标规格且没有调色 / 旋转时不重新编码，直接复制视频流；AAC 音频在各条路径上都直接复制
+        strategy = choose_strategy(row.meta, (tw, th), filters=has_pixel_filters(cfg),
+                                   enabled=cfg.get('passthrough', True))
+        cmd = ['ffmpeg', '-y', '-i', row.path, '-vf', vf, '-c:v', 'libx264', '-preset', cfg['preset'], '-crf', str(crf), '-threads', str(threads), *audio_args(strategy), tmp_path]
+        done_text = "✓ 完成"
+        if strategy['video'] == "copy":
+            cmd = ['ffmpeg', '-y', '-i', row.path, '-map', '0:v?', '-map', '0:a?', '-c:v', 'copy', *audio_args(strategy), tmp_path]
+            done_text = "✓ 封装"
+        elif row.duration >= SEGMENT_THRESHOLD:
+            # 长视频：按关键帧分段并行编码后无损拼接
+            from segments import encode_segmented
+            try:
+                code = encode_segmented(row.path, tmp_path, vf, row.duration,
+                                        {'preset': cfg['preset'], 'crf': crf, 'threads': threads},
+                                        on_progress=lambda p: self._set_status(row, p),
+                                        on_fps=slot.report_fps if slot else None,
+                                        audio=audio_args(strategy), control=control)
+                self._finish(row, code, "", "✓ 完成", control)
+            except Exception as e:
+                get_allocator().release(out_path)
+                self._finish_error(row, e, control)
+            return
 
-        cmd = ['ffmpeg', '-y', '-i', row.path, '-vf', ",".join(vf_chain), '-c:v', 'libx264', '-preset', cfg['preset'], '-crf', str(crf), '-c:a', 'aac', out_path]
+        def on_event(ev):
+            if slot and ev['fps']: slot.report_fps(ev['fps'])
+            if row.duration > 0: self._set_status(row, ev['percent'])
 
         try:
-            process = subprocess.Popen(cmd, stderr=subprocess.PIPE, universal_newlines=True, encoding='utf-8', creationflags=0x08000000)
-            pattern = re.compile(r"time=(\d+):(\d+):(\d+\.\d+)")
-            while True:
-                line = process.stderr.readline()
-                if not line: break
-                match = pattern.search(line)
-                if match and row.duration > 0:
-                    h, m, s = map(float, match.groups())
-                    p = min(int(((h*3600+m*60+s)/row.duration)*100), 99)
-                    self.after(0, lambda val=p: row.update_status(val))
-            process.wait()
-            self.after(0, lambda: row.update_status(100, "✓ 完成", "#10b981", force=True) if process.returncode==0 else row.update_status(0, "失败", "#ef4444", force=True))
-        except: self.after(0, lambda: row.update_status(0, "错误", "#ef4444", force=True))
+            from progress import run_ffmpeg
+            code, err = run_ffmpeg(cmd, row.duration, on_event, control=control)
+            self._finish(row, code, err, done_text, control)
+        except Exception as e:
+            get_allocator().release(out_path)
+            self._finish_error(row, e, control)
+
+    def _finish(self, row, code, err, done_text, control):
+        self._journal_result(row, code, err, control.cancelled)
+        if code == 0:
+            self._set_status(row, 100, done_text, "#10b981")
+        elif control.cancelled:
+            self._set_status(row, 0, CANCELLED, "#475569")
+        else:
+            self._set_status(row, 0, "失败", "#ef4444")
+
+    def _finish_error(self, row, e, control):
+        if control.cancelled:
+            self._set_status(row, 0, CANCELLED, "#475569")
+        else:
+            self._set_status(row, 0, "错误", "#ef4444")
+        self._journal_fail(row.path, CANCELLED if control.cancelled else str(e))
+        if self.plan: self.plan.finish(row.path, 0, 0)
+
+    def _journal_fail(self, path, msg):
+        # 已从列表移除的任务不再写日志，免得重启后又恢复出来
+        if path in self.tasks: self.journal.fail(path, msg)
+
+    def _journal_result(self, row, code, err="", cancelled=False):
+        if code == 0:
+            get_allocator().commit(row.output)
+        else:
+            get_allocator().release(row.output)
+        if self.plan:
+            from planner import output_size
+            self.plan.finish(row.path, None if code == 0 else 0, output_size(row.output) if code == 0 else 0)
+        if code == 0:
+            if row.path in self.tasks: self.journal.finish(row.path, row.output)
+        elif cancelled:
+            self._journal_fail(row.path, CANCELLED)
+        else:
+            last = err.splitlines()[-1] if err else ""
+            self._journal_fail(row.path, f"FFmpeg Error {code}" + (f": {last}" if last else ""))
+
+    def _set_status(self, rec, progress, status_text=None, color=None):
+        # 任意线程调用：只改记录数据，控件由 bus 在主线程重画 (不可见的行不产生任何控件操作)
+        rec.progress = progress
+        rec.status = status_text
+        if color:
+            rec.color = color
+        self.bus.post((rec, "status"), self.task_list.refresh_record, rec)
+
+    def _fill_info(self, row, meta):
+        row.meta = meta
+        row.duration, row.width, row.height = meta['duration'], meta['width'], meta['height']
+        size_mb = os.path.getsize(row.path) / (1024*1024)
+        row.info = f"{int(row.duration//60):02d}:{int(row.duration%60):02d} | {row.width}x{row.height} | {size_mb:.1f}MB"
 
     def _info_worker(self):
         while True:
             row, path = info_queue.get()
             try:
-                cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height,duration', '-of', 'json', path]
-                res = json.loads(subprocess.check_output(cmd, creationflags=0x08000000).decode('utf-8'))
-                if 'streams' in res and res['streams']:
-                    s = res['streams'][0]
-                    row.duration, row.width, row.height = float(s.get('duration', 0)), int(s['width']), int(s['height'])
-                    size_mb = os.path.getsize(path) / (1024*1024)
-                    info = f"{int(row.duration//60):02d}:{int(row.duration%60):02d} | {row.width}x{row.height} | {size_mb:.1f}MB"
-                    self.after(0, lambda r=row, i=info: r.info_cell.configure(text=i))
-            except: self.after(0, lambda r=row: r.info_cell.configure(text="解析失败"))
-            finally: info_queue.task_done()
+                # 先查元数据缓存，再解析容器头，都不行才启动 ffprobe
+                meta = probe_video(path)
+                if meta:
+                    self._fill_info(row, meta)
+                    self.journal.set_meta(path, meta)
+            except: row.info = "解析失败"
+            finally:
+                self.bus.post((row, "info"), self.task_list.refresh_record, row)
+                info_queue.task_done()
 
     def start_conversion(self):
-        if self.is_running or not self.tasks:
+        if self.is_running or not self.params_ready:
+            return
+        # 日志还没整理就开始转换时先整理 (restore 会把 running 的任务当作中断删掉输出)
+        self._restore_jobs()
+        if not self.tasks:
             return
 
         self.last_config_snapshot = {
@@ -466,31 +613,144 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
             "tasks": len(self.tasks)
         }
 
-        self.is_running = True
-        self.start_btn.configure(state="disabled", fg_color="#334155", text_color="#93c5fd", text="转换中...")
-        threading.Thread(target=self._run_all, daemon=True).start()
-
-    def _run_all(self):
         try:
             max_workers = int(self.concurrent_tasks_var.get())
         except:
             max_workers = 2
         max_workers = max(1, min(8, max_workers))
-        pool_sema = threading.Semaphore(max_workers)
-        cfg = {'mode': self.selected_ratio, 'preset': 'ultrafast' if "极快" in self.selected_preset else 'medium'}
-        rows = [r for r in self.scroll.winfo_children() if isinstance(r, TaskRow)]
-        threads = []
-        for r in rows:
-            t = threading.Thread(target=lambda x=r: (pool_sema.acquire(), self._run_ffmpeg(x, cfg), pool_sema.release()))
-            t.start()
-            threads.append(t)
-        for t in threads:
-            t.join()
+
+        cfg = self._job_config()
+        deadline = None
+        if cfg['preset'] == 'auto':
+            from tune import parse_deadline
+            text = ctk.CTkInputDialog(title="自动预设", text="截止时间 (如 45m、2h、23:30):").get_input()
+            try:
+                deadline = parse_deadline(text)
+            except (TypeError, ValueError):
+                return
+
+        if deadline is None and not self._prepare_plan(cfg, max_workers):
+            return
+
+        self.is_running = True
+        self.start_btn.configure(state="disabled", fg_color="#334155", text_color="#93c5fd",
+                                 text="测速中..." if deadline is not None else "转换中...")
+        target = self._tune if deadline is not None else self._run_all
+        args = (cfg, max_workers, deadline) if deadline is not None else (cfg, max_workers)
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+    def _tune(self, cfg, max_workers, deadline):
+        # 用与正式转换相同的并发和线程数试编码，选出能在截止时间前完成的最慢 preset
+        from tune import autotune
+        from scheduler import EncodeScheduler
+        sched = EncodeScheduler(max_jobs=max_workers)
+        rows = list(self.tasks)
+        try:
+            plan = autotune([(r.path, r.meta) for r in rows], cfg, deadline,
+                            concurrency=sched.target, threads=sched.threads_per_job(len(rows)))
+        except Exception as e:
+            self.bus.post(None, self._tune_done, cfg, max_workers, None, str(e))
+            return
+        self.bus.post(None, self._tune_done, cfg, max_workers, plan)
+
+    def _tune_done(self, cfg, max_workers, plan, error=None):
+        from tune import describe
+        if error:
+            messagebox.showerror("自动预设", f"测速失败: {error}")
+        cfg = dict(cfg, preset=plan["preset"]) if plan else cfg
+        if (plan is None or not messagebox.askokcancel("自动预设", describe(plan) + "\n\n开始转换？")
+                or not self._prepare_plan(cfg, max_workers)):
+            self.is_running = False
+            self._update_start_button_state()
+            return
+        self.start_btn.configure(text="转换中...")
+        threading.Thread(target=self._run_all, args=(cfg, max_workers), daemon=True).start()
+
+    def _prepare_plan(self, cfg, max_workers):
+        """开始前估算整批耗时和输出大小，输出磁盘放不下时先确认；用户取消返回 False"""
+        from planner import BatchPlan, format_bytes
+        from scheduler import EncodeScheduler
+        sched = EncodeScheduler(max_jobs=max_workers)
+        rows = list(self.tasks)
+        self.plan = BatchPlan([(r.path, r.meta, cfg) for r in rows], sched.target, sched.threads_per_job(len(rows)))
+        short = self.plan.disk_shortfall(lambda p: self.custom_save_path or os.path.dirname(p))
+        if short and not messagebox.askokcancel("磁盘空间不足", "\n".join(
+                f"{d}: 剩余 {format_bytes(free)}，预计需要 {format_bytes(need)}" for d, free, need in short)
+                + "\n\n仍然开始转换？"):
+            self.plan = None
+            return False
+        self._update_estimate()
+        return True
+
+    def _update_estimate(self):
+        # 标题栏显示剩余时间和输出大小，转换期间每 5 秒按各任务进度刷新
+        if self._estimate_after is not None:
+            self.after_cancel(self._estimate_after)
+            self._estimate_after = None
+        if self.plan is None:
+            self.title(TITLE)
+            return
+        from planner import describe
+        progress = {r.path: r.progress for r in self.tasks if r.path in self.plan.jobs}
+        self.title(f"{TITLE} — {describe(self.plan.summary(progress))}")
+        self._estimate_after = self.after(5000, self._update_estimate)
+
+    def _run_all(self, cfg, max_workers, resume=None):
+        # resume: {路径: 上次记录的参数}，启动时续跑中断的批处理，只跑这些任务并沿用原参数
+        rows = list(self.tasks) if resume is None else [r for r in self.tasks if r.path in resume]
+        configs = {r.path: (resume or {}).get(r.path, cfg) for r in rows}
+        self.journal.queue_many((r.path, configs[r.path]) for r in rows)
+        # "同时任务数" 作为并发上限，实际并发和每个任务的线程数由调度器按核数和实测 fps 决定
+        if self.server is not None:
+            self._run_cluster(rows, configs)
+        else:
+            from scheduler import EncodeScheduler
+            self.scheduler = EncodeScheduler(max_jobs=max_workers)
+            self.queued.update(r.path for r in rows)
+            self.scheduler.run(rows, lambda r, slot: self._run_ffmpeg(r, configs[r.path], slot))
         self.is_running = False
-        self.after(0, self._update_start_button_state)
-        self.after(0, lambda: rows[-1].open_folder() if rows else None)
+        self.plan = None
+        self.scheduler = None
+        self.queued.clear()
+        self.bus.post(None, self._update_start_button_state)
+        self.bus.post(None, lambda: open_record_folder(rows[-1]) if rows else None)
+
+    def _run_cluster(self, rows, configs):
+        """任务交给 JobServer 分派到各节点 (用 VideoWorker 构造命令)，各节点的进度汇总到对应的行"""
+        from planner import output_size
+        by_path = {r.path: r for r in rows}
+
+        def on_event(event, file=None, node=None, **f):
+            row = by_path.get(file)
+            if row is None:
+                return
+            if event == "start":
+                if self.plan: self.plan.start(file)
+                self._set_status(row, 0, f"{node} 处理中...")
+            elif event == "progress":
+                self._set_status(row, f["percent"], f"{node} {f['fps'] or 0:.0f}fps")
+            elif event == "requeued":
+                self._set_status(row, 0, "等待重新分派", "#f59e0b")
+            elif event == "done":
+                row.output = f["output"]
+                if self.plan: self.plan.finish(file, None, output_size(row.output))
+                self._set_status(row, 100, "✓ 完成", "#10b981")
+            elif event in ("error", "cancelled"):
+                if self.plan: self.plan.finish(file, 0, 0)
+                if event == "cancelled":
+                    self._set_status(row, 0, CANCELLED, "#475569")
+                else:
+                    self._set_status(row, 0, "失败", "#ef4444")
+
+        # 输出位置与本机转换相同：自定义目录或源文件所在目录
+        jobs = [(r.path, dict(configs[r.path], out_dir=self.custom_save_path or os.path.dirname(r.path)), r.meta)
+                for r in rows]
+        # 任务日志由服务器按节点报告的输出名 / 结果记录
+        self.server.run(jobs, emit=on_event, journal=self.journal)
 
     def _update_start_button_state(self):
+        if not self.params_ready:
+            return
         cur = {
             "ratio": self.selected_ratio,
             "preset": self.selected_preset,
@@ -522,7 +782,7 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
             self._on_param_changed()
 
     def open_global_folder(self):
-        p = self.custom_save_path if self.custom_save_path else (os.path.dirname(list(self.tasks.keys())[0]) if self.tasks else "")
+        p = self.custom_save_path if self.custom_save_path else (os.path.dirname(next(iter(self.tasks)).path) if self.tasks else "")
         if p and os.path.exists(p):
             if sys.platform == "win32":
                 os.startfile(p)
@@ -551,26 +811,91 @@ class VideoToolApp(ctk.CTk, TkinterDnD.DnDWrapper):
         for f in self.tk.splitlist(event.data):
             f = os.path.normpath(f)
             if f.lower().endswith(('.mp4', '.mov', '.mkv', '.avi', '.ts')) and f not in self.tasks:
-                row = TaskRow(self.scroll, len(self.tasks)+1, f, self.remove_task)
-                row.pack(fill="x")
-                self.tasks[f] = row
+                rec = JobRecord(f)
+                self.tasks.append(rec)
+                self.journal.add(f)
+                info_queue.put((rec, f))
+        self.task_list.refresh()
         self._on_param_changed()
 
     def remove_task(self, p, w):
-        if not self.is_running:
-            w.destroy()
-            self.tasks.pop(p, None)
-            [r.update_index(i) for i, r in enumerate([x for x in self.scroll.winfo_children() if isinstance(x, TaskRow)], 1)]
-            self._on_param_changed()
+        rec = self.tasks.get(p)
+        if rec is None:
+            return
+        # 运行中 / 排队中的任务先取消，未写完的输出由工作线程删除
+        self.cancel_task(rec)
+        # 序号由列表位置推算，删除后无需逐行重新编号
+        self.tasks.remove(p)
+        self.journal.remove(p)
+        self.task_list.refresh()
+        self._on_param_changed()
+
+    # --- 任务控制 (右键菜单) ---
+    def show_task_menu(self, rec, event):
+        menu = Menu(self, tearoff=0)
+        control = self.controls.get(rec.path)
+        if control is not None:
+            if control.paused:
+                menu.add_command(label="继续", command=lambda: self.resume_task(rec))
+            else:
+                menu.add_command(label="暂停", command=lambda: self.pause_task(rec))
+            menu.add_command(label="取消", command=lambda: self.cancel_task(rec))
+        elif rec.path in self.queued:
+            menu.add_command(label="优先处理", command=lambda: self.scheduler.promote(rec))
+            menu.add_command(label="取消", command=lambda: self.cancel_task(rec))
+        elif self.server is not None and self.server.state(rec.path):
+            if self.server.state(rec.path) == "queued":
+                menu.add_command(label="优先处理", command=lambda: self.server.promote(rec.path))
+            menu.add_command(label="取消", command=lambda: self.cancel_task(rec))
+        else:
+            return
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+
+    def pause_task(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None and control.pause():
+            # 暂停的任务不占并发名额，排队的任务会先开始
+            self._set_status(rec, rec.progress, "已暂停", "#f59e0b")
+
+    def resume_task(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None and control.resume():
+            self._set_status(rec, rec.progress, None, "#475569")
+
+    def cancel_task(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None:
+            control.cancel()
+        elif self.server is not None and self.server.cancel(rec.path):
+            pass
+        elif rec.path in self.queued and self.scheduler and self.scheduler.withdraw(rec):
+            self.queued.discard(rec.path)
+            self._journal_fail(rec.path, CANCELLED)
+            if self.plan: self.plan.finish(rec.path, 0, 0)
+            self._set_status(rec, 0, CANCELLED, "#475569")
+
+    def on_closing(self):
+        # 结束所有 ffmpeg 进程组，不留孤儿进程
+        cancel_all()
+        self.destroy()
 
     def clear_all(self):
         if not self.is_running:
-            [w.destroy() for w in self.scroll.winfo_children()]
             self.tasks.clear()
+            self.journal.clear()
+            self.task_list.refresh()
             self.last_config_snapshot = None
             self._on_param_changed()
 
 
 if __name__ == "__main__":
-    app = VideoToolApp()
+    # --listen [HOST:]PORT：作为分布式编码的任务服务器 (见 cluster.py)
+    listen = None
+    if "--listen" in sys.argv:
+        i = sys.argv.index("--listen")
+        listen = sys.argv[i + 1] if i + 1 < len(sys.argv) else "7655"
+    app = VideoToolApp(listen)
     app.mainloop()
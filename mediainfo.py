@@ -0,0 +1,743 @@
+"""不启动 ffprobe 的容器头解析：mp4 / mov、mkv / webm、avi、flv、ts
+
+文件以只读 mmap 打开，只读取描述流的那部分：mp4 的 moov (mvhd / tkhd / mdhd / stsd / stts)、
+mkv 的 EBML Segment Info 和 Tracks、avi 的 hdrl、flv 的 onMetaData 和第一个音视频 tag、
+ts 的 PAT / PMT 和首尾两段的 PES 时间戳。H.264 的宽高和像素格式取自 SPS，与 ffprobe 的结果一致。
+
+返回的 dict 与 worker.ffprobe_video 相同。遇到不认识的编码、加密、缺时长等没把握的情况一律返回 None，
+由调用方回退到 ffprobe。pix_fmt 只对 H.264 解析 (worker.choose_strategy 只在 H.264 时用到它)，
+其他编码为空字符串；帧率无法确定时为 0.0。
+"""
+import os
+import math
+import mmap
+import struct
+
+# ts 首尾各扫描的字节数 (找 SPS 和首 / 末 PTS)
+TS_SCAN = 4 * 1024 * 1024
+# avi 在 movi 开头找 SPS 的字节数
+AVI_SCAN = 1024 * 1024
+
+
+class _Unsupported(Exception):
+    """解析不了或没把握：交给 ffprobe"""
+
+
+# 缺 box / 元素时取下标会得到 TypeError，同样按解析失败处理
+_ERRORS = (_Unsupported, struct.error, IndexError, ValueError, KeyError, TypeError, OverflowError, ZeroDivisionError)
+
+
+def read_header(path):
+    """解析容器头，返回元数据 dict；无法可靠解析时返回 None"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 32:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                parser = _sniff(m)
+                if parser is None:
+                    return None
+                info = parser(m)
+    except OSError:
+        return None
+    except _ERRORS:
+        return None
+    if not info.get("width") or not info.get("height") or not info.get("duration"):
+        return None
+    return {
+        "width": int(info["width"]),
+        "height": int(info["height"]),
+        "duration": float(info["duration"]),
+        "vcodec": info["vcodec"],
+        "pix_fmt": info.get("pix_fmt", ""),
+        "acodec": info.get("acodec", ""),
+        "rotation": int(info.get("rotation", 0)) % 360,
+        "fps": round(info.get("fps") or 0.0, 3),
+        "bitrate": int(size * 8 / info["duration"]),
+    }
+
+
+def _sniff(m):
+    head = m[:12]
+    if head[4:8] in (b"ftyp", b"moov", b"mdat", b"free", b"wide", b"skip", b"pnot"):
+        return _parse_mp4
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return _parse_mkv
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return _parse_avi
+    if head[:3] == b"FLV":
+        return _parse_flv
+    for packet, offset in ((188, 0), (192, 4)):
+        if len(m) >= packet * 3 + offset and all(m[offset + i * packet] == 0x47 for i in range(3)):
+            return lambda m: _parse_ts(m, packet, offset)
+    return None
+
+
+# ---- H.264 SPS ----
+class _Bits:
+    def __init__(self, data):
+        # 去掉防竞争字节 00 00 03
+        self.data = bytes(data).replace(b"\x00\x00\x03", b"\x00\x00")
+        self.pos = 0
+
+    def u(self, n):
+        v = 0
+        for _ in range(n):
+            v = (v << 1) | ((self.data[self.pos >> 3] >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return v
+
+    def ue(self):
+        zeros = 0
+        while not self.u(1):
+            zeros += 1
+            if zeros > 31:
+                raise _Unsupported("exp-golomb")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self):
+        k = self.ue()
+        return (k + 1) // 2 if k & 1 else -(k // 2)
+
+
+# 带 chroma_format_idc / 位深字段的 profile
+_HIGH_PROFILES = (100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135)
+
+
+def _h264_sps(nal):
+    """解析 H.264 SPS (含 1 字节 NAL 头)，返回 {"width", "height", "pix_fmt", "fps"}"""
+    b = _Bits(nal[1:])
+    profile = b.u(8)
+    b.u(16)                 # constraint flags, level
+    b.ue()                  # seq_parameter_set_id
+    chroma, depth = 1, 8
+    if profile in _HIGH_PROFILES:
+        chroma = b.ue()
+        if chroma == 3:
+            b.u(1)
+        depth = b.ue() + 8
+        b.ue()
+        b.u(1)
+        if b.u(1):          # seq_scaling_matrix_present_flag
+            for i in range(12 if chroma == 3 else 8):
+                if b.u(1):
+                    last = nxt = 8
+                    for _ in range(16 if i < 6 else 64):
+                        if nxt:
+                            nxt = (last + b.se()) % 256
+                        last = nxt or last
+    b.ue()                  # log2_max_frame_num_minus4
+    poc = b.ue()
+    if poc == 0:
+        b.ue()
+    elif poc == 1:
+        b.u(1)
+        b.se()
+        b.se()
+        for _ in range(b.ue()):
+            b.se()
+    b.ue()                  # max_num_ref_frames
+    b.u(1)
+    width_mbs, height_maps = b.ue() + 1, b.ue() + 1
+    frame_mbs_only = b.u(1)
+    if not frame_mbs_only:
+        b.u(1)
+    b.u(1)
+    crop = [b.ue() for _ in range(4)] if b.u(1) else [0, 0, 0, 0]
+    full_range, fps = False, 0.0
+    if b.u(1):              # vui_parameters_present_flag
+        if b.u(1) and b.u(8) == 255:
+            b.u(32)         # 扩展 SAR
+        if b.u(1):
+            b.u(1)
+        if b.u(1):          # video_signal_type_present_flag
+            b.u(3)
+            full_range = bool(b.u(1))
+            if b.u(1):
+                b.u(24)
+        if b.u(1):
+            b.ue()
+            b.ue()
+        if b.u(1):          # timing_info_present_flag
+            units, scale = b.u(32), b.u(32)
+            fps = scale / (2.0 * units) if units else 0.0
+    # 裁剪单位：4:2:0 为 2x2，4:2:2 为 2x1，其余 1x1；场编码时纵向再乘 2
+    sub_w, sub_h = {1: (2, 2), 2: (2, 1)}.get(chroma, (1, 1))
+    sub_h *= 2 - frame_mbs_only
+    base = {0: "gray", 1: "yuv420p", 2: "yuv422p", 3: "yuv444p"}[chroma]
+    if depth > 8:
+        pix_fmt = f"{base}{depth}le"
+    elif full_range and chroma:
+        # ffmpeg 的 H.264 解码器把 8 位全范围输出为 yuvj* 格式
+        pix_fmt = base.replace("yuv", "yuvj")
+    else:
+        pix_fmt = base
+    return {
+        "width": width_mbs * 16 - sub_w * (crop[0] + crop[1]),
+        "height": height_maps * 16 * (2 - frame_mbs_only) - sub_h * (crop[2] + crop[3]),
+        "pix_fmt": pix_fmt,
+        "fps": fps,
+    }
+
+
+def _avcc_sps(avcc):
+    # AVCDecoderConfigurationRecord：第 6 字节低 5 位为 SPS 个数，随后是 2 字节长度 + SPS
+    if len(avcc) < 8 or not avcc[5] & 0x1f:
+        raise _Unsupported("avcC without SPS")
+    length = struct.unpack_from(">H", avcc, 6)[0]
+    return _h264_sps(avcc[8:8 + length])
+
+
+def _annexb_sps(data):
+    # 在起始码分隔的码流里找第一个 SPS (nal_unit_type 7)
+    pos = data.find(b"\x00\x00\x01")
+    while pos >= 0:
+        start = pos + 3
+        nxt = data.find(b"\x00\x00\x01", start)
+        if start < len(data) and data[start] & 0x1f == 7:
+            return _h264_sps(data[start:nxt if nxt >= 0 else len(data)])
+        pos = nxt
+    return None
+
+
+def _apply_h264(info, sps):
+    # 宽高以 SPS 为准 (容器里写的可能是显示尺寸或未裁剪的尺寸)；容器没给帧率时用 SPS 的
+    info["width"], info["height"], info["pix_fmt"] = sps["width"], sps["height"], sps["pix_fmt"]
+    if not info.get("fps"):
+        info["fps"] = sps["fps"]
+
+
+# ---- mp4 / mov ----
+_MP4_VIDEO = {b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc", b"dvh1": "hevc", b"dvhe": "hevc",
+              b"av01": "av1", b"vp09": "vp9", b"vp08": "vp8", b"mp4v": "mpeg4", b"jpeg": "mjpeg", b"mjpa": "mjpeg",
+              b"apch": "prores", b"apcn": "prores", b"apcs": "prores", b"apco": "prores", b"ap4h": "prores",
+              b"ap4x": "prores", b"s263": "h263", b"h263": "h263"}
+_MP4_AUDIO = {b"ac-3": "ac3", b"ec-3": "eac3", b"Opus": "opus", b"fLaC": "flac", b"alac": "alac", b".mp3": "mp3",
+              b"sowt": "pcm_s16le", b"twos": "pcm_s16be", b"raw ": "pcm_u8", b"ulaw": "pcm_mulaw",
+              b"alaw": "pcm_alaw", b"samr": "amr_nb", b"sawb": "amr_wb"}
+# esds 里 DecoderConfigDescriptor 的 objectTypeIndication
+_MP4A_OBJECTS = {0x40: "aac", 0x66: "aac", 0x67: "aac", 0x68: "aac", 0x69: "mp3", 0x6b: "mp3",
+                 0xa5: "ac3", 0xa6: "eac3", 0xdd: "vorbis"}
+
+
+def _boxes(m, start, end):
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", m, pos)
+        head = 8
+        if size == 1:
+            size, head = struct.unpack_from(">Q", m, pos + 8)[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < head:
+            raise _Unsupported("bad box size")
+        yield kind, pos + head, min(pos + size, end)
+        pos += size
+
+
+def _child(m, start, end, *path):
+    # 按路径找第一个子 box，返回 (内容起点, 终点)；找不到返回 None
+    for name in path:
+        found = next(((s, e) for kind, s, e in _boxes(m, start, end) if kind == name), None)
+        if found is None:
+            return None
+        start, end = found
+    return start, end
+
+
+def _full_box_times(m, start):
+    # mvhd / mdhd：version 0 为 32 位时间，version 1 为 64 位
+    if m[start] == 1:
+        return struct.unpack_from(">IQ", m, start + 20)
+    return struct.unpack_from(">II", m, start + 12)
+
+
+def _descriptor(m, pos):
+    # MPEG-4 描述符：1 字节 tag + 最多 4 字节的变长长度
+    tag, size = m[pos], 0
+    pos += 1
+    for _ in range(4):
+        byte = m[pos]
+        pos += 1
+        size = (size << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            break
+    return tag, pos, size
+
+
+def _esds_codec(m, start, end):
+    tag, pos, _ = _descriptor(m, start + 4)
+    if tag != 0x03:
+        raise _Unsupported("esds")
+    flags = m[pos + 2]
+    pos += 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + m[pos]
+    if flags & 0x20:
+        pos += 2
+    tag, pos, _ = _descriptor(m, pos)
+    if tag != 0x04 or m[pos] not in _MP4A_OBJECTS:
+        raise _Unsupported("esds object type")
+    return _MP4A_OBJECTS[m[pos]]
+
+
+def _find_box(m, start, end, name):
+    # 在子 box 中找 name，QuickTime 的 mp4a 会把 esds 再包一层 wave
+    for kind, s, e in _boxes(m, start, end):
+        if kind == name:
+            return s, e
+        if kind == b"wave":
+            found = _find_box(m, s, e, name)
+            if found:
+                return found
+    return None
+
+
+def _mp4_track(m, start, end):
+    mdia = _child(m, start, end, b"mdia")
+    hdlr = _child(m, *mdia, b"hdlr")
+    handler = bytes(m[hdlr[0] + 8:hdlr[0] + 12])
+    if handler not in (b"vide", b"soun"):
+        return None
+    timescale, duration = _full_box_times(m, _child(m, *mdia, b"mdhd")[0])
+    stbl = _child(m, *mdia, b"minf", b"stbl")
+    stsd = _child(m, *stbl, b"stsd")
+    fourcc, entry_start, entry_end = next(_boxes(m, stsd[0] + 8, stsd[1]))
+    track = {"handler": handler}
+    if handler == b"soun":
+        if fourcc == b"mp4a":
+            version = struct.unpack_from(">H", m, entry_start + 8)[0]
+            children = entry_start + 28 + {1: 16, 2: 36}.get(version, 0)
+            esds = _find_box(m, children, entry_end, b"esds")
+            track["codec"] = _esds_codec(m, *esds) if esds else "aac"
+        elif fourcc in _MP4_AUDIO:
+            track["codec"] = _MP4_AUDIO[fourcc]
+        else:
+            raise _Unsupported(f"audio {fourcc!r}")
+        return track
+    if fourcc not in _MP4_VIDEO:
+        raise _Unsupported(f"video {fourcc!r}")
+    track["codec"] = _MP4_VIDEO[fourcc]
+    track["width"], track["height"] = struct.unpack_from(">HH", m, entry_start + 24)
+    if track["codec"] == "h264":
+        avcc = _child(m, entry_start + 78, entry_end, b"avcC")
+        if avcc is None:
+            raise _Unsupported("avc1 without avcC")
+        track["sps"] = _avcc_sps(m[avcc[0]:avcc[1]])
+    # 平均帧率 = 样本数 / 轨道时长，与 ffprobe 的 avg_frame_rate 相同
+    stts = _child(m, *stbl, b"stts")
+    if stts and duration and timescale:
+        count = struct.unpack_from(">I", m, stts[0] + 4)[0]
+        frames = sum(struct.unpack_from(">I", m, stts[0] + 8 + i * 8)[0] for i in range(count))
+        track["fps"] = frames * timescale / duration
+    # tkhd 的显示矩阵 (a, b, u, c, d, v, x, y, w)，旋转角的算法同 ffmpeg 的 av_display_rotation_get
+    tkhd = _child(m, start, end, b"tkhd")[0]
+    a, b = struct.unpack_from(">ii", m, tkhd + (52 if m[tkhd] == 1 else 40))
+    track["rotation"] = int(round(-math.degrees(math.atan2(b, a))))
+    return track
+
+
+def _parse_mp4(m):
+    moov = _child(m, 0, len(m), b"moov")
+    if moov is None:
+        raise _Unsupported("no moov")
+    timescale, duration = _full_box_times(m, _child(m, *moov, b"mvhd")[0])
+    if not duration:
+        # 分片 mp4：总时长在 mvex/mehd 里
+        mehd = _child(m, *moov, b"mvex", b"mehd")
+        if mehd is None:
+            raise _Unsupported("fragmented mp4 without mehd")
+        fmt = ">Q" if m[mehd[0]] == 1 else ">I"
+        duration = struct.unpack_from(fmt, m, mehd[0] + 4)[0]
+    video = audio = None
+    for kind, s, e in _boxes(m, *moov):
+        if kind != b"trak":
+            continue
+        track = _mp4_track(m, s, e)
+        if track is None:
+            continue
+        if track["handler"] == b"vide" and video is None:
+            video = track
+        elif track["handler"] == b"soun" and audio is None:
+            audio = track
+    if video is None:
+        raise _Unsupported("no video track")
+    info = {"width": video["width"], "height": video["height"], "duration": duration / timescale,
+            "vcodec": video["codec"], "acodec": audio["codec"] if audio else "",
+            "rotation": video["rotation"], "fps": video.get("fps", 0.0)}
+    if "sps" in video:
+        _apply_h264(info, video["sps"])
+    return info
+
+
+# ---- mkv / webm (EBML) ----
+_MKV_VIDEO = {"V_MPEG4/ISO/AVC": "h264", "V_MPEGH/ISO/HEVC": "hevc", "V_VP8": "vp8", "V_VP9": "vp9",
+              "V_AV1": "av1", "V_MPEG4/ISO/ASP": "mpeg4", "V_MPEG4/ISO/SP": "mpeg4", "V_MPEG2": "mpeg2video",
+              "V_MPEG1": "mpeg1video", "V_MJPEG": "mjpeg", "V_PRORES": "prores", "V_THEORA": "theora"}
+_MKV_AUDIO = {"A_MPEG/L3": "mp3", "A_MPEG/L2": "mp2", "A_AC3": "ac3", "A_EAC3": "eac3", "A_DTS": "dts",
+              "A_OPUS": "opus", "A_VORBIS": "vorbis", "A_FLAC": "flac", "A_TRUEHD": "truehd",
+              "A_PCM/FLOAT/IEEE": "pcm_f32le", "A_ALAC": "alac"}
+
+_SEGMENT, _CLUSTER, _INFO, _TRACKS, _TRACK = 0x18538067, 0x1F43B675, 0x1549A966, 0x1654AE6B, 0xAE
+
+
+def _ebml(m, start, end):
+    pos = start
+    while pos < end:
+        n = 9 - m[pos].bit_length()
+        eid = int.from_bytes(m[pos:pos + n], "big")
+        pos += n
+        n = 9 - m[pos].bit_length()
+        if n > 8:
+            raise _Unsupported("bad EBML size")
+        unknown = (1 << (7 * n)) - 1
+        size = int.from_bytes(m[pos:pos + n], "big") & unknown
+        pos += n
+        # 长度全 1 表示未知长度 (直播录制的 Segment / Cluster)，延伸到父元素末尾
+        stop = end if size == unknown else min(pos + size, end)
+        yield eid, pos, stop
+        pos = stop
+
+
+def _ebml_uint(m, s, e):
+    return int.from_bytes(m[s:e], "big")
+
+
+def _ebml_float(m, s, e):
+    return struct.unpack(">f" if e - s == 4 else ">d", m[s:e])[0]
+
+
+def _ebml_str(m, s, e):
+    return bytes(m[s:e]).rstrip(b"\x00").decode("ascii", "replace")
+
+
+def _mkv_track(m, s, e):
+    track = {"type": 0, "codec": "", "private": None, "default_duration": 0, "bits": 16}
+    for eid, cs, ce in _ebml(m, s, e):
+        if eid == 0x83:
+            track["type"] = _ebml_uint(m, cs, ce)
+        elif eid == 0x86:
+            track["codec"] = _ebml_str(m, cs, ce)
+        elif eid == 0x63A2:
+            track["private"] = bytes(m[cs:ce])
+        elif eid == 0x23E383:
+            track["default_duration"] = _ebml_uint(m, cs, ce)
+        elif eid == 0xE0:       # Video
+            for vid, vs, ve in _ebml(m, cs, ce):
+                if vid == 0xB0:
+                    track["width"] = _ebml_uint(m, vs, ve)
+                elif vid == 0xBA:
+                    track["height"] = _ebml_uint(m, vs, ve)
+                elif vid == 0x7670:
+                    roll = next((_ebml_float(m, ps, pe) for pid, ps, pe in _ebml(m, vs, ve) if pid == 0x7675), 0.0)
+                    track["rotation"] = int(round(-roll))
+        elif eid == 0xE1:       # Audio
+            track["bits"] = next((_ebml_uint(m, bs, be) for aid, bs, be in _ebml(m, cs, ce) if aid == 0x6264), 16)
+    return track
+
+
+def _mkv_audio_codec(track):
+    codec = track["codec"]
+    if codec.startswith("A_AAC"):
+        return "aac"
+    if codec == "A_PCM/INT/LIT":
+        return f"pcm_s{track['bits']}le" if track["bits"] > 8 else "pcm_u8"
+    if codec not in _MKV_AUDIO:
+        raise _Unsupported(f"audio {codec}")
+    return _MKV_AUDIO[codec]
+
+
+def _parse_mkv(m):
+    _, s, e = next(_ebml(m, 0, len(m)))
+    segment = next(((cs, ce) for eid, cs, ce in _ebml(m, e, len(m)) if eid == _SEGMENT), None)
+    if segment is None:
+        raise _Unsupported("no segment")
+    scale, duration, tracks = 1000000, None, None
+    for eid, cs, ce in _ebml(m, *segment):
+        if eid == _INFO:
+            for iid, vs, ve in _ebml(m, cs, ce):
+                if iid == 0x2AD7B1:
+                    scale = _ebml_uint(m, vs, ve)
+                elif iid == 0x4489:
+                    duration = _ebml_float(m, vs, ve)
+        elif eid == _TRACKS:
+            tracks = [_mkv_track(m, ts, te) for tid, ts, te in _ebml(m, cs, ce) if tid == _TRACK]
+        elif eid == _CLUSTER and tracks is not None and duration is not None:
+            # 头部信息都有了，不再逐个跳过数据簇
+            break
+    if not duration or not tracks:
+        raise _Unsupported("mkv without duration / tracks")
+    video = next((t for t in tracks if t["type"] == 1), None)
+    audio = next((t for t in tracks if t["type"] == 2), None)
+    if video is None:
+        raise _Unsupported("no video track")
+    if video["codec"] not in _MKV_VIDEO:
+        raise _Unsupported(f"video {video['codec']}")
+    info = {"width": video.get("width"), "height": video.get("height"), "duration": duration * scale / 1e9,
+            "vcodec": _MKV_VIDEO[video["codec"]], "acodec": _mkv_audio_codec(audio) if audio else "",
+            "rotation": video.get("rotation", 0),
+            "fps": 1e9 / video["default_duration"] if video["default_duration"] else 0.0}
+    if info["vcodec"] == "h264":
+        if not video["private"]:
+            raise _Unsupported("h264 without CodecPrivate")
+        _apply_h264(info, _avcc_sps(video["private"]))
+    return info
+
+
+# ---- avi ----
+_AVI_VIDEO = {b"H264": "h264", b"X264": "h264", b"AVC1": "h264", b"XVID": "mpeg4", b"DIVX": "mpeg4",
+              b"DX50": "mpeg4", b"FMP4": "mpeg4", b"MP4V": "mpeg4", b"MJPG": "mjpeg", b"DIV3": "msmpeg4v3",
+              b"MP43": "msmpeg4v3", b"HEVC": "hevc", b"H265": "hevc", b"HEV1": "hevc"}
+_AVI_AUDIO = {0x55: "mp3", 0x50: "mp2", 0x2000: "ac3", 0xff: "aac", 0x1610: "aac", 0x2001: "dts"}
+
+
+def _riff(m, start, end):
+    # RIFF 块：4 字节 id + 4 字节小端长度，内容按 2 字节对齐；LIST 块的内容以 4 字节类型开头
+    pos = start
+    while pos + 8 <= end:
+        cid, size = struct.unpack_from("<4sI", m, pos)
+        yield cid, pos + 8, min(pos + 8 + size, end)
+        pos += 8 + size + (size & 1)
+
+
+def _parse_avi(m):
+    hdrl = next(((s, e) for cid, s, e in _riff(m, 12, len(m)) if cid == b"LIST" and m[s:s + 4] == b"hdrl"), None)
+    if hdrl is None:
+        raise _Unsupported("no hdrl")
+    video = audio = None
+    for cid, s, e in _riff(m, hdrl[0] + 4, hdrl[1]):
+        if cid != b"LIST" or m[s:s + 4] != b"strl":
+            continue
+        chunks = {c: (cs, ce) for c, cs, ce in _riff(m, s + 4, e)}
+        strh, strf = chunks[b"strh"][0], chunks[b"strf"][0]
+        kind = bytes(m[strh:strh + 4])
+        if kind == b"vids" and video is None:
+            scale, rate = struct.unpack_from("<II", m, strh + 20)
+            length = struct.unpack_from("<I", m, strh + 32)[0]
+            width, height, compression = struct.unpack_from("<ii4x4s", m, strf + 4)
+            if compression.upper() not in _AVI_VIDEO:
+                raise _Unsupported(f"video {compression!r}")
+            video = {"width": width, "height": abs(height), "codec": _AVI_VIDEO[compression.upper()],
+                     "fps": rate / scale, "duration": length * scale / rate}
+        elif kind == b"auds" and audio is None:
+            tag, bits = struct.unpack_from("<H12xH", m, strf)
+            if tag == 1:
+                audio = f"pcm_s{bits}le" if bits > 8 else "pcm_u8"
+            elif tag in _AVI_AUDIO:
+                audio = _AVI_AUDIO[tag]
+            else:
+                raise _Unsupported(f"audio tag {tag:#x}")
+    if video is None:
+        raise _Unsupported("no video stream")
+    info = {"width": video["width"], "height": video["height"], "duration": video["duration"],
+            "vcodec": video["codec"], "acodec": audio or "", "fps": video["fps"]}
+    if info["vcodec"] == "h264":
+        # avi 里的 H.264 是起始码格式，SPS 在 movi 开头的第一个关键帧前面
+        movi = next((s for cid, s, e in _riff(m, 12, len(m)) if cid == b"LIST" and m[s:s + 4] == b"movi"), None)
+        sps = _annexb_sps(m[movi:movi + AVI_SCAN]) if movi is not None else None
+        if sps is None:
+            raise _Unsupported("h264 SPS not found")
+        _apply_h264(info, sps)
+    return info
+
+
+# ---- flv ----
+_FLV_VIDEO = {2: "flv1", 4: "vp6f", 5: "vp6a", 7: "h264", 12: "hevc"}
+_FLV_AUDIO = {10: "aac", 2: "mp3", 14: "mp3", 11: "speex", 0: "pcm_s16le", 3: "pcm_s16le",
+              4: "nellymoser", 5: "nellymoser", 6: "nellymoser", 7: "pcm_alaw", 8: "pcm_mulaw"}
+
+
+def _amf(m, pos):
+    # AMF0 值：返回 (值, 下一个位置)；onMetaData 只会用到这几种类型
+    kind = m[pos]
+    pos += 1
+    if kind == 0:
+        return struct.unpack_from(">d", m, pos)[0], pos + 8
+    if kind == 1:
+        return bool(m[pos]), pos + 1
+    if kind == 2:
+        n = struct.unpack_from(">H", m, pos)[0]
+        return bytes(m[pos + 2:pos + 2 + n]).decode("utf-8", "replace"), pos + 2 + n
+    if kind in (3, 8):
+        if kind == 8:
+            pos += 4        # ECMA 数组的元素个数 (不可靠，以结束标记为准)
+        obj = {}
+        while True:
+            n = struct.unpack_from(">H", m, pos)[0]
+            if n == 0 and m[pos + 2] == 9:
+                return obj, pos + 3
+            key = bytes(m[pos + 2:pos + 2 + n]).decode("utf-8", "replace")
+            obj[key], pos = _amf(m, pos + 2 + n)
+    if kind == 10:
+        count, pos, items = struct.unpack_from(">I", m, pos)[0], pos + 4, []
+        for _ in range(count):
+            value, pos = _amf(m, pos)
+            items.append(value)
+        return items, pos
+    if kind in (5, 6):
+        return None, pos
+    if kind == 11:
+        return struct.unpack_from(">d", m, pos)[0], pos + 10
+    raise _Unsupported(f"AMF0 type {kind}")
+
+
+def _parse_flv(m):
+    pos = struct.unpack_from(">I", m, 5)[0] + 4
+    meta, vcodec, acodec, sps = {}, None, None, None
+    # 只看开头的若干 tag：onMetaData、视频的序列头和第一个音频 tag
+    for _ in range(64):
+        if pos + 11 > len(m):
+            break
+        kind, size = m[pos], int.from_bytes(m[pos + 1:pos + 4], "big")
+        data = pos + 11
+        if kind == 18 and not meta:
+            name, after = _amf(m, data)
+            if name == "onMetaData":
+                meta = _amf(m, after)[0] or {}
+        elif kind == 9 and vcodec is None:
+            if m[data] & 0x80:
+                raise _Unsupported("enhanced flv")
+            codec_id = m[data] & 0x0f
+            if codec_id not in _FLV_VIDEO:
+                raise _Unsupported(f"flv video codec {codec_id}")
+            vcodec = _FLV_VIDEO[codec_id]
+            if vcodec == "h264" and m[data + 1] == 0:
+                sps = _avcc_sps(m[data + 5:data + size])
+        elif kind == 8 and acodec is None:
+            fmt = m[data] >> 4
+            if fmt not in _FLV_AUDIO:
+                raise _Unsupported(f"flv audio format {fmt}")
+            acodec = _FLV_AUDIO[fmt]
+        pos = data + size + 4
+        if vcodec and acodec and meta:
+            break
+    if vcodec is None:
+        raise _Unsupported("no video tag")
+    info = {"width": meta.get("width"), "height": meta.get("height"), "duration": meta.get("duration"),
+            "vcodec": vcodec, "acodec": acodec or "", "fps": meta.get("framerate") or 0.0}
+    if vcodec == "h264":
+        if sps is None:
+            raise _Unsupported("h264 sequence header not found")
+        _apply_h264(info, sps)
+    return info
+
+
+# ---- mpeg-ts ----
+_TS_VIDEO = {0x1b: "h264", 0x02: "mpeg2video", 0x01: "mpeg1video"}
+_TS_AUDIO = {0x0f: "aac", 0x11: "aac_latm", 0x03: "mp2", 0x04: "mp2", 0x81: "ac3", 0x87: "eac3"}
+# ffmpeg 能识别但这里不解析的视频流 (HEVC 等)：交给 ffprobe
+_TS_OTHER_VIDEO = (0x10, 0x24, 0x42, 0xd1, 0xea)
+# mpeg-2 序列头的 frame_rate_code
+_MPEG2_RATES = {1: 24000 / 1001, 2: 24.0, 3: 25.0, 4: 30000 / 1001, 5: 30.0, 6: 50.0, 7: 60000 / 1001, 8: 60.0}
+
+
+def _ts_packets(m, start, end, packet, offset):
+    # 逐个 ts 包，返回 (pid, 是否 PES 起始, 负载起点, 负载终点)
+    pos = start + offset
+    while pos + 188 <= end:
+        if m[pos] != 0x47:
+            raise _Unsupported("lost ts sync")
+        flags, control = struct.unpack_from(">H", m, pos + 1)[0], m[pos + 3]
+        payload = pos + 4
+        if control & 0x20:
+            payload += 1 + m[pos + 4]
+        if control & 0x10 and payload < pos + 188:
+            yield flags & 0x1fff, bool(flags & 0x4000), payload, pos + 188
+        pos += packet
+
+
+def _psi_section(m, s, e):
+    # PSI 表：跳过 pointer_field，返回 (section 起点, 不含 CRC 的终点)
+    s += 1 + m[s]
+    length = struct.unpack_from(">H", m, s + 1)[0] & 0x0fff
+    return s, min(s + 3 + length - 4, e)
+
+
+def _pes_pts(m, s):
+    if m[s:s + 3] != b"\x00\x00\x01" or not m[s + 7] & 0x80:
+        return None
+    p = m[s + 9:s + 14]
+    return ((p[0] >> 1) & 7) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+
+
+def _parse_ts(m, packet, offset):
+    head_end = min(len(m), TS_SCAN)
+    pmt_pid = video_pid = None
+    vcodec = acodec = None
+    first_pts, es = None, bytearray()
+    for pid, start, s, e in _ts_packets(m, 0, head_end, packet, offset):
+        if pid == 0 and pmt_pid is None and start:
+            s, e = _psi_section(m, s, e)
+            for i in range(s + 8, e, 4):
+                program, ppid = struct.unpack_from(">HH", m, i)
+                if program:
+                    pmt_pid = ppid & 0x1fff
+                    break
+        elif pid == pmt_pid and video_pid is None and start:
+            s, e = _psi_section(m, s, e)
+            i = s + 12 + (struct.unpack_from(">H", m, s + 10)[0] & 0x0fff)
+            while i + 5 <= e:
+                stype, spid, info_len = m[i], *struct.unpack_from(">HH", m, i + 1)
+                spid, info_len = spid & 0x1fff, info_len & 0x0fff
+                if stype in _TS_VIDEO and video_pid is None:
+                    video_pid, vcodec = spid, _TS_VIDEO[stype]
+                elif stype in _TS_OTHER_VIDEO and video_pid is None:
+                    raise _Unsupported(f"ts stream type {stype:#x}")
+                elif stype in _TS_AUDIO and acodec is None:
+                    acodec = _TS_AUDIO[stype]
+                elif stype == 0x06 and acodec is None:
+                    # 私有流：靠描述符识别 AC-3 / E-AC-3
+                    tags = {m[j] for j in _descriptor_offsets(m, i + 5, i + 5 + info_len)}
+                    acodec = "ac3" if 0x6a in tags else "eac3" if 0x7a in tags else None
+                i += 5 + info_len
+            if video_pid is None:
+                raise _Unsupported("no video stream")
+        elif pid == video_pid and pid is not None:
+            if start:
+                if first_pts is None:
+                    first_pts = _pes_pts(m, s)
+                s += 9 + m[s + 8]
+            es += m[s:e]
+            if len(es) > 256 * 1024:
+                break
+    if video_pid is None or first_pts is None:
+        raise _Unsupported("ts header not found")
+    info = {"vcodec": vcodec, "acodec": acodec or ""}
+    if vcodec == "h264":
+        sps = _annexb_sps(bytes(es))
+        if sps is None:
+            raise _Unsupported("h264 SPS not found")
+        _apply_h264(info, sps)
+    else:
+        seq = bytes(es).find(b"\x00\x00\x01\xb3")
+        if seq < 0:
+            raise _Unsupported("mpeg-2 sequence header not found")
+        b = es[seq + 4:seq + 8]
+        info["width"], info["height"] = b[0] << 4 | b[1] >> 4, (b[1] & 0x0f) << 8 | b[2]
+        info["fps"] = _MPEG2_RATES.get(b[3] & 0x0f, 0.0)
+    # 末尾一段里视频流的最后一个 PTS；跨越 33 位回绕时补上一圈
+    tail = max(0, len(m) - TS_SCAN)
+    tail -= tail % packet
+    last_pts = None
+    for pid, start, s, e in _ts_packets(m, tail, len(m), packet, offset):
+        if pid == video_pid and start:
+            pts = _pes_pts(m, s)
+            if pts is not None:
+                last_pts = pts
+    if last_pts is None:
+        raise _Unsupported("no trailing PTS")
+    if last_pts < first_pts:
+        last_pts += 1 << 33
+    frame = 1.0 / info["fps"] if info.get("fps") else 0.0
+    info["duration"] = (last_pts - first_pts) / 90000.0 + frame
+    return info
+
+
+def _descriptor_offsets(m, start, end):
+    pos = start
+    while pos + 2 <= end:
+        yield pos
+        pos += 2 + m[pos + 1]
@@ -0,0 +1,81 @@
+import os
+import json
+import sqlite3
+import threading
+
+from worker import cache_dir
+
+
+class MetaCache:
+    """视频元数据 (容器头解析或 ffprobe 的结果) 的本地 SQLite 缓存。
+
+    以绝对路径为键，同时记录文件大小和修改时间 (纳秒)；两者任一变化即视为失效，
+    下次读取时重新探测并覆盖旧记录。数据库不可用 (只读目录等) 时退化为不缓存。
+    """
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        try:
+            self.path = path or os.path.join(cache_dir(), "meta.sqlite3")
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta ("
+                             "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, data TEXT)")
+            self._db.commit()
+        except (OSError, sqlite3.Error):
+            self._db = None
+
+    @staticmethod
+    def _key(path):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        return path, st.st_size, st.st_mtime_ns
+
+    def get(self, path):
+        if self._db is None:
+            return None
+        try:
+            key, size, mtime_ns = self._key(path)
+            with self._lock:
+                row = self._db.execute("SELECT size, mtime_ns, data FROM meta WHERE path=?", (key,)).fetchone()
+        except (OSError, sqlite3.Error):
+            return None
+        if row and row[0] == size and row[1] == mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def put(self, path, meta):
+        if self._db is None:
+            return
+        try:
+            key, size, mtime_ns = self._key(path)
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?)",
+                                 (key, size, mtime_ns, json.dumps(meta)))
+                self._db.commit()
+        except (OSError, sqlite3.Error):
+            pass
+
+    def prune(self):
+        """删除源文件已不存在的记录"""
+        if self._db is None:
+            return 0
+        with self._lock:
+            paths = [r[0] for r in self._db.execute("SELECT path FROM meta")]
+            gone = [(p,) for p in paths if not os.path.exists(p)]
+            self._db.executemany("DELETE FROM meta WHERE path=?", gone)
+            self._db.commit()
+        return len(gone)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """进程内共享的默认缓存实例"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetaCache()
+        return _cache
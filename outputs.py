@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+
+# 输出文件名分配
+#
+# 原来每个任务从 name_suffix.mp4、name_suffix_1.mp4 ... 逐个 os.path.exists 试探，输出目录里有
+# 几千个文件时每个任务要 stat 几千次；而且试探和 ffmpeg -y 写入之间什么也没占住，并发的两个任务
+# 可能选中同一个名字，后写的静默覆盖先写的。
+#
+# 这里每个目录只 scandir 一次建立文件名索引，并为每个名字前缀记住下一个可用序号，分配是 O(1) 的；
+# 选中的名字在锁内登记并用 O_CREAT | O_EXCL 建一个空的占位文件，其他线程 / 进程都不会再选中它。
+# ffmpeg 写到同目录的隐藏临时文件 (temp_path)，成功后 commit() 原子替换占位文件，失败时 release()
+# 删除两者。进程崩溃时留下的占位和临时文件由任务日志 restore() 清理。
+
+
+def _norm(name):
+    # Windows / macOS 的文件名不区分大小写
+    return name.lower() if sys.platform in ("win32", "darwin") else name
+
+
+def temp_path(path):
+    """path 对应的临时文件：同目录、以点开头 (监视模式和目录扫描会跳过)，扩展名不变以便 ffmpeg 识别格式"""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.part{ext}")
+
+
+class OutputAllocator:
+    """按目录索引分配输出文件名 (线程安全)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}     # 目录 -> 已存在 / 已分配的文件名集合
+        self._next = {}      # (目录, 前缀 + 扩展名) -> 下一个要试的序号
+
+    def _index(self, directory):
+        names = self._names.get(directory)
+        if names is None:
+            os.makedirs(directory, exist_ok=True)
+            with os.scandir(directory) as it:
+                names = self._names[directory] = {_norm(e.name) for e in it}
+        return names
+
+    def reserve(self, directory, stem, ext=".mp4"):
+        """分配 directory 下的 stem.ext 或 stem_N.ext (N 从 1 递增)，建好占位文件后返回完整路径"""
+        directory = os.path.abspath(directory)
+        with self._lock:
+            names = self._index(directory)
+            key = (directory, _norm(stem + ext))
+            n = self._next.get(key, 0)
+            while True:
+                name = f"{stem}{ext}" if n == 0 else f"{stem}_{n}{ext}"
+                n += 1
+                if _norm(name) in names:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    # 索引建立之后别的进程也可能建了同名文件，O_EXCL 保证不会覆盖
+                    os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+                except FileExistsError:
+                    names.add(_norm(name))
+                    continue
+                names.add(_norm(name))
+                self._next[key] = n
+                return path
+
+    def commit(self, path):
+        """把写完的临时文件替换到占位文件上"""
+        os.replace(temp_path(path), path)
+
+    def release(self, path):
+        """任务失败：删除占位文件和临时文件 (名字不再回收，避免与仍在使用它的进程冲突)"""
+        for p in (temp_path(path), path):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_allocator():
+    """进程内共享的分配器"""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = OutputAllocator()
+        return _allocator
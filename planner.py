@@ -0,0 +1,289 @@
+"""批处理开始前估算耗时和输出大小，并在任务完成时用实测结果修正
+
+速度按 "每个编码线程每秒处理的源帧数" 记录，输出大小按 "每像素每帧的比特数 (bpp)" 记录并折算到
+crf 23，两者都以 (preset, 比例, 是否模糊, 源分辨率档) 为键保存在 cache_dir()/throughput.json 中，
+每完成一个任务更新一次 (指数滑动平均)。没有历史记录的配置先用内置的经验值。
+"""
+import os
+import json
+import time
+import heapq
+import shutil
+import threading
+
+from worker import cache_dir, choose_strategy
+from filtergraph import display_size, has_pixel_filters, target_size
+
+# 无历史记录时的经验值：1080p 源、单线程、不模糊时每秒能编码的帧数和 crf 23 下的 bpp
+PRIOR_FPT = {"ultrafast": 40.0, "superfast": 30.0, "veryfast": 22.0, "faster": 15.0,
+             "fast": 11.0, "medium": 8.0, "slow": 5.0, "slower": 2.5, "veryslow": 1.2}
+PRIOR_BPP = {"ultrafast": 0.12, "superfast": 0.10, "veryfast": 0.08, "faster": 0.075,
+             "fast": 0.075, "medium": 0.07, "slow": 0.065, "slower": 0.063, "veryslow": 0.06}
+# 源分辨率档对速度的影响 (解码 + 缩放)；模糊背景的额外开销
+CLASS_SPEED = {"sd": 1.6, "hd": 1.0, "uhd": 0.5}
+BLUR_SPEED = 0.8
+# 直接复制视频流时只受磁盘速度限制 (字节 / 秒)
+REMUX_RATE = 150e6
+AUDIO_BYTES_PER_SEC = 192000 / 8
+# 历史记录的滑动平均权重
+ALPHA = 0.3
+
+
+def _class(meta):
+    w, h = display_size(meta)
+    pixels = w * h
+    return "sd" if pixels <= 1280 * 720 else ("hd" if pixels <= 1920 * 1088 else "uhd")
+
+
+def config_key(meta, config):
+    return "|".join([config.get('preset', 'ultrafast'), config.get('mode', "9:16"),
+                     "blur" if config.get('blur') else "pad", _class(meta)])
+
+
+def _crf_scale(crf):
+    # x264 经验规律：crf 每增加 6，码率约减半
+    return 2 ** ((23 - float(crf)) / 6)
+
+
+class ThroughputHistory:
+    """各配置实测吞吐的本地记录 (JSON，原子替换写入)"""
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_dir(), "throughput.json")
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return dict(entry) if entry else None
+
+    def record(self, key, fpt, bpp):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = {"fpt": fpt, "bpp": bpp, "n": 0}
+            else:
+                entry["fpt"] += ALPHA * (fpt - entry["fpt"])
+                if bpp is not None:
+                    # 输出大小异常 (比如只有音频) 时只更新速度
+                    entry["bpp"] = bpp if entry["bpp"] is None else entry["bpp"] + ALPHA * (bpp - entry["bpp"])
+            entry["n"] += 1
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f, indent=1)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+
+def _outputs(config):
+    """任务实际编码的输出规格列表 (多规格任务每个规格一项)"""
+    specs = config.get('renditions')
+    return [dict(config, **spec) for spec in specs] if specs else [config]
+
+
+def estimate_job(meta, config, threads, history=None, size=0):
+    """估算一个任务：返回 {"seconds", "bytes", "basis"}，basis 为 history / prior / copy / unknown"""
+    if not meta or not meta.get('duration'):
+        return {"seconds": 0.0, "bytes": 0, "basis": "unknown"}
+    duration = meta['duration']
+    frames = duration * (meta.get('fps') or 30.0)
+    specs = _outputs(config)
+    strategy = choose_strategy(meta, target_size(config.get('mode', "9:16")), filters=has_pixel_filters(config),
+                               enabled=config.get('passthrough', True) and len(specs) == 1)
+    if strategy['video'] == "copy":
+        return {"seconds": round(size / REMUX_RATE, 1), "bytes": int(size), "basis": "copy"}
+    seconds, total, basis = 0.0, 0.0, "history"
+    for spec in specs:
+        entry = history.get(config_key(meta, spec)) if history else None
+        preset = spec.get('preset', 'ultrafast')
+        if entry:
+            fpt = entry["fpt"]
+        else:
+            fpt = PRIOR_FPT.get(preset, PRIOR_FPT["medium"]) * CLASS_SPEED[_class(meta)]
+            fpt *= BLUR_SPEED if spec.get('blur') else 1.0
+        bpp = entry["bpp"] if entry and entry["bpp"] is not None else PRIOR_BPP.get(preset, PRIOR_BPP["medium"])
+        if not entry or entry["bpp"] is None:
+            basis = "prior"
+        tw, th = target_size(spec.get('mode', "9:16"))
+        seconds += frames / (fpt * max(1, threads))
+        total += frames * tw * th * bpp * _crf_scale(spec.get('crf', 23)) / 8 + duration * AUDIO_BYTES_PER_SEC
+    return {"seconds": round(seconds, 1), "bytes": int(total), "basis": basis}
+
+
+def output_size(output):
+    """输出文件总大小 (多规格任务的 output 为路径列表)，不存在的文件按 0 计"""
+    total = 0
+    for p in (output if isinstance(output, list) else [output]):
+        try:
+            total += os.path.getsize(p)
+        except (OSError, TypeError):
+            pass
+    return total
+
+
+def _device(path):
+    # 输出目录可能还不存在，取最近的已存在上级目录所在的磁盘
+    while path and not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+class BatchPlan:
+    """一批任务的估算。
+
+    jobs 为 [(路径, 元数据, 配置)]；start(路径) / finish(路径, 耗时, 输出字节数) 在任务开始和结束时调用，
+    finish 同时写入吞吐历史，并按本批已完成任务的 实际 / 估算 比例修正其余任务的估算。
+    """
+    def __init__(self, jobs, concurrency=1, threads=0, history=None):
+        self.history = history if history is not None else ThroughputHistory()
+        self.concurrency = max(1, concurrency)
+        self.threads = threads or 1
+        self.jobs = {}
+        for path, meta, config in jobs:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            est = estimate_job(meta, config, self.threads, self.history, size)
+            self.jobs[path] = dict(est, meta=meta, config=config, started=None, elapsed=None, output_bytes=None)
+        self.factor = self.size_factor = 1.0
+        self._actual = self._predicted = 0.0
+        self._actual_bytes = self._predicted_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_bytes(self):
+        """已完成的按实际大小，其余按估算乘以本批的 实际 / 估算 比例"""
+        return int(sum(j["bytes"] * (1.0 if j["basis"] == "copy" else self.size_factor)
+                       if j["output_bytes"] is None else j["output_bytes"] for j in self.jobs.values()))
+
+    def calibrate(self, samples, speed, concurrency):
+        """用试编码实测的整体速度 (源秒 / 墙钟秒，见 tune.measure_preset) 校准全部重新编码任务的估算。
+
+        samples 为 tune.pick_samples 的结果：按估算，这些样本并发编码的整体速度应为各自速度之和。
+        """
+        rates = []
+        for path, meta, _, _ in samples:
+            j = self.jobs.get(path)
+            if j and j["seconds"] and j["basis"] != "copy":
+                rates.append(meta['duration'] / j["seconds"])
+        if not rates or not speed:
+            return
+        factor = sum(rates) / len(rates) * min(concurrency, len(samples)) / speed
+        with self._lock:
+            for j in self.jobs.values():
+                if j["basis"] not in ("copy", "unknown"):
+                    j["seconds"], j["basis"] = round(j["seconds"] * factor, 1), "sample"
+
+    def disk_shortfall(self, out_dir_of):
+        """按输出所在磁盘汇总预计大小，返回空间不够的 [(目录, 可用字节, 需要字节)]"""
+        need, where = {}, {}
+        for path, j in self.jobs.items():
+            d = _device(out_dir_of(path))
+            try:
+                dev = os.stat(d).st_dev
+            except OSError:
+                continue
+            need[dev] = need.get(dev, 0) + j["bytes"]
+            where.setdefault(dev, d)
+        short = []
+        for dev, n in need.items():
+            free = shutil.disk_usage(where[dev]).free
+            if n > free:
+                short.append((where[dev], free, n))
+        return short
+
+    def start(self, path):
+        job = self.jobs.get(path)
+        if job:
+            job["started"] = time.time()
+
+    def finish(self, path, elapsed, output_bytes, threads=None):
+        """elapsed 为 None 时按 start() 记录的时间计算；失败的任务传 elapsed=0"""
+        job = self.jobs.get(path)
+        if not job:
+            return
+        if elapsed is None:
+            elapsed = time.time() - job["started"] if job["started"] else 0
+        with self._lock:
+            job["elapsed"], job["output_bytes"] = elapsed, output_bytes
+            if job["basis"] in ("copy", "unknown") or elapsed <= 0:
+                return
+            self._actual += elapsed
+            self._predicted += job["seconds"]
+            self.factor = self._actual / self._predicted if self._predicted else 1.0
+            self._actual_bytes += output_bytes
+            self._predicted_bytes += job["bytes"]
+            self.size_factor = self._actual_bytes / self._predicted_bytes if self._predicted_bytes else 1.0
+        meta, specs = job["meta"], _outputs(job["config"])
+        frames = meta['duration'] * (meta.get('fps') or 30.0)
+        threads = threads or self.threads
+        # 多规格任务的耗时和大小按输出数平摊到各规格
+        for spec in specs:
+            tw, th = target_size(spec.get('mode', "9:16"))
+            fpt = frames * len(specs) / elapsed / max(1, threads)
+            bpp = (output_bytes / len(specs) - meta['duration'] * AUDIO_BYTES_PER_SEC) * 8 / (frames * tw * th)
+            self.history.record(config_key(meta, spec), fpt, bpp / _crf_scale(spec.get('crf', 23)) if bpp > 0 else None)
+
+    def remaining(self, progress=None):
+        """剩余墙钟时间估算；progress 为 {路径: 百分比}，用于折算运行中的任务"""
+        progress = progress or {}
+        now = time.time()
+        running, waiting = [], []
+        for path, j in self.jobs.items():
+            if j["elapsed"] is not None:
+                continue
+            est = j["seconds"] * (self.factor if j["basis"] != "copy" else 1.0)
+            if j["started"] is not None:
+                pct = progress.get(path)
+                left = est * (1 - pct / 100) if pct else est - (now - j["started"])
+                running.append(max(0.0, left))
+            else:
+                waiting.append(est)
+        # 运行中的任务占着槽位，排队的任务接在它们后面
+        slots = running + [0.0] * max(0, self.concurrency - len(running))
+        heapq.heapify(slots)
+        for d in waiting:
+            heapq.heapreplace(slots, slots[0] + d)
+        return max(slots) if slots else 0.0
+
+    def summary(self, progress=None):
+        left = self.remaining(progress)
+        done = sum(1 for j in self.jobs.values() if j["elapsed"] is not None)
+        return {
+            "jobs": len(self.jobs),
+            "done": done,
+            "seconds": round(left, 1),
+            "finish": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + left)),
+            "bytes": self.total_bytes,
+            "factor": round(self.factor, 3),
+            "size_factor": round(self.size_factor, 3),
+            "basis": sorted({j["basis"] for j in self.jobs.values()}),
+        }
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f}{unit}" if unit != "B" else f"{n}B"
+        n /= 1024
+
+
+def format_seconds(s):
+    s = int(s)
+    return f"{s // 3600}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+
+def describe(summary):
+    """给界面标题栏显示的一句话"""
+    return (f"剩余约 {format_seconds(summary['seconds'])}，预计 {summary['finish'][11:16]} 完成，"
+            f"输出约 {format_bytes(summary['bytes'])} ({summary['done']}/{summary['jobs']})")
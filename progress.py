@@ -0,0 +1,105 @@
+import time
+import subprocess
+import threading
+from collections import deque
+
+from worker import NO_WINDOW
+import supervisor
+
+
+def _num(value, cast=float):
+    # -progress 在拿不到数值时输出 N/A
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return cast(0)
+
+
+class ProgressParser:
+    """解析 ffmpeg -progress 输出。
+
+    输出是若干 key=value 行组成的块，每块以 progress=continue / progress=end 结尾。
+    每收完一块回调一次 on_event(dict)，字段：
+        out_time (秒)、frame、fps、speed (倍速)、total_size (字节)、percent、eta (秒)、done
+    """
+    def __init__(self, duration=0.0, on_event=None):
+        self.duration = duration
+        self.on_event = on_event
+        self.start = time.time()
+        self.block = {}
+        self.last = None
+
+    def feed_line(self, line):
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return
+        if key != "progress":
+            self.block[key] = value
+            return
+        # 不清空 block：个别版本的结束块只带部分字段，缺的沿用上一块的值
+        self.last = self._event(value == "end")
+        if self.on_event:
+            self.on_event(self.last)
+
+    def _event(self, done):
+        b = self.block
+        # 老版本只有 out_time_ms (其实单位也是微秒)
+        out_time = _num(b.get('out_time_us', b.get('out_time_ms')), int) / 1e6
+        speed = _num(b.get('speed', '').rstrip('x'))
+        elapsed = time.time() - self.start
+        if not speed and out_time and elapsed:
+            speed = out_time / elapsed
+        remaining = max(self.duration - out_time, 0.0)
+        return {
+            "out_time": round(out_time, 3),
+            "frame": _num(b.get('frame'), int),
+            "fps": _num(b.get('fps')),
+            "speed": round(speed, 3),
+            "total_size": _num(b.get('total_size'), int),
+            "percent": min(int(out_time / self.duration * 100), 99) if self.duration > 0 else 0,
+            "eta": round(remaining / speed, 1) if speed else None,
+            "done": done,
+        }
+
+
+def _drain(pipe, ring):
+    for raw in iter(pipe.readline, b''):
+        ring.append(raw.decode('utf-8', 'replace').rstrip())
+    pipe.close()
+
+
+def run_ffmpeg(cmd, duration=0.0, on_event=None, tail=40, control=None, cpus=None, **popen_kwargs):
+    """运行 ffmpeg，结构化进度走 stdout (-progress pipe:1)，stderr 只保留最后 tail 行用于报错。
+
+    cmd[0] 为 ffmpeg 可执行文件，且输出不能是 stdout。control 为 jobctl.JobControl 时进程可被取消 / 暂停，
+    control.usage 不为 None 时记录进程的 CPU 时间和峰值内存 (见 telemetry.ProcessUsage)。
+    进程由 supervisor 按批处理任务启动，绑定到 cpus (默认 control 所在槽位的 CPU)。
+    返回 (returncode, stderr 末尾若干行)。
+    """
+    cmd = [cmd[0], '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    if cpus is None and control is not None:
+        cpus = control.cpus
+    process = supervisor.spawn(cmd, cpus=cpus, batch=True, group=control is not None,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               creationflags=NO_WINDOW, **popen_kwargs)
+    usage = None
+    if control is not None:
+        control.attach(process)
+        usage = control.usage
+    ring = deque(maxlen=tail)
+    # 单独线程排空 stderr，避免管道写满把 ffmpeg 卡住
+    drain = threading.Thread(target=_drain, args=(process.stderr, ring), daemon=True)
+    drain.start()
+    parser = ProgressParser(duration, on_event)
+    for raw in iter(process.stdout.readline, b''):
+        parser.feed_line(raw.decode('ascii', 'replace'))
+        if usage is not None and raw.startswith(b'progress='):
+            usage.sample(process)
+    process.stdout.close()
+    if usage is not None:
+        usage.final(process)
+    process.wait()
+    drain.join()
+    if control is not None:
+        control.detach(process)
+    return process.returncode, "\n".join(ring)
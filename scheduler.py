@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+from collections import deque
+
+
+def available_cpus():
+    """当前进程可用的 CPU 核数 (Linux 下尊重 taskset / cgroup 亲和性)"""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def cpu_ids():
+    """当前进程可用的 CPU 编号"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+class Slot:
+    """一个运行中任务占用的调度槽位：记录分到的编码线程数、绑定的 CPU 和最近上报的 fps"""
+    __slots__ = ("threads", "cpus", "fps", "paused", "_sched")
+
+    def __init__(self, sched, threads, cpus=None):
+        self._sched = sched
+        self.threads = threads
+        self.cpus = cpus    # 独占的 CPU 编号 (supervisor 据此绑核)；空闲核不够时为 None，不绑核
+        self.fps = 0.0
+        self.paused = False
+
+    def report_fps(self, fps):
+        self.fps = fps
+        self._sched._on_report()
+
+    def set_paused(self, paused):
+        """暂停的任务不占并发名额，让排队的任务先跑；继续后可能短暂超出并发数"""
+        self._sched._set_paused(self, paused)
+
+
+class EncodeScheduler:
+    """按 CPU 核数决定并发数，并把核数平分给每个任务 (显式 -threads)。
+
+    adaptive=True 时做简单的爬山调节：每个采样窗口统计所有任务的 fps 总和，
+    总吞吐上升就继续加并发，下降就退回上一档并停止试探。
+    每个槽位从 cpu_set (默认本进程可用的全部 CPU) 中分到与线程数相同、互不重叠的一组 CPU。
+    """
+    # 单个 libx264 进程在 1080p 下大约 6 线程以后收益明显变差
+    THREADS_PER_JOB_HINT = 6
+    WINDOW = 10.0
+
+    def __init__(self, max_jobs=None, cpus=None, adaptive=True, cpu_set=None):
+        self._free = sorted(cpu_set) if cpu_set else cpu_ids()
+        self.cpus = cpus or (len(self._free) if cpu_set else available_cpus())
+        self.max_jobs = max(1, int(max_jobs or self.cpus))
+        self.adaptive = adaptive
+        self.target = max(1, min(self.max_jobs, round(self.cpus / self.THREADS_PER_JOB_HINT)))
+        self.active = []
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._history = {}
+        self._locked = False
+        self._window_start = time.time()
+        self._samples = []
+
+    def threads_per_job(self, remaining=None):
+        # 队列快跑完时 (剩余任务少于并发数)，把空出来的核分给最后几个任务
+        jobs = self.target if remaining is None else min(self.target, len(self.active) + remaining)
+        return max(1, self.cpus // max(1, jobs))
+
+    # ---- 自适应并发 ----
+    def _on_report(self):
+        if not self.adaptive or self._locked:
+            return
+        with self._cond:
+            # 只有槽位全部跑满 (且没有暂停的任务) 时的吞吐才有可比性
+            if len(self.active) != self.target or any(s.fps <= 0 or s.paused for s in self.active):
+                return
+            self._samples.append(sum(s.fps for s in self.active))
+            if time.time() - self._window_start < self.WINDOW:
+                return
+            total = sum(self._samples) / len(self._samples)
+            self._samples = []
+            self._window_start = time.time()
+            self._retune(total)
+
+    def _retune(self, total):
+        prev = self._history.get(self.target)
+        self._history[self.target] = total if prev is None else (prev + total) / 2
+        lower = self._history.get(self.target - 1)
+        if lower is not None and self._history[self.target] < lower * 1.03:
+            # 加并发没有带来至少 3% 的提升：退回并锁定
+            self.target -= 1
+            self._locked = True
+        elif self.target < min(self.max_jobs, self.cpus):
+            self.target += 1
+            self._cond.notify_all()
+
+    # ---- 调度 ----
+    def _running(self):
+        return sum(1 for s in self.active if not s.paused)
+
+    def _set_paused(self, slot, paused):
+        with self._cond:
+            slot.paused = paused
+            self._window_start, self._samples = time.time(), []
+            self._cond.notify_all()
+
+    def acquire(self, remaining=None):
+        """阻塞直到有空闲槽位；remaining 为包括本任务在内尚未开始的任务数"""
+        with self._cond:
+            while self._running() >= self.target:
+                self._cond.wait()
+            threads = self.threads_per_job(remaining)
+            cpus = None
+            if len(self._free) >= threads:
+                cpus, self._free = self._free[:threads], self._free[threads:]
+            slot = Slot(self, threads, cpus)
+            self.active.append(slot)
+            self._window_start, self._samples = time.time(), []
+            return slot
+
+    def release(self, slot):
+        with self._cond:
+            self.active.remove(slot)
+            if slot.cpus:
+                self._free = sorted(self._free + slot.cpus)
+            self._window_start, self._samples = time.time(), []
+            self._cond.notify_all()
+
+    def promote(self, item):
+        """把还在排队的 item 移到队首，下一个空出的槽位就给它；不在队列中返回 False"""
+        with self._cond:
+            for entry in self._pending:
+                if entry[1] is item or entry[1] == item:
+                    self._pending.remove(entry)
+                    self._pending.appendleft(entry)
+                    return True
+        return False
+
+    def withdraw(self, item):
+        """从队列中移除还没开始的 item (其结果为 None)；不在队列中返回 False"""
+        with self._cond:
+            for entry in self._pending:
+                if entry[1] is item or entry[1] == item:
+                    self._pending.remove(entry)
+                    return True
+        return False
+
+    def run(self, items, fn):
+        """依次调度 items，只在拿到槽位时才创建线程；fn(item, slot) 的返回值按输入顺序返回。
+
+        运行期间可以用 promote / withdraw 调整还在排队的任务。
+        """
+        pending = self._pending = deque(enumerate(items))
+        results = [None] * len(pending)
+        threads = []
+
+        def task(i, item, slot):
+            try:
+                results[i] = fn(item, slot)
+            finally:
+                self.release(slot)
+
+        while pending:
+            slot = self.acquire(len(pending))
+            with self._cond:
+                if not pending:
+                    # 等槽位期间剩下的任务都被撤回了
+                    self.release(slot)
+                    break
+                i, item = pending.popleft()
+            t = threading.Thread(target=task, args=(i, item, slot), daemon=True)
+            t.start()
+            threads = [x for x in threads if x.is_alive()]
+            threads.append(t)
+        for t in threads:
+            t.join()
+        return results
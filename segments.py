@@ -0,0 +1,123 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from worker import get_ffmpeg_exe
+from scheduler import EncodeScheduler, available_cpus
+from progress import run_ffmpeg
+
+# 每段的目标时长 (秒)；实际切点落在其后的第一个关键帧上
+SEGMENT_SECONDS = 120
+
+
+def split_at_keyframes(src, tmp_dir, seconds=SEGMENT_SECONDS, control=None):
+    """只复制视频流 (-c copy)，分段复用器只会在关键帧处切开，所以各段拼回去是逐帧无损的。
+
+    返回 [(分段路径, 时长秒), ...]
+    """
+    list_path = os.path.join(tmp_dir, "segments.csv")
+    cmd = [get_ffmpeg_exe(), '-y', '-i', src, '-map', '0:v:0', '-c', 'copy', '-an',
+           '-f', 'segment', '-segment_time', str(seconds), '-reset_timestamps', '1',
+           '-segment_list', list_path, '-segment_list_type', 'csv',
+           os.path.join(tmp_dir, "src_%05d.mkv")]
+    code, err = run_ffmpeg(cmd, control=control)
+    if code != 0:
+        raise RuntimeError(f"分段失败: {err}")
+    chunks = []
+    with open(list_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            name, start, end = line.strip().rsplit(",", 2)
+            chunks.append((os.path.join(tmp_dir, name), float(end) - float(start)))
+    return chunks
+
+
+def _concat_list(paths, list_path):
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for p in paths:
+            # concat 列表用单引号包裹，路径内的单引号需要转义
+            f.write("file '" + p.replace("'", "'\\''") + "'\n")
+
+
+def encode_segmented(src, output, vf, duration, cfg, on_progress=None, on_fps=None, on_stats=None, audio=None,
+                     control=None):
+    """长视频分段并行编码，vf 为与整段编码相同的滤镜链，cfg 提供 preset / crf / threads。
+
+    视频按关键帧切段后并行编码，再用 concat 复用器无损拼接；音频直接从源文件整条编码后
+    一起封装，不参与切段，因此不会在段边界产生音画偏移。audio 为最终封装时的音频参数
+    (默认 AAC 192k)。control (jobctl.JobControl) 同时作用于所有分段的 ffmpeg。返回 ffmpeg 风格的 returncode。
+    """
+    # 以调度器分给本任务的线程数为预算，切成若干路并行，每路分到的线程数更少但总数不变
+    budget = cfg.get('threads') or available_cpus()
+    jobs = cfg.get('segment_jobs') or max(2, budget // 4)
+    tmp_dir = tempfile.mkdtemp(prefix=".seg_", dir=os.path.dirname(output))
+    try:
+        chunks = split_at_keyframes(src, tmp_dir, cfg.get('segment_seconds', SEGMENT_SECONDS), control)
+
+        # 整体进度 = 已完成分段时长 + 各运行分段的当前进度；fps / 输出大小为各运行分段之和
+        lock = threading.Lock()
+        start = time.time()
+        done = {"time": 0.0, "frame": 0, "size": 0}
+        running = {}
+
+        def report():
+            with lock:
+                evs = list(running.values())
+                out_time = done["time"] + sum(e['out_time'] for e in evs)
+                fps = sum(e['fps'] for e in evs)
+                frame = done["frame"] + sum(e['frame'] for e in evs)
+                size = done["size"] + sum(e['total_size'] for e in evs)
+            speed = out_time / (time.time() - start)
+            percent = min(int(out_time / duration * 100), 99) if duration > 0 else 0
+            if on_progress and duration > 0:
+                on_progress(percent)
+            if on_fps:
+                on_fps(fps)
+            if on_stats:
+                on_stats({"out_time": round(out_time, 3), "frame": frame, "fps": fps, "speed": round(speed, 3),
+                          "total_size": size, "percent": percent,
+                          "eta": round(max(duration - out_time, 0) / speed, 1) if speed else None,
+                          "done": False})
+
+        def encode_chunk(item, slot):
+            i, (chunk, length) = item
+            if control is not None and control.cancelled:
+                return None
+            dst = os.path.join(tmp_dir, f"enc_{i:05d}.mp4")
+            cmd = [get_ffmpeg_exe(), '-y', '-i', chunk, '-vf', vf, '-c:v', 'libx264',
+                   '-preset', cfg.get('preset', 'ultrafast'), '-crf', str(cfg.get('crf', 23)),
+                   '-pix_fmt', 'yuv420p', '-an', '-threads', str(slot.threads), dst]
+
+            def on_event(ev):
+                ev['out_time'] = min(ev['out_time'], length)
+                with lock:
+                    running[i] = ev
+                report()
+
+            code, err = run_ffmpeg(cmd, length, on_event, control=control, cpus=slot.cpus)
+            with lock:
+                last = running.pop(i, None)
+                done["time"] += length
+                done["frame"] += last['frame'] if last else 0
+                done["size"] += last['total_size'] if last else 0
+            report()
+            return dst if code == 0 else None
+
+        # 各分段在本任务分到的 CPU 里再分一次，不越界占用其他任务的核
+        cpu_set = control.cpus if control is not None else None
+        sched = EncodeScheduler(max_jobs=jobs, cpus=budget, adaptive=False, cpu_set=cpu_set)
+        sched.target = min(jobs, len(chunks))
+        encoded = sched.run(list(enumerate(chunks)), encode_chunk)
+        if any(p is None for p in encoded):
+            return 1
+
+        list_path = os.path.join(tmp_dir, "concat.txt")
+        _concat_list(encoded, list_path)
+        cmd = [get_ffmpeg_exe(), '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+               '-i', src, '-map', '0:v:0', '-map', '1:a?',
+               '-c:v', 'copy', *(audio or ['-c:a', 'aac', '-b:a', '192k']), output]
+        code, err = run_ffmpeg(cmd, control=control)
+        return code
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
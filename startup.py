@@ -0,0 +1,118 @@
+"""启动性能：首帧之后再做的工作，以及 --profile-startup 耗时分析
+
+入口脚本最先 import 本模块并调用 begin()。带 --profile-startup 启动时，之后主线程里的每个
+import 都会计时 (自身耗时 = 总耗时 - 其中嵌套 import 的耗时)，mark() 记录各启动阶段的时间点，
+窗口第一次画出、after_first_paint() 登记的工作全部做完后输出各阶段耗时和最慢的 import
+(有控制台时写 stderr，打包的无控制台版本写到缓存目录的 startup_profile.txt)。
+不带该参数时 mark() 什么也不做。
+"""
+import os
+import sys
+import time
+import builtins
+import threading
+
+FLAG = "--profile-startup"
+# 报告里列出的 import 条数
+TOP_IMPORTS = 15
+
+T0 = time.perf_counter()
+enabled = False
+_marks = []
+_imports = {}       # 模块名 -> [含子模块的耗时, 自身耗时]
+_stack = []
+_deferred = []
+
+
+def begin(argv=None):
+    """检查并移除命令行里的 --profile-startup；开启时开始给 import 计时"""
+    global enabled
+    argv = sys.argv if argv is None else argv
+    if FLAG not in argv:
+        return False
+    argv.remove(FLAG)
+    enabled = True
+    original = builtins.__import__
+    main = threading.main_thread()
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        # 已加载的、相对 import 和其他线程里的 import 不计时 (相对 import 算在包自身的耗时里)
+        if level or name in sys.modules or threading.current_thread() is not main:
+            return original(name, globals, locals, fromlist, level)
+        _stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            nested = _stack.pop()
+            if _stack:
+                _stack[-1] += total
+            entry = _imports.setdefault(name, [0.0, 0.0])
+            entry[0] += total
+            entry[1] += total - nested
+
+    builtins.__import__ = timed_import
+    mark("begin")
+    return True
+
+
+def mark(label):
+    """记录一个启动阶段结束的时间点"""
+    if enabled:
+        _marks.append((label, time.perf_counter() - T0))
+
+
+def after_first_paint(window, fn):
+    """窗口第一次画出来之后再 (在主线程) 执行 fn；按登记顺序执行，用来推迟次要面板和读盘等工作"""
+    _deferred.append(fn)
+    if len(_deferred) > 1:
+        return
+
+    state = {"mapped": False}
+
+    def on_map(event):
+        if event.widget is window and not state["mapped"]:
+            state["mapped"] = True
+            # 先让 Tk 把已排队的重绘画完，再执行推迟的工作
+            window.after_idle(run)
+
+    def run():
+        window.update_idletasks()
+        mark("first paint")
+        while _deferred:
+            fn = _deferred.pop(0)
+            fn()
+            mark(getattr(fn, "__name__", "deferred"))
+        mark("ready")
+        if enabled:
+            report()
+
+    window.bind("<Map>", on_map, add="+")
+
+
+def format_report():
+    lines = ["启动耗时 (毫秒，从 startup 模块加载时算起)", "  阶段:"]
+    last = 0.0
+    for label, t in _marks:
+        lines.append(f"    {t * 1000:9.1f}  +{(t - last) * 1000:8.1f}  {label}")
+        last = t
+    lines.append("  最慢的 import (自身 / 含子模块):")
+    top = sorted(_imports.items(), key=lambda kv: kv[1][1], reverse=True)[:TOP_IMPORTS]
+    for name, (total, own) in top:
+        lines.append(f"    {own * 1000:9.1f}  {total * 1000:9.1f}  {name}")
+    return "\n".join(lines) + "\n"
+
+
+def report():
+    text = format_report()
+    if sys.stderr is not None:
+        sys.stderr.write(text)
+        sys.stderr.flush()
+        return
+    try:
+        from worker import cache_dir
+        with open(os.path.join(cache_dir(), "startup_profile.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+    except OSError:
+        pass
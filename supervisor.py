@@ -0,0 +1,289 @@
+"""子进程监管：ffmpeg / ffprobe 子进程都经由 spawn() / run() 启动并登记在册
+
+- 绑核：批处理任务按调度槽位分到的 CPU 集合 (scheduler.Slot.cpus) 绑定，并发任务互不争抢核心和缓存
+- 降低优先级：configure(nice=N) 后批处理任务以较低优先级运行，转换时桌面仍然流畅
+- 内存上限：configure(mem_limit=字节数) 限制每个批处理 ffmpeg 进程 (Linux 为 RLIMIT_AS 地址空间，
+  Windows 为作业对象的进程内存上限)，超出时 ffmpeg 分配失败退出，不会拖垮整机
+- 回收：正常退出时 atexit 结束所有仍在运行的子进程；Windows 下每个子进程放进设置了
+  KILL_ON_JOB_CLOSE 的作业对象，本进程崩溃时系统随句柄一起结束它们；Linux 下子进程登记在
+  缓存目录的记录文件里，下次启动时 sweep_orphans() 结束上次崩溃遗留的进程
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import threading
+import subprocess
+
+# 界面默认给批处理任务的 nice 值
+DESKTOP_NICE = 10
+
+settings = {"pin": True, "nice": 0, "mem_limit": None}
+
+_children = set()
+_lock = threading.Lock()
+_save_lock = threading.Lock()
+_registry = None    # Linux: 本进程的子进程记录文件
+
+
+def configure(pin=None, nice=None, mem_limit=None):
+    """设置批处理子进程的限制；参数为 None 的项保持不变"""
+    for key, val in (("pin", pin), ("nice", nice), ("mem_limit", mem_limit)):
+        if val is not None:
+            settings[key] = val
+
+
+# ---- Linux: /proc 与崩溃遗留进程 ----
+def _start_time(pid):
+    # /proc/<pid>/stat 第 22 项：进程启动时间，用来确认 pid 没有被系统复用
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return int(f.read().rsplit(b")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _threads(pid):
+    # 已经创建的线程也要单独设置 (Linux 的亲和性和 nice 是按线程的)，之后创建的线程会继承
+    try:
+        return [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+
+def _registry_path():
+    global _registry
+    if _registry is None:
+        from worker import cache_dir
+        directory = os.path.join(cache_dir(), "children")
+        os.makedirs(directory, exist_ok=True)
+        _registry = os.path.join(directory, f"{os.getpid()}.json")
+    return _registry
+
+
+def _save_registry():
+    if not os.path.isdir("/proc"):
+        return
+    with _save_lock:
+        try:
+            path = _registry_path()
+            with _lock:
+                live = [[p.pid, p._started] for p in _children if p._started is not None]
+            if not live:
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"owner": [os.getpid(), _start_time(os.getpid())], "children": live}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+def sweep_orphans():
+    """结束之前崩溃的进程遗留下来的子进程 (Linux)，返回结束的个数"""
+    if not os.path.isdir("/proc"):
+        return 0
+    try:
+        directory = os.path.dirname(_registry_path())
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    killed = 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        owner, started = data.get("owner", [None, None])
+        if owner == os.getpid() or (owner and _start_time(owner) == started):
+            continue    # 记录它的进程还活着
+        for pid, started in data.get("children", []):
+            if started is not None and _start_time(pid) == started:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                    killed += 1
+                except OSError:
+                    pass
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return killed
+
+
+# ---- Windows: 作业对象 ----
+def _win_job(process, mem_limit):
+    import ctypes
+    from ctypes import wintypes
+
+    class BASIC(ctypes.Structure):
+        _fields_ = [("PerProcessUserTimeLimit", ctypes.c_int64), ("PerJobUserTimeLimit", ctypes.c_int64),
+                    ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+                    ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+                    ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD),
+                    ("SchedulingClass", wintypes.DWORD)]
+
+    class EXTENDED(ctypes.Structure):
+        _fields_ = [("BasicLimitInformation", BASIC), ("IoInfo", ctypes.c_uint64 * 6),
+                    ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+                    ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t)]
+
+    kernel32 = ctypes.windll.kernel32
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    job = kernel32.CreateJobObjectW(None, None)
+    if not job:
+        return None
+    info = EXTENDED()
+    # KILL_ON_JOB_CLOSE：本进程退出 (包括崩溃) 时句柄被关闭，作业内的进程随之结束
+    info.BasicLimitInformation.LimitFlags = 0x2000 | (0x100 if mem_limit else 0)
+    info.ProcessMemoryLimit = int(mem_limit or 0)
+    kernel32.SetInformationJobObject(wintypes.HANDLE(job), 9, ctypes.byref(info), ctypes.sizeof(info))
+    kernel32.AssignProcessToJobObject(wintypes.HANDLE(job), wintypes.HANDLE(int(process._handle)))
+    return job
+
+
+def _win_close(job):
+    import ctypes
+    ctypes.windll.kernel32.CloseHandle(ctypes.c_void_p(job))
+
+
+def _apply_limits(process, cpus, nice, mem_limit):
+    if sys.platform == "win32":
+        if cpus:
+            import ctypes
+            mask = sum(1 << c for c in cpus if c < 64)
+            ctypes.windll.kernel32.SetProcessAffinityMask(ctypes.c_void_p(int(process._handle)), ctypes.c_size_t(mask))
+        return
+    tids = _threads(process.pid) if os.path.isdir("/proc") else [process.pid]
+    for tid in tids:
+        try:
+            if cpus and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(tid, cpus)
+            if nice:
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except OSError:
+            # 进程已经退出，或者平台不支持
+            pass
+    if mem_limit:
+        try:
+            import resource
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (int(mem_limit), int(mem_limit)))
+        except (ImportError, AttributeError, OSError, ValueError):
+            pass
+
+
+class _Child(subprocess.Popen):
+    """登记在册的子进程：wait / poll 发现它已退出时注销"""
+    _started = None
+    _job = None
+
+    def _forget(self):
+        if self.returncode is None:
+            return
+        with _lock:
+            if self not in _children:
+                return
+            _children.discard(self)
+        if self._job:
+            _win_close(self._job)
+            self._job = None
+        _save_registry()
+
+    def wait(self, timeout=None):
+        code = super().wait(timeout)
+        self._forget()
+        return code
+
+    def poll(self):
+        code = super().poll()
+        if code is not None:
+            self._forget()
+        return code
+
+
+def spawn(cmd, cpus=None, batch=False, group=False, **popen_kwargs):
+    """启动并登记子进程，参数同 subprocess.Popen。
+
+    batch=True 表示批处理编码任务：按 settings 绑定 cpus、降低优先级、限制内存；
+    group=True 时子进程自成进程组 (见 jobctl.group_kwargs)，可以整组暂停 / 结束。
+    """
+    flags = popen_kwargs.pop("creationflags", 0)
+    if group:
+        from jobctl import group_kwargs
+        extra = group_kwargs()
+        flags |= extra.pop("creationflags", 0)
+        popen_kwargs.update(extra)
+    nice = settings["nice"] if batch else 0
+    mem_limit = settings["mem_limit"] if batch else None
+    cpus = sorted(cpus) if cpus and batch and settings["pin"] else None
+    if sys.platform == "win32" and nice > 0:
+        flags |= subprocess.BELOW_NORMAL_PRIORITY_CLASS if nice < 15 else subprocess.IDLE_PRIORITY_CLASS
+    process = _Child(cmd, creationflags=flags, **popen_kwargs)
+    with _lock:
+        _children.add(process)
+    if sys.platform == "win32":
+        try:
+            process._job = _win_job(process, mem_limit)
+        except (OSError, AttributeError):
+            pass
+    else:
+        process._started = _start_time(process.pid)
+    if cpus or nice or mem_limit:
+        _apply_limits(process, cpus, nice, mem_limit)
+    _save_registry()
+    return process
+
+
+def run(cmd, capture_output=False, **popen_kwargs):
+    """subprocess.run 的替代 (不支持 input / timeout)，子进程同样登记在册"""
+    if capture_output:
+        popen_kwargs["stdout"] = popen_kwargs["stderr"] = subprocess.PIPE
+    process = spawn(cmd, **popen_kwargs)
+    try:
+        stdout, stderr = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def reap_all(timeout=3.0):
+    """结束并回收所有仍在运行的子进程：先 terminate，超时后 kill"""
+    with _lock:
+        children = list(_children)
+    for p in children:
+        if p.poll() is None:
+            try:
+                if sys.platform != "win32":
+                    # 暂停中的进程要先继续才能处理 SIGTERM
+                    p.send_signal(signal.SIGCONT)
+                p.terminate()
+            except OSError:
+                pass
+    deadline = time.time() + timeout
+    for p in children:
+        try:
+            p.wait(max(0.0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            p.kill()
+            p.wait()
+
+
+def install_signal_handlers():
+    """SIGTERM / SIGHUP 时按正常退出处理，让 atexit 回收子进程 (须在主线程调用)"""
+    def on_signal(signum, frame):
+        raise SystemExit(128 + signum)
+    for name in ("SIGTERM", "SIGHUP"):
+        sig = getattr(signal, name, None)
+        if sig is not None and signal.getsignal(sig) is signal.SIG_DFL:
+            signal.signal(sig, on_signal)
+
+
+atexit.register(reap_all)
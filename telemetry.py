@@ -0,0 +1,323 @@
+"""性能遥测：每个任务和每批的耗时 / 速度 / 资源占用，写成 JSON 行，可选再写一份 Prometheus 文本格式文件
+
+每个任务一条 job 记录：
+    queue_wait (排队秒数)、probe_time (探测秒数)、encode_wall (编码墙钟秒数)、frames、avg_fps、
+    min_fps (按 FPS_WINDOW 秒的窗口计算的最低瞬时帧率)、speed (视频秒 / 墙钟秒)、media_seconds、
+    cpu_seconds、peak_rss (字节，各 ffmpeg 进程中最大的)、input_bytes、output_bytes、
+    compression_ratio (输入 / 输出字节数)，以及 status / strategy / threads / node 等
+CPU 时间和峰值内存在 Linux 上读取 ffmpeg 子进程的 /proc/<pid>/stat 与 status (VmHWM)，其他平台为 null。
+每批结束时一条 batch 记录 (见 summarize)。
+
+Prometheus 文件供 node exporter 的 textfile collector 采集：累计计数 (本进程启动以来) 在每个任务结束后
+更新，yasuo_batch_* 为最近一批的汇总，每次先写临时文件再替换，不会被读到半个文件。
+"""
+import os
+import json
+import time
+import platform
+import threading
+
+from planner import output_size
+
+# 计算最低瞬时帧率的窗口 (秒)：ffmpeg 约每 0.5 秒报告一次进度，窗口太短时抖动大
+FPS_WINDOW = 2.0
+PREFIX = "yasuo"
+
+SUPPORTED = os.path.isdir("/proc")
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def read_proc(pid):
+    """Linux：返回进程的 (CPU 秒, 峰值 RSS 字节)；进程已回收或读不到时返回 None，已退出未回收时峰值 RSS 为 0"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        # 第 14、15 项：用户态 / 内核态时间 (时钟滴答)
+        cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return None
+    rss = 0
+    try:
+        with open(f"/proc/{pid}/status", "rb") as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    rss = int(line.split()[1]) * 1024
+                    break
+    except (OSError, IndexError, ValueError):
+        pass
+    return cpu, rss
+
+
+class ProcessUsage:
+    """一个任务所有 ffmpeg 进程的资源占用 (分段编码时有多个)：CPU 秒数之和，峰值 RSS 取最大值。
+
+    progress.run_ffmpeg 在每个进度块时 sample()，进程退出后、被回收前 final() 读最终的 CPU 时间。
+    """
+    def __init__(self):
+        self.peak_rss = 0
+        self._cpu = {}      # 进程 -> 最近一次读到的 CPU 秒数
+        self._lock = threading.Lock()
+
+    def sample(self, process):
+        if not SUPPORTED:
+            return
+        usage = read_proc(process.pid)
+        if usage is None:
+            return
+        with self._lock:
+            self._cpu[process] = max(usage[0], self._cpu.get(process, 0.0))
+            self.peak_rss = max(self.peak_rss, usage[1])
+
+    def final(self, process):
+        """等进程退出但不回收 (WNOWAIT)，僵尸进程的 /proc/<pid>/stat 仍有完整的 CPU 时间"""
+        if not SUPPORTED or not hasattr(os, "waitid"):
+            return
+        try:
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        except (OSError, ChildProcessError):
+            return
+        self.sample(process)
+
+    @property
+    def cpu_seconds(self):
+        if not SUPPORTED:
+            return None
+        with self._lock:
+            return round(sum(self._cpu.values()), 3)
+
+
+class JobStats:
+    """一个任务的计时与资源统计；queued 为入队时间 (time.time())，record() 生成 job 记录"""
+    def __init__(self, path, queued=None):
+        self.path = path
+        now = time.time()
+        self.queue_wait = max(now - queued, 0.0) if queued else 0.0
+        self.probe_time = 0.0
+        self.encode_wall = 0.0
+        self.frames = 0
+        self.out_time = 0.0
+        self.min_fps = None
+        self.usage = ProcessUsage()
+        self._start = None
+        self._mark = None   # (时间, 帧数)：当前帧率窗口的起点
+
+    def begin(self):
+        self._start = time.time()
+        self._mark = (self._start, 0)
+
+    def feed(self, ev):
+        """进度事件 (progress.ProgressParser 的格式)"""
+        now = time.time()
+        frame = ev.get('frame') or 0
+        self.frames = max(self.frames, frame)
+        self.out_time = max(self.out_time, ev.get('out_time') or 0.0)
+        if self._mark is None:
+            return
+        t0, f0 = self._mark
+        if now - t0 >= FPS_WINDOW and frame >= f0:
+            fps = (frame - f0) / (now - t0)
+            self.min_fps = fps if self.min_fps is None else min(self.min_fps, fps)
+            self._mark = (now, frame)
+
+    def end(self):
+        if self._start is not None:
+            self.encode_wall = time.time() - self._start
+
+    def record(self, status, duration=0.0, output=None, **fields):
+        wall = self.encode_wall
+        media = duration if status == "ok" and duration else self.out_time
+        avg_fps = self.frames / wall if wall else None
+        try:
+            input_bytes = os.path.getsize(self.path)
+        except OSError:
+            input_bytes = 0
+        output_bytes = output_size(output) if output else 0
+        min_fps = self.min_fps
+        if avg_fps is not None and (min_fps is None or min_fps > avg_fps):
+            # 任务短于一个窗口时没有瞬时值；最低值也不应高于平均值
+            min_fps = avg_fps
+        record = {
+            "file": self.path,
+            "status": status,
+            "queue_wait": round(self.queue_wait, 3),
+            "probe_time": round(self.probe_time, 3),
+            "encode_wall": round(wall, 3),
+            "frames": self.frames,
+            "avg_fps": round(avg_fps, 2) if avg_fps is not None else None,
+            "min_fps": round(min_fps, 2) if min_fps is not None else None,
+            "speed": round(media / wall, 3) if wall and media else None,
+            "media_seconds": round(media, 3),
+            "cpu_seconds": self.usage.cpu_seconds,
+            "peak_rss": self.usage.peak_rss or None,
+            "input_bytes": input_bytes,
+            "output_bytes": output_bytes,
+            "compression_ratio": round(input_bytes / output_bytes, 3) if output_bytes else None,
+        }
+        record.update(fields)
+        return record
+
+
+def _total(records, key):
+    return sum(r[key] for r in records if r.get(key) is not None)
+
+
+def summarize(records, summary, cpus=None):
+    """一批的汇总：records 为实际运行过的任务的 job 记录，summary 为 engine 的 summary 事件内容。
+
+    throughput 为每墙钟秒处理的视频秒数；cpus 给出时 cpu_utilization = CPU 秒 / (墙钟秒 × 核数)
+    """
+    ok = [r for r in records if r["status"] == "ok"]
+    elapsed = summary["elapsed"]
+    cpu = [r["cpu_seconds"] for r in records if r.get("cpu_seconds") is not None]
+    media = _total(ok, "media_seconds")
+    frames = _total(ok, "frames")
+    input_bytes, output_bytes = _total(ok, "input_bytes"), _total(ok, "output_bytes")
+    waits = [r["queue_wait"] for r in records]
+    fps = [r["min_fps"] for r in ok if r.get("min_fps") is not None]
+    rss = [r["peak_rss"] for r in records if r.get("peak_rss")]
+    return {
+        "jobs": summary["total"],
+        "ok": summary["ok"],
+        "failed": summary["failed"],
+        "cancelled": sum(1 for r in records if r["status"] == "cancelled"),
+        "elapsed": elapsed,
+        "concurrency": summary.get("concurrency"),
+        "media_seconds": round(media, 3),
+        "throughput": round(media / elapsed, 3) if elapsed else None,
+        "files_per_hour": round(len(ok) * 3600 / elapsed, 2) if elapsed else None,
+        "frames": frames,
+        "fps": round(frames / elapsed, 2) if elapsed else None,
+        "min_fps": round(min(fps), 2) if fps else None,
+        "queue_wait_avg": round(sum(waits) / len(waits), 3) if waits else None,
+        "queue_wait_max": round(max(waits), 3) if waits else None,
+        "probe_time": round(_total(records, "probe_time"), 3),
+        "encode_wall": round(_total(records, "encode_wall"), 3),
+        "cpu_seconds": round(sum(cpu), 3) if cpu else None,
+        "cpu_utilization": round(sum(cpu) / (elapsed * cpus), 3) if cpu and elapsed and cpus else None,
+        "peak_rss": max(rss) if rss else None,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "compression_ratio": round(input_bytes / output_bytes, 3) if output_bytes else None,
+    }
+
+
+def default_labels():
+    """区分机器和版本的标签：主机名、CPU 核数、ffmpeg 版本号"""
+    from worker import ffmpeg_version
+    words = ffmpeg_version().split()
+    return {"host": platform.node(), "cpus": str(os.cpu_count()),
+            "ffmpeg": words[2] if len(words) > 2 else ""}
+
+
+def parse_label(text):
+    """release=1.4.2 -> ("release", "1.4.2")"""
+    key, sep, value = text.partition("=")
+    key = key.strip()
+    if not sep or not key.replace("_", "").isalnum() or key[0].isdigit():
+        raise ValueError(f"无效的标签: {text}")
+    return key, value.strip()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Prometheus 指标：(名称, 说明, 记录里的键)
+_COUNTERS = [
+    ("media_seconds_total", "已完成任务的视频总时长 (秒)", "media_seconds"),
+    ("encode_seconds_total", "编码墙钟时间之和 (秒)", "encode_wall"),
+    ("queue_wait_seconds_total", "排队时间之和 (秒)", "queue_wait"),
+    ("cpu_seconds_total", "ffmpeg 子进程 CPU 时间之和 (秒)", "cpu_seconds"),
+    ("frames_total", "已完成任务输出的帧数", "frames"),
+    ("input_bytes_total", "已完成任务的输入字节数", "input_bytes"),
+    ("output_bytes_total", "已完成任务的输出字节数", "output_bytes"),
+]
+_SPENT = ("encode_wall", "queue_wait", "cpu_seconds")
+_BATCH = [
+    ("elapsed_seconds", "最近一批的墙钟时间 (秒)", "elapsed"),
+    ("concurrency", "最近一批的并发任务数", "concurrency"),
+    ("throughput_ratio", "最近一批每墙钟秒处理的视频秒数", "throughput"),
+    ("files_per_hour", "最近一批每小时完成的文件数", "files_per_hour"),
+    ("fps", "最近一批的整体帧率 (总帧数 / 墙钟时间)", "fps"),
+    ("min_fps", "最近一批任务中最低的瞬时帧率", "min_fps"),
+    ("queue_wait_max_seconds", "最近一批最长的排队时间 (秒)", "queue_wait_max"),
+    ("cpu_seconds", "最近一批的 CPU 时间 (秒)", "cpu_seconds"),
+    ("cpu_utilization_ratio", "最近一批的 CPU 利用率 (0-1)", "cpu_utilization"),
+    ("peak_rss_bytes", "最近一批单个 ffmpeg 进程的峰值内存 (字节)", "peak_rss"),
+    ("compression_ratio", "最近一批的输入 / 输出字节数之比", "compression_ratio"),
+    ("completed_timestamp_seconds", "最近一批结束的时间 (Unix 时间戳)", "time"),
+]
+
+
+class Telemetry:
+    """把 job / batch 记录追加到 JSON 行文件 path，并维护 Prometheus 文本格式文件 prom (两者都可为 None)。
+
+    labels 附加到每条记录 (JSON 的 labels 字段) 和每个指标上，用来区分机器 / 版本 / 流水线。
+    可在多个工作线程里同时调用。
+    """
+    def __init__(self, path=None, prom=None, labels=None):
+        self.path = path
+        self.prom = prom
+        self.labels = dict(default_labels(), **(labels or {}))
+        self.jobs = {}      # 状态 -> 任务数
+        self.totals = {key: 0 for _, _, key in _COUNTERS}
+        self.last_batch = None
+        self._lock = threading.Lock()
+
+    def job(self, record):
+        with self._lock:
+            status = record["status"]
+            self.jobs[status] = self.jobs.get(status, 0) + 1
+            for _, _, key in _COUNTERS:
+                # 输出相关的计数只统计成功的任务；时间和 CPU 失败的也算，那也是花掉的资源
+                if record.get(key) is not None and (status == "ok" or key in _SPENT):
+                    self.totals[key] += record[key]
+            self._append(dict(record, type="job"))
+            self._write_prom()
+
+    def batch(self, records, summary, cpus=None):
+        """一批结束：写入并返回 batch 记录"""
+        batch = summarize(records, summary, cpus)
+        with self._lock:
+            self.last_batch = dict(batch, time=round(time.time(), 3))
+            self._append(dict(batch, type="batch"))
+            self._write_prom()
+        return batch
+
+    def _append(self, record):
+        if not self.path:
+            return
+        record["time"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        record["labels"] = self.labels
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def format_prom(self):
+        base = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(self.labels.items()))
+        lines = [f"# HELP {PREFIX}_jobs_total 已结束的任务数", f"# TYPE {PREFIX}_jobs_total counter"]
+        for status, count in sorted(self.jobs.items()):
+            lines.append(f'{PREFIX}_jobs_total{{{base},status="{_escape(status)}"}} {count}')
+        for name, help_text, key in _COUNTERS:
+            lines += [f"# HELP {PREFIX}_{name} {help_text}", f"# TYPE {PREFIX}_{name} counter",
+                      f"{PREFIX}_{name}{{{base}}} {round(self.totals[key], 3)}"]
+        if self.last_batch:
+            for name, help_text, key in _BATCH:
+                if self.last_batch.get(key) is not None:
+                    lines += [f"# HELP {PREFIX}_batch_{name} {help_text}", f"# TYPE {PREFIX}_batch_{name} gauge",
+                              f"{PREFIX}_batch_{name}{{{base}}} {self.last_batch[key]}"]
+        return "\n".join(lines) + "\n"
+
+    def _write_prom(self):
+        if not self.prom:
+            return
+        # textfile collector 只读 *.prom；临时文件用别的后缀，写完再原子替换
+        tmp = f"{self.prom}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self.format_prom())
+            os.replace(tmp, self.prom)
+        except OSError:
+            pass
@@ -0,0 +1,78 @@
+"""cluster.JobServer：口令校验、流式输出的文件名只由服务器决定"""
+import os
+import socket
+
+import pytest
+
+from cluster import JobServer, Channel, _Node, _suffixes
+
+
+class FakeChannel:
+    def __init__(self):
+        self.received = []
+
+    def recv_file(self, path, size):
+        self.received.append(path)
+        if path:
+            with open(path, "wb") as f:
+                f.write(bytes(size))
+
+
+def dispatched(tmp_path, config):
+    source = tmp_path / "clip.mp4"
+    source.write_bytes(b"source")
+    server = JobServer(("127.0.0.1", 0))
+    node = _Node(FakeChannel(), "n1", 1, True)
+    job = {"file": str(source), "config": dict(config, out_dir=str(tmp_path / "out")), "node": node, "outputs": []}
+    server._dispatched[7] = job
+    return server, node, job
+
+
+def test_suffixes():
+    job = {"file": "a.mp4", "config": {"mode": "9:16"}}
+    assert _suffixes(job) == [None]
+    job["config"]["renditions"] = [{"mode": "9:16"}, {"mode": "16:9"}, {"mode": "16:9", "crf": 28}]
+    assert _suffixes(job) == ["9-16", "16-9_crf23", "16-9_crf28"]
+
+
+def test_output_uses_server_suffix(tmp_path):
+    server, node, job = dispatched(tmp_path, {"mode": "16:9", "renditions": [{"mode": "9:16"}, {"mode": "16:9"}]})
+    server._handle(node, {"type": "output", "id": 7, "index": 0, "suffix": "9-16", "size": 4})
+    server._handle(node, {"type": "output", "id": 7, "index": 1, "suffix": "16-9", "size": 4})
+    names = [os.path.basename(p) for p in job["outputs"]]
+    assert names == ["clip_9-16.mp4", "clip_16-9.mp4"]
+    assert all(os.path.dirname(p) == str(tmp_path / "out") for p in job["outputs"])
+
+
+@pytest.mark.parametrize("msg", [
+    {"index": 0, "suffix": "../../x"},
+    {"index": 0, "suffix": "16-9"},
+    {"index": 1, "suffix": None},
+    {"index": "0", "suffix": None},
+    {"suffix": None},
+])
+def test_output_rejects_unexpected_suffix(tmp_path, msg):
+    server, node, job = dispatched(tmp_path, {"mode": "9:16"})
+    with pytest.raises(ValueError):
+        server._handle(node, dict(msg, type="output", id=7, size=4))
+    assert job["outputs"] == []
+    assert not (tmp_path / "x.mp4").exists() and not (tmp_path.parent / "x.mp4").exists()
+
+
+def test_wrong_token_is_refused():
+    server = JobServer(("127.0.0.1", 0), token="口令")
+    host, port = server.start()
+    try:
+        for token in ("wrong", None, "口令"):
+            chan = Channel(socket.create_connection((host, port)))
+            chan.send({"type": "hello", "name": "n", "slots": 1, "token": token})
+            chan.sock.settimeout(5)
+            if token == "口令":
+                chan.send({"type": "ping"})
+                assert chan.recv()["type"] == "pong"
+            else:
+                with pytest.raises(ConnectionError):
+                    chan.recv()
+            chan.close()
+    finally:
+        server.close()
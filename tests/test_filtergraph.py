@@ -0,0 +1,83 @@
+"""filtergraph.compile_filter / compile_renditions 生成的滤镜串
+
+已知源尺寸的期望值都用 ffmpeg 7 的 testsrc 实际跑过，输出尺寸与目标一致。
+"""
+import pytest
+
+from filtergraph import compile_filter, compile_renditions, has_pixel_filters, blur_background
+
+PAD_916 = "scale=1080:1920:force_original_aspect_ratio=decrease,pad=1080:1920:(ow-iw)/2:(oh-ih)/2:black"
+PAD_169 = "scale=1920:1080:force_original_aspect_ratio=decrease,pad=1920:1080:(ow-iw)/2:(oh-ih)/2:black"
+BLUR_916 = ("split=2[main][bg];[bg]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,"
+            "gblur=sigma={sigma}[bgblur];[main]scale=1080:-2:force_original_aspect_ratio=decrease[fg];"
+            "[bgblur][fg]overlay=(W-w)/2:(H-h)/2")
+
+
+@pytest.mark.parametrize("config, size, expected", [
+    # 横屏源转竖屏：黑边 / 模糊背景
+    ({"mode": "9:16"}, (1920, 1080), PAD_916),
+    ({"mode": "9:16", "blur": True, "blur_sigma": 60}, (1920, 1080), BLUR_916.format(sigma=60)),
+    # 1/4 分辨率模糊背景
+    ({"mode": "9:16", "blur": True, "blur_sigma": 60, "blur_downscale": 4}, (1920, 1080),
+     "split=2[main][bg];[bg]scale=270:480:force_original_aspect_ratio=increase:flags=fast_bilinear,crop=270:480,"
+     "gblur=sigma=15,scale=1080:1920:flags=bilinear[bgblur];[main]scale=1080:-2:force_original_aspect_ratio=decrease[fg];"
+     "[bgblur][fg]overlay=(W-w)/2:(H-h)/2"),
+    # 竖屏源转竖屏：比例相同只缩放 (放大同样一步到位)
+    ({"mode": "9:16"}, (1080, 1920), "scale=1080:1920"),
+    ({"mode": "9:16", "blur": True}, (720, 1280), "scale=1080:1920"),
+    # 调色：4K 先缩到目标尺寸再 eq
+    ({"mode": "16:9", "brightness": 0.1}, (3840, 2160), "scale=1920:1080,eq=brightness=0.10"),
+    # 旋转后比例正好：不需要预先缩小时直接旋转
+    ({"mode": "9:16", "rotate": 90}, (1920, 1080), "transpose=1,scale=1080:1920"),
+    ({"mode": "9:16", "rotate": 90}, (3840, 2160), "scale=1920:1080,transpose=1"),
+    # 旋转 + 排版：按铺满所需的比例缩小后再旋转
+    ({"mode": "9:16", "rotate": 180, "blur": True, "blur_sigma": 40}, (3840, 2160),
+     "scale=3414:1920,hflip,vflip," + BLUR_916.format(sigma=40)),
+    # 放大时旋转和调色放在缩放之前
+    ({"mode": "16:9", "rotate": 270, "contrast": 1.2}, (1080, 1920), "transpose=2,eq=contrast=1.20,scale=1920:1080"),
+    # 不知道源尺寸
+    ({"mode": "16:9"}, (0, 0), PAD_169),
+    ({"mode": "16:9", "rotate": "bad", "brightness": 0.0}, (1280, 720), "scale=1920:1080"),
+])
+def test_compile_filter(config, size, expected):
+    assert compile_filter(config, *size) == expected + ",format=yuv420p"
+
+
+def test_blur_background():
+    assert blur_background(1080, 1920, 60) == blur_background(1080, 1920, 60, 1)
+    assert blur_background(1080, 1920, 60, 1).endswith("gblur=sigma=60")
+    # 缩小后的尺寸保持偶数
+    assert blur_background(1080, 1920, 25, 8).startswith("scale=134:240:")
+    assert "gblur=sigma=3.125," in blur_background(1080, 1920, 25, 8)
+
+
+@pytest.mark.parametrize("config, specs, size, expected", [
+    # 没有旋转 / 调色：不预先缩小，各输出直接排版
+    ({}, [{"mode": "9:16"}, {"mode": "16:9", "blur": True, "blur_sigma": 30}], (1920, 1080),
+     "[0:v]split=2[s0][s1];[s0]" + PAD_916 + ",format=yuv420p[v0];[s1]scale=1920:1080,format=yuv420p[v1]"),
+    # 共用的调色在 split 之前做；只差 crf 的输出共用一条分支
+    ({"saturation": 1.3}, [{"mode": "9:16", "crf": 20}, {"mode": "9:16", "crf": 28}, {"mode": "16:9"}], (3840, 2160),
+     "[0:v]scale=1920:1080,eq=saturation=1.30,split=2[s0][s1];[s0]" + PAD_916
+     + ",format=yuv420p,split=2[v0][v1];[s1]scale=1920:1080,format=yuv420p[v2]"),
+    # 旋转不需要缩小时不加缩放
+    ({"rotate": 90}, [{"mode": "9:16"}, {"mode": "16:9"}], (1920, 1080),
+     "[0:v]transpose=1,split=2[s0][s1];[s0]scale=1080:1920,format=yuv420p[v0];[s1]" + PAD_169 + ",format=yuv420p[v1]"),
+    # 每个输出的模糊分支用各自的标签
+    ({}, [{"mode": "9:16", "blur": True, "blur_downscale": 4}, {"mode": "9:16", "blur": True}], (1920, 1080),
+     "[0:v]split=2[s0][s1];"
+     "[s0]split=2[main0][bg0];[bg0]scale=270:480:force_original_aspect_ratio=increase:flags=fast_bilinear,crop=270:480,"
+     "gblur=sigma=15,scale=1080:1920:flags=bilinear[bgblur0];[main0]scale=1080:-2:force_original_aspect_ratio=decrease[fg0];"
+     "[bgblur0][fg0]overlay=(W-w)/2:(H-h)/2,format=yuv420p[v0];"
+     "[s1]split=2[main1][bg1];[bg1]scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920,"
+     "gblur=sigma=60[bgblur1];[main1]scale=1080:-2:force_original_aspect_ratio=decrease[fg1];"
+     "[bgblur1][fg1]overlay=(W-w)/2:(H-h)/2,format=yuv420p[v1]"),
+])
+def test_compile_renditions(config, specs, size, expected):
+    assert compile_renditions(config, specs, *size) == expected
+
+
+def test_has_pixel_filters():
+    assert not has_pixel_filters({})
+    assert not has_pixel_filters({"rotate": 0, "brightness": 0.0, "contrast": 1.0, "saturation": 1.0})
+    assert has_pixel_filters({"rotate": 270})
+    assert has_pixel_filters({"contrast": 1.1})
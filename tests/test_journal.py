@@ -0,0 +1,144 @@
+"""journal.JobJournal：快照 + 增量重放、末行写了一半、restore() 的清理"""
+import json
+import os
+
+from journal import JobJournal
+from outputs import temp_path
+
+
+def make_source(tmp_path, name="a.mp4"):
+    path = tmp_path / name
+    path.write_bytes(b"source")
+    return str(path)
+
+
+def test_replay_after_snapshot(tmp_path):
+    db = str(tmp_path / "journal.json")
+    a, b = make_source(tmp_path, "a.mp4"), make_source(tmp_path, "b.mp4")
+    journal = JobJournal(db)
+    journal.add(a)
+    journal.queue(a, {"crf": 23})
+    journal.clear()                     # clear 会写快照
+    journal.add(a)
+    journal.add(b)
+    journal.queue(b, {"crf": 28})
+    journal.fail(b, "boom")
+    journal.close()
+
+    with open(db, encoding="utf-8") as f:
+        assert json.load(f)["jobs"] == []
+    reopened = JobJournal(db)
+    assert [job["path"] for job in reopened.entries()] == [a, b]
+    assert reopened.get(a)["state"] == "pending"
+    job = reopened.get(b)
+    assert job["state"] == "failed"
+    assert job["config"] == {"crf": 28}
+    assert job["error"] == "boom"
+    assert [state for state, t in job["history"]] == ["pending", "queued", "failed"]
+    reopened.close()
+
+
+def test_entries_in_snapshot_are_not_applied_twice(tmp_path):
+    db = str(tmp_path / "journal.json")
+    a = make_source(tmp_path)
+    journal = JobJournal(db)
+    journal.add(a)
+    journal.queue(a, {"crf": 23})
+    journal.fail(a, "boom")
+    journal.queue(a, {"crf": 28})
+    journal.close()
+    with open(journal.log_path, encoding="utf-8") as f:
+        log = f.read()
+    # 模拟换完快照、还没清空增量时崩溃：快照已包含日志里的全部序号
+    JobJournal(db).restore()
+    with open(journal.log_path, "w", encoding="utf-8") as f:
+        f.write(log)
+    reopened = JobJournal(db)
+    job = reopened.get(a)
+    assert [state for state, t in job["history"]] == ["pending", "queued", "failed", "queued"]
+    assert job["config"] == {"crf": 28}
+    reopened.close()
+
+
+def test_torn_last_line(tmp_path):
+    db = str(tmp_path / "journal.json")
+    a = make_source(tmp_path)
+    journal = JobJournal(db)
+    journal.add(a)
+    journal.queue(a, {"crf": 23})
+    journal.close()
+    with open(journal.log_path, "a", encoding="utf-8") as f:
+        f.write('{"path": "%s", "state": "do' % a)
+
+    reopened = JobJournal(db)
+    assert reopened.get(a)["state"] == "queued"
+    # 半行已被新快照吸收，后续追加从干净的增量开始
+    with open(reopened.log_path, encoding="utf-8") as f:
+        assert f.read() == ""
+    reopened.fail(a, "boom")
+    reopened.close()
+    assert JobJournal(db).get(a)["state"] == "failed"
+
+
+def test_restore_removes_partial_outputs(tmp_path):
+    db = str(tmp_path / "journal.json")
+    running, done, truncated, kept = (make_source(tmp_path, f"{n}.mp4") for n in ("r", "d", "t", "k"))
+    gone = str(tmp_path / "gone.mp4")
+    out = {name: str(tmp_path / f"{name}_out.mp4") for name in ("r", "d", "t")}
+
+    journal = JobJournal(db)
+    for path in (running, done, truncated, kept, gone):
+        journal.add(path)
+        journal.queue(path, {})
+    # 编码途中退出：占位文件和写了一半的临时文件都在
+    journal.start(running, out["r"])
+    open(out["r"], "wb").close()
+    with open(temp_path(out["r"]), "wb") as f:
+        f.write(b"partial")
+    # 已完成
+    with open(out["d"], "wb") as f:
+        f.write(b"complete")
+    journal.start(done, out["d"])
+    journal.finish(done, out["d"])
+    # 完成后被截断
+    with open(out["t"], "wb") as f:
+        f.write(b"complete")
+    journal.start(truncated, out["t"])
+    journal.finish(truncated, out["t"])
+    with open(out["t"], "wb") as f:
+        f.write(b"comp")
+    journal.close()
+
+    jobs = {job["path"]: job for job in JobJournal(db).restore()}
+    assert gone not in jobs
+    assert list(jobs) == [running, done, truncated, kept]
+    assert jobs[done]["state"] == "done" and jobs[done]["output"] == out["d"]
+    assert os.path.exists(out["d"])
+    for path, name in ((running, "r"), (truncated, "t")):
+        assert jobs[path]["state"] == "queued"
+        assert jobs[path]["output"] is None
+        assert not os.path.exists(out[name])
+        assert not os.path.exists(temp_path(out[name]))
+    assert jobs[kept]["state"] == "queued"
+    # restore 的结果已写入快照
+    assert JobJournal(db).get(running)["state"] == "queued"
+
+
+def test_queue_many_syncs_once(tmp_path, monkeypatch):
+    db = str(tmp_path / "journal.json")
+    paths = [make_source(tmp_path, f"{i}.mp4") for i in range(50)]
+    journal = JobJournal(db)
+    for path in paths:
+        journal.add(path)
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    journal.queue_many((path, {"crf": i}) for i, path in enumerate(paths))
+    assert len(synced) == 1
+    journal.close()
+    monkeypatch.undo()
+
+    reopened = JobJournal(db)
+    for i, path in enumerate(paths):
+        job = reopened.get(path)
+        assert job["state"] == "queued" and job["config"] == {"crf": i}
+    reopened.close()
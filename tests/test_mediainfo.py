@@ -0,0 +1,70 @@
+"""mediainfo.read_header 的容器头解析
+
+fixtures 下的样本都是 64x36、1 秒、10 fps 的 testsrc，生成命令:
+    S="-f lavfi -i testsrc=size=64x36:rate=10:duration=1"
+    ffmpeg $S -f lavfi -i sine=frequency=440:duration=1 -c:v libx264 -preset ultrafast -pix_fmt yuv420p -c:a aac -b:a 32k -shortest tiny.mp4
+    ffmpeg $S -c:v libx264 -preset ultrafast -pix_fmt yuv420p tiny.mov   (tiny.avi / tiny.flv 同理)
+    ffmpeg $S -c:v libx264 -preset ultrafast -pix_fmt yuv444p tiny444.mkv
+    ffmpeg -display_rotation 90 -i tiny.mov -c copy rot90.mp4
+    ffmpeg $S -c:v libx264 -preset ultrafast -pix_fmt yuv420p -movflags frag_keyframe+empty_moov frag.mp4
+期望值与 ffmpeg -i 的输出核对过。
+"""
+import os
+
+import pytest
+
+import mediainfo
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def fixture(name):
+    return os.path.join(FIXTURES, name)
+
+
+@pytest.mark.parametrize("name, pix_fmt, acodec, rotation", [
+    ("tiny.mp4", "yuv420p", "aac", 0),
+    ("tiny.mov", "yuv420p", "", 0),
+    ("tiny444.mkv", "yuv444p", "", 0),
+    ("tiny.avi", "yuv420p", "", 0),
+    ("tiny.flv", "yuv420p", "", 0),
+    ("rot90.mp4", "yuv420p", "", 90),
+])
+def test_read_header(name, pix_fmt, acodec, rotation):
+    info = mediainfo.read_header(fixture(name))
+    assert info is not None
+    assert (info["width"], info["height"]) == (64, 36)
+    assert info["duration"] == pytest.approx(1.0, abs=0.05)
+    assert info["vcodec"] == "h264"
+    assert info["pix_fmt"] == pix_fmt
+    assert info["acodec"] == acodec
+    assert info["rotation"] == rotation
+    assert info["fps"] == pytest.approx(10.0)
+    assert info["bitrate"] == int(os.path.getsize(fixture(name)) * 8 / info["duration"])
+
+
+def test_fragmented_mp4_falls_back():
+    # empty_moov 且没有 mehd，时长要扫全部 moof 才知道，交给 ffprobe
+    assert mediainfo.read_header(fixture("frag.mp4")) is None
+
+
+@pytest.mark.parametrize("name", ["tiny.mp4", "tiny444.mkv", "tiny.avi", "tiny.flv"])
+def test_truncated_falls_back(tmp_path, name):
+    with open(fixture(name), "rb") as f:
+        data = f.read()
+    path = tmp_path / name
+    path.write_bytes(data[:200])
+    assert mediainfo.read_header(str(path)) is None
+
+
+def test_tiny_and_missing_files(tmp_path):
+    path = tmp_path / "short.mp4"
+    path.write_bytes(b"\x00\x00\x00\x18ftypmp42")
+    assert mediainfo.read_header(str(path)) is None
+    assert mediainfo.read_header(str(tmp_path / "missing.mp4")) is None
+
+
+def test_unknown_container(tmp_path):
+    path = tmp_path / "noise.bin"
+    path.write_bytes(b"not a video" * 400)
+    assert mediainfo.read_header(str(path)) is None
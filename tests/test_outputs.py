@@ -0,0 +1,67 @@
+"""outputs.OutputAllocator：并发分配不重名、与已有文件 / 其他进程的冲突、commit 和 release"""
+import os
+import threading
+
+from outputs import OutputAllocator, temp_path
+
+
+def test_concurrent_reserve_is_unique(tmp_path):
+    allocator = OutputAllocator()
+    (tmp_path / "clip_x.mp4").write_bytes(b"existing")
+    (tmp_path / "clip_x_2.mp4").write_bytes(b"existing")
+    paths, barrier = [], threading.Barrier(8)
+    lock = threading.Lock()
+
+    def work():
+        barrier.wait()
+        for _ in range(25):
+            path = allocator.reserve(str(tmp_path), "clip_x")
+            with lock:
+                paths.append(path)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(paths) == len(set(paths)) == 200
+    names = {os.path.basename(p) for p in paths}
+    assert "clip_x.mp4" not in names and "clip_x_2.mp4" not in names
+    assert names == {f"clip_x_{n}.mp4" for n in range(1, 202) if n != 2}
+    # 每个名字都有占位文件，已有文件未被覆盖
+    assert all(os.path.getsize(p) == 0 for p in paths)
+    assert (tmp_path / "clip_x.mp4").read_bytes() == b"existing"
+
+
+def test_file_created_after_index(tmp_path):
+    allocator = OutputAllocator()
+    first = allocator.reserve(str(tmp_path), "a")
+    # 索引建立之后另一个进程建了下一个名字
+    (tmp_path / "a_1.mp4").write_bytes(b"other process")
+    second = allocator.reserve(str(tmp_path), "a")
+    assert os.path.basename(first) == "a.mp4"
+    assert os.path.basename(second) == "a_2.mp4"
+    assert (tmp_path / "a_1.mp4").read_bytes() == b"other process"
+
+
+def test_commit_and_release(tmp_path):
+    allocator = OutputAllocator()
+    done = allocator.reserve(str(tmp_path), "b", ".mkv")
+    with open(temp_path(done), "wb") as f:
+        f.write(b"encoded")
+    allocator.commit(done)
+    assert open(done, "rb").read() == b"encoded"
+    assert not os.path.exists(temp_path(done))
+
+    failed = allocator.reserve(str(tmp_path), "b", ".mkv")
+    open(temp_path(failed), "wb").close()
+    allocator.release(failed)
+    assert not os.path.exists(failed) and not os.path.exists(temp_path(failed))
+    # 释放的名字不回收
+    assert allocator.reserve(str(tmp_path), "b", ".mkv") not in (done, failed)
+
+
+def test_temp_path():
+    path = os.path.join("out", "movie_1.mp4")
+    assert temp_path(path) == os.path.join("out", ".movie_1.part.mp4")
@@ -0,0 +1,110 @@
+"""progress.ProgressParser：-progress 块的解析、N/A 字段、老版本的 out_time_ms"""
+import time
+
+import pytest
+
+from progress import ProgressParser
+
+
+def feed(parser, text):
+    for line in text.strip().splitlines():
+        parser.feed_line(line + "\n")
+
+
+def test_block():
+    events = []
+    parser = ProgressParser(100.0, events.append)
+    feed(parser, """
+frame=250
+fps=49.5
+bitrate=1000.0kbits/s
+total_size=1048576
+out_time_us=25000000
+out_time_ms=25000000
+out_time=00:00:25.000000
+speed=2.5x
+progress=continue
+""")
+    assert events == [{"out_time": 25.0, "frame": 250, "fps": 49.5, "speed": 2.5, "total_size": 1048576,
+                       "percent": 25, "eta": 30.0, "done": False}]
+    assert parser.last is events[0]
+
+
+def test_not_available_fields():
+    events = []
+    parser = ProgressParser(60.0, events.append)
+    feed(parser, """
+frame=0
+fps=N/A
+total_size=N/A
+out_time_us=N/A
+out_time_ms=N/A
+out_time=N/A
+speed=N/A
+progress=continue
+""")
+    assert events[-1] == {"out_time": 0.0, "frame": 0, "fps": 0.0, "speed": 0.0, "total_size": 0,
+                          "percent": 0, "eta": None, "done": False}
+
+
+def test_out_time_ms_only():
+    # 老版本没有 out_time_us，out_time_ms 的单位其实也是微秒
+    events = []
+    parser = ProgressParser(10.0, events.append)
+    feed(parser, """
+frame=120
+out_time_ms=4000000
+speed=2x
+progress=continue
+""")
+    assert events[-1]["out_time"] == 4.0
+    assert events[-1]["percent"] == 40
+    assert events[-1]["eta"] == 3.0
+
+
+def test_speed_from_wall_clock():
+    events = []
+    parser = ProgressParser(30.0, events.append)
+    parser.start = time.time() - 10
+    feed(parser, """
+out_time_us=20000000
+speed=N/A
+progress=continue
+""")
+    assert events[-1]["speed"] == pytest.approx(2.0, abs=0.05)
+    assert events[-1]["eta"] == pytest.approx(5.0, abs=0.2)
+
+
+def test_end_block_keeps_previous_fields():
+    events = []
+    parser = ProgressParser(8.0, events.append)
+    feed(parser, """
+frame=200
+fps=25
+total_size=5000
+out_time_us=8000000
+speed=1x
+progress=continue
+out_time_us=8000000
+progress=end
+""")
+    assert len(events) == 2
+    last = events[-1]
+    assert last["done"] is True
+    assert last["frame"] == 200 and last["total_size"] == 5000
+    # 进度封顶 99%，完成由 done 表示
+    assert last["percent"] == 99
+    assert last["eta"] == 0.0
+
+
+def test_unknown_duration_and_noise():
+    events = []
+    parser = ProgressParser(0.0, events.append)
+    feed(parser, """
+garbage line
+out_time_us=3000000
+speed=1.5x
+progress=continue
+""")
+    assert events[-1]["percent"] == 0
+    assert events[-1]["out_time"] == 3.0
@@ -0,0 +1,81 @@
+"""vlist.JobTable：删除留空位、rank / _position / window 与朴素列表一致，跨越压缩也一样"""
+import random
+from types import SimpleNamespace
+
+from vlist import JobTable
+
+
+def rec(path):
+    return SimpleNamespace(path=path)
+
+
+def check(table, model):
+    assert len(table) == len(model)
+    assert [r.path for r in table] == [r.path for r in model]
+    for i, r in enumerate(model):
+        assert table.rank(r) == i
+        assert table._rows[table._position(i)] is r
+        assert table.get(r.path) is r
+    for start in range(0, len(model), 7):
+        assert table.window(start, 5) == model[start:start + 5]
+
+
+def test_remove_keeps_order_and_ranks():
+    table, model = JobTable(), []
+    for i in range(10):
+        r = rec(f"f{i}")
+        table.append(r)
+        model.append(r)
+    for path in ("f0", "f4", "f5", "f9", "missing"):
+        table.remove(path)
+        model = [r for r in model if r.path != path]
+    assert "f4" not in table and table.get("f4") is None
+    # 空位还没到压缩阈值
+    assert len(table._dead) == 4
+    check(table, model)
+
+
+def test_compaction():
+    table, model = JobTable(), []
+    for i in range(200):
+        r = rec(f"f{i}")
+        table.append(r)
+        model.append(r)
+    # 阈值为 max(32, 200 // 4) = 50：删第 51 个时压缩
+    for i in range(50):
+        table.remove(f"f{i * 2}")
+    assert len(table._dead) == 50
+    model = [r for r in model if int(r.path[1:]) % 2 or int(r.path[1:]) >= 100]
+    check(table, model)
+    table.remove("f101")
+    model = [r for r in model if r.path != "f101"]
+    assert table._dead == [] and len(table._rows) == len(model)
+    check(table, model)
+
+
+def test_random_against_list():
+    rng = random.Random(7)
+    table, model, n = JobTable(), [], 0
+    for _ in range(3000):
+        if model and rng.random() < 0.45:
+            r = model.pop(rng.randrange(len(model)))
+            table.remove(r.path)
+        else:
+            r = rec(f"f{n}")
+            n += 1
+            table.append(r)
+            model.append(r)
+        if rng.random() < 0.05:
+            check(table, model)
+    check(table, model)
+
+
+def test_clear():
+    table = JobTable()
+    for i in range(5):
+        table.append(rec(f"f{i}"))
+    table.remove("f2")
+    table.clear()
+    assert len(table) == 0 and list(table) == [] and table.window(0, 10) == []
+    table.append(rec("g"))
+    assert table.rank(table.get("g")) == 0
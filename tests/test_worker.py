@@ -0,0 +1,57 @@
+"""worker.choose_strategy：源已符合目标时复制视频 / 音频流，否则重新编码"""
+import pytest
+
+from worker import VideoWorker, choose_strategy, audio_args
+
+PORTRAIT = {"width": 1080, "height": 1920, "vcodec": "h264", "pix_fmt": "yuv420p", "acodec": "aac", "rotation": 0}
+
+
+def meta(**changes):
+    return dict(PORTRAIT, **changes)
+
+
+@pytest.mark.parametrize("source, kwargs, video, audio", [
+    (meta(), {}, "copy", "copy"),
+    (meta(acodec="mp3"), {}, "copy", "transcode"),
+    (meta(acodec=""), {}, "copy", "none"),
+    # 只要有一项不符合就重新编码视频
+    (meta(vcodec="hevc"), {}, "transcode", "copy"),
+    (meta(pix_fmt="yuvj420p"), {}, "transcode", "copy"),
+    (meta(pix_fmt="yuv420p10le"), {}, "transcode", "copy"),
+    (meta(width=720, height=1280), {}, "transcode", "copy"),
+    (meta(rotation=90), {}, "transcode", "copy"),
+    (meta(), {"filters": True}, "transcode", "copy"),
+    # 未知的音频编码按需要转码处理
+    (meta(acodec=None), {}, "copy", "transcode"),
+])
+def test_choose_strategy(source, kwargs, video, audio):
+    assert choose_strategy(source, (1080, 1920), **kwargs) == {"video": video, "audio": audio}
+
+
+@pytest.mark.parametrize("source, enabled", [(None, True), ({}, True), (PORTRAIT, False)])
+def test_choose_strategy_disabled_or_unknown(source, enabled):
+    assert choose_strategy(source, (1080, 1920), enabled=enabled) == {"video": "transcode", "audio": "transcode"}
+
+
+def test_audio_args():
+    assert audio_args({"video": "copy", "audio": "copy"}) == ["-c:a", "copy"]
+    assert audio_args({"video": "copy", "audio": "transcode"}) == ["-c:a", "aac", "-b:a", "192k"]
+
+
+@pytest.mark.parametrize("config, video", [
+    ({"mode": "9:16"}, "copy"),
+    ({"mode": "16:9"}, "transcode"),
+    ({"mode": "9:16", "rotate": 90}, "transcode"),
+    ({"mode": "9:16", "saturation": 1.2}, "transcode"),
+    ({"mode": "9:16", "passthrough": False}, "transcode"),
+])
+def test_video_worker_command(config, video):
+    w = VideoWorker("in.mp4", config, 10.0, PORTRAIT)
+    assert w.strategy["video"] == video
+    cmd = w.build_command("out.mp4")
+    if video == "copy":
+        assert cmd[cmd.index("-c:v") + 1] == "copy" and "-vf" not in cmd
+    else:
+        assert cmd[cmd.index("-c:v") + 1] == "libx264" and "-vf" in cmd
+    assert cmd[cmd.index("-c:a") + 1] == ("aac" if config.get("passthrough") is False else "copy")
+    assert cmd[-1] == "out.mp4"
@@ -0,0 +1,226 @@
+import os
+import zlib
+import hashlib
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+
+from worker import cache_dir, get_ffmpeg_exe, NO_WINDOW
+import supervisor
+
+THUMB_SIZE = (240, 135)
+# 悬停预览用的多时间点帧数：按时长均匀取 SPRITE_TILES 帧，第一帧兼作缩略图
+SPRITE_TILES = 5
+# ffmpeg 输出 RGBA (而不是 RGB)：PIL 只有 4 字节像素的模式能直接映射外部缓冲区，不再复制一遍
+FRAME_BYTES = THUMB_SIZE[0] * THUMB_SIZE[1] * 4
+# 预览从第 1 秒开始取：第 0 帧常是黑场
+THUMB_START = 1.0
+
+
+def content_key(path):
+    """按内容而非路径生成缓存键：文件大小 + 头尾各 64KB 的 sha1，改名或移动后仍能命中"""
+    h = hashlib.sha1()
+    size = os.path.getsize(path)
+    h.update(str(size).encode())
+    with open(path, 'rb') as f:
+        h.update(f.read(65536))
+        if size > 131072:
+            f.seek(-65536, os.SEEK_END)
+            h.update(f.read(65536))
+    return h.hexdigest()
+
+
+def _run_raw(cmd):
+    cmd = cmd + ['-an', '-f', 'rawvideo', '-pix_fmt', 'rgba', 'pipe:1']
+    data = supervisor.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, creationflags=NO_WINDOW).stdout
+    data = data or b""
+    return data[:len(data) // FRAME_BYTES * FRAME_BYTES]
+
+
+def decode_raw(path, duration=0.0, sprite=True):
+    """一个 ffmpeg 进程把预览帧以原始 RGBA 像素写到 stdout，返回拼在一起的字节 (解码失败为空)。
+
+    sprite 且时长已知时从第 THUMB_START 秒起按时长均匀取最多 SPRITE_TILES 个关键帧；
+    关键帧太稀取不到时 (短片常见) 退回只取一帧
+    """
+    w, h = THUMB_SIZE
+    start = THUMB_START if duration > THUMB_START * 2 else 0
+    data = b""
+    if sprite and duration > 0:
+        # 只解码关键帧 (-skip_frame nokey)，按时长均匀取帧
+        step = max((duration - start) / SPRITE_TILES, 0.5)
+        data = _run_raw([get_ffmpeg_exe(), '-v', 'error', '-ss', f'{start:g}', '-skip_frame', 'nokey', '-i', path,
+                         '-vf', f'fps=1/{step:.3f},scale={w}:{h}', '-frames:v', str(SPRITE_TILES)])
+    if not data:
+        start = THUMB_START if not duration or duration > THUMB_START else 0
+        data = _run_raw([get_ffmpeg_exe(), '-v', 'error', '-ss', f'{start:g}', '-i', path,
+                         '-vf', f'scale={w}:{h}', '-frames:v', '1'])
+    return data
+
+
+def frames_from(data):
+    """原始 RGBA 字节直接映射成 [PIL.Image] (不复制像素)"""
+    from PIL import Image
+    view = memoryview(data)
+    return [Image.frombuffer("RGBA", THUMB_SIZE, view[i * FRAME_BYTES:(i + 1) * FRAME_BYTES], "raw", "RGBA", 0, 1)
+            for i in range(len(view) // FRAME_BYTES)]
+
+
+def decode_thumbs(path, duration=0.0, sprite=True):
+    """返回 [PIL.Image]：先查磁盘缓存 (按内容)，未命中时用 decode_raw 解码并写入缓存；失败返回 []"""
+    sprite = sprite and duration > 0
+    try:
+        # 拼图和单帧分开缓存：时长未知时存下的单帧，之后知道时长了仍会解码拼图
+        key = content_key(path) + ("" if sprite else "_1")
+    except OSError:
+        return frames_from(decode_raw(path, duration, sprite))
+    disk = get_thumb_disk()
+    data = disk.get(key)
+    if data is None:
+        data = decode_raw(path, duration, sprite)
+        if data:
+            disk.put(key, data)
+    return frames_from(data)
+
+
+class ThumbDisk:
+    """预览帧的磁盘缓存 (内存 LRU 之后的第二层)：每个源一个 zlib 压缩的 RGBA 文件，按内容键命名，
+    重启后可见的卡片不用再启动 ffmpeg。按最近使用时间 (文件 mtime) 做 LRU，总大小超过 max_bytes 时淘汰最旧的。
+    """
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        self.dir = directory or os.path.join(cache_dir(), "thumbs")
+        os.makedirs(self.dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = sum(e.stat().st_size for e in os.scandir(self.dir) if e.is_file())
+
+    def _path(self, key):
+        return os.path.join(self.dir, key + ".rgbz")
+
+    def get(self, key):
+        """返回缓存的原始 RGBA 字节，未命中或文件损坏返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+            os.utime(path)
+        except (OSError, zlib.error):
+            return None
+        return data if data and len(data) % FRAME_BYTES == 0 else None
+
+    def put(self, key, data):
+        # 先写临时文件再原子改名，并发加载同一文件也不会读到半个文件
+        blob = zlib.compress(data, 1)
+        try:
+            fd, tmp = tempfile.mkstemp(prefix="tmp", dir=self.dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            return
+        with self._lock:
+            self._total += len(blob)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            # tmp 开头的是正在写入的临时文件，跳过；旧版本的 JPEG 缓存也按同样的规则淘汰
+            entries = []
+            for e in os.scandir(self.dir):
+                if e.is_file() and not e.name.startswith("tmp"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._total = total
+
+
+class ThumbLRU:
+    """进程内的预览图 LRU，按像素字节数计量，超过 max_bytes 时淘汰最久没有显示过的。
+
+    解码线程用 put() 放入 PIL 帧；主线程显示时用 images() 取 (第一次取时把帧包装成 CTkImage，
+    之后 Tk 还会为显示生成一份同样大小的位图，按两倍计量)。只有可见卡片会调用 images()，
+    所以列表有 50 个还是 5 万个任务，占用的内存都不超过上限。
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._items = OrderedDict()     # 路径 -> [帧或 CTkImage 列表, 是否已包装, 字节数]
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """准备解码 key：已缓存或已有线程在解码时返回 False"""
+        with self._lock:
+            if key in self._items or key in self._pending:
+                return False
+            self._pending.add(key)
+            return True
+
+    def unclaim(self, key):
+        with self._lock:
+            self._pending.discard(key)
+
+    def put(self, key, frames):
+        with self._lock:
+            self._pending.discard(key)
+            old = self._items.pop(key, None)
+            if old:
+                self.total -= old[2]
+            size = len(frames) * FRAME_BYTES
+            self._items[key] = [frames, False, size]
+            self.total += size
+            self._evict()
+
+    def images(self, key, make):
+        """主线程调用：返回 key 的 CTkImage 列表 (make(PIL 帧) 负责创建)，未缓存返回 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            if not item[1]:
+                item[0], item[1] = [make(f) for f in item[0]], True
+                self.total += item[2]
+                item[2] *= 2
+                self._evict()
+            return item[0]
+
+    def _evict(self):
+        # 最近取用的在末尾；至少保留刚放入 / 取用的一项
+        while self.total > self.max_bytes and len(self._items) > 1:
+            _, item = self._items.popitem(last=False)
+            self.total -= item[2]
+
+
+_thumbs = None
+_disk = None
+_thumbs_lock = threading.Lock()
+
+
+def get_thumbs():
+    """进程内共享的预览图 LRU"""
+    global _thumbs
+    with _thumbs_lock:
+        if _thumbs is None:
+            _thumbs = ThumbLRU()
+        return _thumbs
+
+
+def get_thumb_disk():
+    """进程内共享的磁盘缓存"""
+    global _disk
+    with _thumbs_lock:
+        if _disk is None:
+            _disk = ThumbDisk()
+        return _disk
@@ -0,0 +1,164 @@
+"""按截止时间自动选择 x264 preset
+
+对批次里的几个文件各截一小段，用真实的滤镜链和当前并发 / 线程数依次试编码每档 preset，测出
+整批的吞吐 (每秒墙钟能处理多少秒源视频)，再选出能在截止时间前完成的最慢一档 preset
+(同样的 crf 下越慢压缩率越高)。preset 从快到慢测，一旦某档赶不上截止时间就停止，更慢的不再测。
+"""
+import os
+import re
+import time
+import datetime
+import threading
+
+from worker import VideoWorker, RenditionWorker, probe_video
+
+# 从快到慢；不含 slower / veryslow，批处理场景下它们几乎不可能赶上截止时间
+PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow")
+SAMPLE_SECONDS = 4
+MAX_SAMPLES = 4
+# 占位输出：生成命令后替换成 null 复用器
+_NULL = "\0null"
+
+
+def parse_deadline(text, now=None):
+    """截止时间 -> 距现在的秒数。
+
+    支持 "90s" / "45m" / "2h" / "1h30m"，不带单位的数字按分钟；"23:30" 表示今天 (已过则明天) 的这个时刻。
+    """
+    text = str(text).strip().lower()
+    now = now or datetime.datetime.now()
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})", text)
+    if m:
+        at = now.replace(hour=int(m.group(1)), minute=int(m.group(2)), second=0, microsecond=0)
+        if at <= now:
+            at += datetime.timedelta(days=1)
+        return (at - now).total_seconds()
+    if re.fullmatch(r"\d+(\.\d+)?", text):
+        return float(text) * 60
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([hms])", text)
+    if not parts or re.sub(r"[\d.\shms]", "", text):
+        raise ValueError(f"无法识别的截止时间: {text}")
+    return sum(float(v) * {"h": 3600, "m": 60, "s": 1}[u] for v, u in parts)
+
+
+def _transcoded(jobs, config):
+    """[(路径, 元数据)] 中需要重新编码视频的任务；直接复制视频流的任务几乎不花编码时间"""
+    out = []
+    for path, meta in jobs:
+        meta = meta or probe_video(path)
+        if not meta or meta.get('duration', 0) <= 0:
+            continue
+        if config.get('renditions') or VideoWorker(path, config, meta['duration'], meta).strategy['video'] != "copy":
+            out.append((path, meta))
+    return out
+
+
+def pick_samples(jobs, count=MAX_SAMPLES, seconds=SAMPLE_SECONDS):
+    """在批次中均匀挑 count 个文件，各取 1/3 处 (跳过片头) 的 seconds 秒，返回 [(路径, 元数据, 起点, 时长)]"""
+    if not jobs:
+        return []
+    step = len(jobs) / min(count, len(jobs))
+    picks = [jobs[int(i * step)] for i in range(min(count, len(jobs)))]
+    return [(path, meta, round(meta['duration'] / 3, 3), min(seconds, meta['duration'])) for path, meta in picks]
+
+
+def sample_command(path, meta, config, start, seconds):
+    """用任务实际会生成的命令 (滤镜链、编码参数、音频处理都一样) 只编码 [start, start + seconds)，输出丢弃"""
+    config = dict(config, passthrough=False, segment=False)
+    specs = config.pop('renditions', None)
+    if specs:
+        cmd = RenditionWorker(path, specs, config, seconds, meta).build_command([_NULL] * len(specs))
+    else:
+        cmd = VideoWorker(path, config, seconds, meta).build_command(_NULL)
+    i = cmd.index('-i')
+    cmd[i:i] = ['-ss', str(start), '-t', str(seconds)]
+    out = []
+    for arg in cmd:
+        out += ['-f', 'null', os.devnull] if arg == _NULL else [arg]
+    return out
+
+
+def measure_preset(samples, config, preset, concurrency=1, threads=0):
+    """按 concurrency 路并发 (每路 threads 线程，与正式批处理相同) 编码全部样本。
+
+    返回 {"preset", "speed" (整体每墙钟秒处理的源视频秒数), "fps", "wall"}；有样本失败时抛 RuntimeError。
+    """
+    from progress import run_ffmpeg
+    config = dict(config, preset=preset, threads=threads)
+    pending = list(samples)
+    lock = threading.Lock()
+    done = {"seconds": 0.0, "frames": 0, "error": None}
+
+    def runner():
+        while True:
+            with lock:
+                if not pending or done["error"]:
+                    return
+                path, meta, start, seconds = pending.pop(0)
+            last = {}
+            code, err = run_ffmpeg(sample_command(path, meta, config, start, seconds), seconds, last.update)
+            with lock:
+                if code != 0:
+                    done["error"] = f"FFmpeg Error {code}: {err.splitlines()[-1] if err else ''}"
+                done["seconds"] += last.get('out_time') or seconds
+                done["frames"] += last.get('frame', 0)
+
+    began = time.time()
+    workers = [threading.Thread(target=runner, daemon=True) for _ in range(max(1, min(concurrency, len(samples))))]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    wall = time.time() - began
+    if done["error"]:
+        raise RuntimeError(done["error"])
+    return {
+        "preset": preset,
+        "speed": round(done["seconds"] / wall, 3) if wall else 0.0,
+        "fps": round(done["frames"] / wall, 1) if wall else 0.0,
+        "wall": round(wall, 3),
+    }
+
+
+def autotune(jobs, config, deadline, concurrency=1, threads=0, presets=PRESETS,
+             samples=MAX_SAMPLES, seconds=SAMPLE_SECONDS, on_measure=None):
+    """为 [(路径, 元数据或 None)] 这一批任务选 preset。
+
+    deadline 为从现在起的秒数 (测速本身花的时间也算在内)。on_measure(记录) 在每测完一档时调用。
+    返回 {"preset", "projected" (预计编码秒数), "finish" (预计完成的时间戳), "meets", "work", "measured"}；
+    最快一档也赶不上时仍返回 ultrafast，meets 为 False。
+    """
+    began = time.time()
+    jobs = _transcoded(jobs, config)
+    work = sum(meta['duration'] for _, meta in jobs)
+    plan = {"preset": presets[0], "projected": 0.0, "finish": began, "meets": True,
+            "work": round(work, 3), "measured": []}
+    if not jobs:
+        # 全部是直接复制视频流，preset 无关紧要
+        return plan
+    picks = pick_samples(jobs, samples, seconds)
+    for preset in presets:
+        m = measure_preset(picks, config, preset, concurrency, threads)
+        left = deadline - (time.time() - began)
+        m["projected"] = round(work / m["speed"], 1) if m["speed"] else float("inf")
+        m["meets"] = m["projected"] <= left
+        plan["measured"].append(m)
+        if on_measure:
+            on_measure(m)
+        if not m["meets"] and preset != presets[0]:
+            break
+        plan.update(preset=preset, projected=m["projected"], meets=m["meets"])
+        if not m["meets"]:
+            break
+    plan["finish"] = time.time() + plan["projected"]
+    return plan
+
+
+def describe(plan):
+    """给界面显示的一句话说明"""
+    finish = datetime.datetime.fromtimestamp(plan["finish"]).strftime("%H:%M")
+    minutes = plan["projected"] / 60
+    text = f"自动选择 preset: {plan['preset']}，预计耗时 {minutes:.0f} 分钟，约 {finish} 完成"
+    if not plan["meets"]:
+        text += "\n(最快的 preset 也赶不上截止时间)"
+    return text
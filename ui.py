@@ -1,10 +1,22 @@
 import customtkinter as ctk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, Menu
 import os
 import subprocess
 import sys
 import json
 from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+
+from uibus import UIUpdateBus
+from vlist import JobRecord, JobTable, VirtualList
+from filtergraph import BLUR_DOWNSCALE
+from journal import JobJournal
+from worker import cache_dir, CANCELLED
+import startup
+
+# 卡片高度 167 + 间距 10
+CARD_ROW_HEIGHT = 177
+TITLE = "视频转比例工具 (Lite版)"
 
 # 设置外观
 ctk.set_appearance_mode("dark")
@@ -34,9 +46,13 @@ class UIHandler:
     def __init__(self, parent_window, pool):
         self.parent = parent_window  # 这里的 parent 是 ctk.CTk 实例
         self.pool = pool
-        self.cards = {}
+        self.cards = JobTable()
         self.output_dir = None
         self.converting_count = 0
+        self.plan = None    # 本批的耗时 / 输出大小估算 (planner.BatchPlan)
+        self.scheduler = None
+        self.controls = {}  # 路径 -> 运行中任务的 JobControl
+        self.queued = set() # 已交给调度器、还没开始的路径
         self.config_file = "user_settings.json"
         
         # 预览图池在 CTk 环境下通常建议使用简单的线程管理，这里保留 pool 引用
@@ -45,8 +61,21 @@ class UIHandler:
         self.init_ui()
         self.load_settings()
 
+        # 工作线程的界面更新统一经由 bus，在主线程按周期批量执行
+        self.bus = UIUpdateBus(self.parent)
+        self.bus.start()
+        # 元数据和预览图加载用有界线程池，不再每张卡片一个线程
+        self.loader = ThreadPoolExecutor(max_workers=4)
+        # 预览图只为可见卡片解码，单独的线程池，不排在大批元数据读取后面
+        self.thumb_loader = ThreadPoolExecutor(max_workers=2)
+        # 任务日志：崩溃或断电后重启时恢复列表，并续跑中断的批处理。日志对象先建好 (窗口画出前拖入的
+        # 文件也能记录)，整理日志、恢复列表放到窗口画出之后
+        self.journal = JobJournal(os.path.join(cache_dir(), "journal_ui.json"))
+        self.restored = False
+        startup.after_first_paint(self.parent, self.restore_jobs)
+
     def init_ui(self):
-        self.parent.title("视频转比例工具 (Lite版)")
+        self.parent.title(TITLE)
         self.parent.geometry("980x720")
         
         # CTk 的布局容器
@@ -65,7 +94,7 @@ class UIHandler:
 
         # 预设选择
         ctk.CTkLabel(self.top_bar, text="预设:").pack(side="left", padx=(15, 5))
-        self.preset = ctk.CTkOptionMenu(self.top_bar, values=["ultrafast 1080p30", "fast 1080p30", "自定义"],
+        self.preset = ctk.CTkOptionMenu(self.top_bar, values=["ultrafast 1080p30", "fast 1080p30", "自动 (按截止时间)", "自定义"],
                                         command=self.on_param_changed_wrapper, width=160)
         self.preset.pack(side="left", padx=5)
 
@@ -82,6 +111,11 @@ class UIHandler:
         self.blur_input.pack(side="left", padx=5)
         self.blur_input.bind("<KeyRelease>", self.on_param_changed_wrapper)
 
+        # 模糊画质：精细 = 原来的全分辨率模糊 (默认)，快速 = 低分辨率模糊后放大，背景会略有不同
+        self.blur_quality = ctk.CTkOptionMenu(self.top_bar, values=["精细模糊", "快速模糊"],
+                                              command=self.on_param_changed_wrapper, width=100)
+        self.blur_quality.pack(side="left", padx=5)
+
         # 质量 (CRF)
         ctk.CTkLabel(self.top_bar, text="质量:").pack(side="left", padx=(15, 5))
         self.quality_input = ctk.CTkEntry(self.top_bar, width=45)
@@ -119,8 +153,9 @@ class UIHandler:
                                       text_color="#64748b", font=("Microsoft YaHei", 14))
         self.hint_text.pack()
 
-        # 滚动列表区 (CTkScrollableFrame 非常强大)
-        self.scroll_frame = ctk.CTkScrollableFrame(self.area_container, fg_color="transparent")
+        # 滚动列表区：虚拟列表只为可见的几张卡片创建控件，滚动时复用
+        self.scroll_frame = VirtualList(self.area_container, self.cards, CARD_ROW_HEIGHT,
+                                        self.make_card, lambda card, rec, i: card.show(rec, i), gap=10)
         
         # Toast 提示组件
         self.toast = ToastOverlay(self.area_container)
@@ -131,18 +166,22 @@ class UIHandler:
         self.on_param_changed()
         self.save_settings()
 
+    def make_card(self, parent):
+        from core import VideoCard
+        return VideoCard(parent, self.remove_card, self.show_menu, self.request_thumb)
+
     def on_param_changed(self):
-        for card in self.cards.values():
-            if hasattr(card, 'status'):
-                card.status.configure(text="等待", text_color="#94a3b8")
-                card.pbar.set(0)
-                card.percent.configure(text="0%")
+        for rec in self.cards:
+            rec.status, rec.color, rec.progress = "等待", None, 0
+        self.scroll_frame.refresh()
 
     def on_blur_changed(self):
         if self.blur_var.get():
             self.blur_input.configure(state="normal")
+            self.blur_quality.configure(state="normal")
         else:
             self.blur_input.configure(state="disabled")
+            self.blur_quality.configure(state="disabled")
         self.on_param_changed_wrapper()
 
     def select_files(self):
@@ -155,31 +194,139 @@ class UIHandler:
         self.upload_hint.place_forget()
         self.scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        from core import VideoCard
+        from core import load_record
         for path in files:
             if path not in self.cards:
-                # 注意：VideoCard 类在 core.py 中也需要适配 CTkFrame
-                card = VideoCard(self.scroll_frame, path, self.remove_card)
-                card.pack(fill="x", pady=5)
-                self.cards[path] = card
+                rec = JobRecord(path)
+                self.cards.append(rec)
+                self.journal.add(path)
+                self.loader.submit(self.load_card, rec, load_record)
                 if not self.output_dir: self.output_dir = os.path.dirname(path)
-                self.folder_btn.configure(state="normal")
-
-    def remove_card(self, path, widget):
+        self.folder_btn.configure(state="normal")
+        self.scroll_frame.refresh()
+
+    def restore_jobs(self):
+        """按任务日志恢复上次的列表：已完成的保持完成，上次中断的批处理直接续跑"""
+        if self.restored: return
+        self.restored = True
+        # 恢复前已加入列表的文件保持原样
+        jobs = [job for job in self.journal.restore() if job["path"] not in self.cards]
+        if not jobs: return
+        resume = {}
+        for job in jobs:
+            rec = JobRecord(job["path"])
+            rec.meta = job["meta"]
+            if job["state"] == "done":
+                rec.output, rec.progress, rec.status, rec.color = job["output"], 100, "✓ 完成", "#10b981"
+            elif job["state"] == "failed":
+                rec.status, rec.color = "✗ 失败", "#ef4444"
+            elif job["state"] == "queued" and job["config"]:
+                resume[rec.path] = job["config"]
+            self.cards.append(rec)
+        from core import load_record
+        self.upload_hint.place_forget()
+        self.scroll_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        for job in jobs:
+            self.loader.submit(self.load_card, self.cards.get(job["path"]), load_record)
+        if not self.output_dir: self.output_dir = os.path.dirname(jobs[0]["path"])
+        self.folder_btn.configure(state="normal")
+        self.scroll_frame.refresh()
+        if resume:
+            self.parent.after(500, self.start_all, resume)
+
+    def load_card(self, rec, load_record):
+        load_record(rec)
+        if rec.meta: self.journal.set_meta(rec.path, rec.meta)
+        self.bus.post((rec, "info"), self.scroll_frame.refresh_record, rec)
+
+    def request_thumb(self, rec):
+        from core import get_thumbs
+        if get_thumbs().claim(rec.path):
+            self.thumb_loader.submit(self.load_thumb, rec)
+
+    def load_thumb(self, rec):
+        from core import load_thumb, get_thumbs
+        # 排队期间已经滚出屏幕的不再解码，等再次可见时重新请求
+        if id(rec) not in self.scroll_frame.visible:
+            get_thumbs().unclaim(rec.path)
+            return
+        load_thumb(rec)
+        self.bus.post((rec, "thumb"), self.scroll_frame.refresh_record, rec)
+
+    def remove_card(self, path, widget=None):
         if path in self.cards:
-            del self.cards[path]
-            widget.destroy()
+            # 运行中 / 排队中的任务先取消，未写完的输出由工作线程删除
+            self.cancel_card(self.cards.get(path))
+            self.cards.remove(path)
+            self.journal.remove(path)
+            self.scroll_frame.refresh()
             if not self.cards:
                 self.folder_btn.configure(state="disabled")
                 self.scroll_frame.pack_forget()
                 self.upload_hint.place(relx=0.5, rely=0.5, anchor="center")
 
     def clear_list(self):
-        for path in list(self.cards.keys()):
-            self.remove_card(path, self.cards[path])
+        for rec in list(self.cards):
+            self.cancel_card(rec)
+        self.cards.clear()
+        self.journal.clear()
+        self.scroll_frame.refresh()
+        self.folder_btn.configure(state="disabled")
+        self.scroll_frame.pack_forget()
+        self.upload_hint.place(relx=0.5, rely=0.5, anchor="center")
 
-    def start_all(self):
-        targets = [c for c in self.cards.values() if "等待" in c.status.cget("text")]
+    # --- 任务控制 (右键菜单) ---
+
+    def show_menu(self, rec, event):
+        menu = Menu(self.parent, tearoff=0)
+        control = self.controls.get(rec.path)
+        if control is not None:
+            if control.paused:
+                menu.add_command(label="继续", command=lambda: self.resume_card(rec))
+            else:
+                menu.add_command(label="暂停", command=lambda: self.pause_card(rec))
+            menu.add_command(label="取消", command=lambda: self.cancel_card(rec))
+        elif rec.path in self.queued:
+            menu.add_command(label="优先处理", command=lambda: self.scheduler.promote(rec))
+            menu.add_command(label="取消", command=lambda: self.cancel_card(rec))
+        else:
+            return
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+
+    def pause_card(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None and control.pause():
+            # 暂停的任务不占并发名额，排队的任务会先开始
+            self.set_status(rec, status="已暂停", color="#f59e0b")
+
+    def resume_card(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None and control.resume():
+            self.set_status(rec, status="处理中...", color="#4a9eff")
+
+    def cancel_card(self, rec):
+        control = self.controls.get(rec.path)
+        if control is not None:
+            # 工作线程随后以 CANCELLED 回调 on_fail
+            control.cancel()
+        elif rec.path in self.queued and self.scheduler.withdraw(rec):
+            self.queued.discard(rec.path)
+            self.on_fail(rec, CANCELLED)
+
+    def set_status(self, rec, progress=None, status=None, color=None):
+        # 任意线程调用：只改记录数据，卡片由 bus 在主线程重画 (不可见的记录不产生控件操作)
+        if progress is not None: rec.progress = progress
+        if status is not None: rec.status, rec.color = status, color
+        self.bus.post((rec, "status"), self.scroll_frame.refresh_record, rec)
+
+    def start_all(self, resume=None):
+        # resume: {路径: 上次记录的参数}，由 restore_jobs 在启动时传入，按原参数续跑
+        # 日志还没整理就开始转换时先整理 (restore 会把 running 的任务当作中断删掉输出)
+        if resume is None: self.restore_jobs()
+        targets = [rec for rec in self.cards if "等待" in rec.status and (resume is None or rec.path in resume)]
         if not targets: return
         
         self.start_btn.configure(state="disabled", text="转换中...")
@@ -189,35 +336,141 @@ class UIHandler:
             "mode": "9:16" if "9:16" in self.mode.get() else "16:9",
             "blur": self.blur_var.get(),
             "blur_sigma": int(self.blur_input.get() or 60),
+            "blur_downscale": BLUR_DOWNSCALE if "快速" in self.blur_quality.get() else 1,
             "crf": int(self.quality_input.get() or 25),
             "preset": 'ultrafast' if "ultrafast" in self.preset.get() else 'fast'
         }
         
-        from core import VideoWorker
-        for path, card in list(self.cards.items()):
-            if card not in targets: continue
-            card.status.configure(text="处理中...", text_color="#4a9eff")
-            
+        from scheduler import EncodeScheduler
+        scheduler = EncodeScheduler()
+
+        if resume is None and "自动" in self.preset.get():
+            # 自动 preset：先试编码测速，确认预计完成时间后再开始
+            from tune import parse_deadline
+            text = ctk.CTkInputDialog(title="自动 preset", text="截止时间 (如 45m、2h、23:30):").get_input()
+            try:
+                deadline = parse_deadline(text)
+            except (TypeError, ValueError):
+                self.start_btn.configure(state="normal", text="开始转换")
+                return
+            self.start_btn.configure(text="测速中...")
+            Thread(target=self.tune_and_launch, args=(targets, config, scheduler, deadline), daemon=True).start()
+            return
+        self.launch(targets, {rec.path: (resume or {}).get(rec.path, config) for rec in targets}, scheduler)
+
+    def tune_and_launch(self, targets, config, scheduler, deadline):
+        from tune import autotune
+        try:
+            plan = autotune([(rec.path, rec.meta) for rec in targets], config, deadline,
+                            concurrency=scheduler.target, threads=scheduler.threads_per_job(len(targets)))
+        except Exception as e:
+            self.bus.post(None, self.tune_failed, str(e))
+            return
+        self.bus.post(None, self.confirm_plan, targets, dict(config, preset=plan["preset"]), scheduler, plan)
+
+    def tune_failed(self, msg):
+        messagebox.showerror("自动 preset", f"测速失败: {msg}")
+        self.start_btn.configure(state="normal", text="开始转换")
+        self.converting_count = 0
+
+    def confirm_plan(self, targets, config, scheduler, plan):
+        from tune import describe
+        if not messagebox.askokcancel("自动 preset", describe(plan) + "\n\n开始转换？"):
+            self.start_btn.configure(state="normal", text="开始转换")
+            self.converting_count = 0
+            return
+        self.start_btn.configure(text="转换中...")
+        self.launch(targets, {rec.path: config for rec in targets}, scheduler)
+
+    def launch(self, targets, configs, scheduler):
+        from worker import VideoWorker
+        from core import stats_text
+        from planner import BatchPlan, format_bytes
+
+        # 开始前估算耗时和输出大小；输出磁盘放不下时先确认
+        self.plan = BatchPlan([(rec.path, rec.meta, configs[rec.path]) for rec in targets],
+                              scheduler.target, scheduler.threads_per_job(len(targets)))
+        short = self.plan.disk_shortfall(lambda p: os.path.join(os.path.dirname(p), "Converted_Videos"))
+        if short and not messagebox.askokcancel("磁盘空间不足", "\n".join(
+                f"{d}: 剩余 {format_bytes(free)}，预计需要 {format_bytes(need)}" for d, free, need in short)
+                + "\n\n仍然开始转换？"):
+            self.plan = None
+            self.converting_count = 0
+            self.start_btn.configure(state="normal", text="开始转换")
+            return
+        self.update_estimate(tick=True)
+
+        self.scheduler = scheduler
+        self.journal.queue_many((rec.path, configs[rec.path]) for rec in targets)
+        self.queued.update(rec.path for rec in targets)
+
+        def run_card(rec, slot):
+            self.queued.discard(rec.path)
+            self.set_status(rec, status="处理中...", color="#4a9eff")
+            if self.plan: self.plan.start(rec.path)
+
             # 适配信号：由于 CTk 没有 PyQt 的 Signal，VideoWorker 需要改用回调
-            w = VideoWorker(path, config, card.duration)
-            # 注入回调逻辑 (需要在 core.py 配合修改)
-            w.on_progress = lambda v, c=card: c.update_progress(v)
-            w.on_finished = lambda out, c=card: self.on_ok(c)
-            w.on_error = lambda msg, c=card: self.on_fail(c, msg)
-            
-            # 使用池或线程启动
-            Thread(target=w.run, daemon=True).start()
-
-    def on_ok(self, card):
+            # 调度器给每个任务分配固定的编码线程数，避免 N 个 ffmpeg 各自占满全部核心
+            w = VideoWorker(rec.path, dict(configs[rec.path], threads=slot.threads), rec.duration, rec.meta)
+            w.on_start = lambda out, r=rec: self.journal.start(r.path, out)
+            if w.strategy['video'] == "copy":
+                # 源已是目标规格，只复制视频流重新封装
+                self.set_status(rec, status="封装中...", color="#4a9eff")
+            # 回调只更新记录，进度按任务合并，每个刷新周期只重画一次可见卡片
+            w.on_progress = lambda v, r=rec: self.set_status(r, progress=v)
+            w.on_fps = slot.report_fps
+            w.on_stats = lambda ev, r=rec: self.set_status(r, status=stats_text(ev), color="#4a9eff") if ev['fps'] else None
+            w.on_finished = lambda out, r=rec, s=w.strategy: self.bus.post(None, self.on_ok, r, out, s)
+            w.on_error = lambda msg, r=rec: self.bus.post(None, self.on_fail, r, msg)
+            from jobctl import JobControl
+            w.control = self.controls[rec.path] = JobControl()
+            w.control.slot = slot
+            try:
+                w.run()
+            finally:
+                self.controls.pop(rec.path, None)
+
+        # 按 CPU 核数自适应并发，拿到槽位才启动对应任务
+        Thread(target=scheduler.run, args=(targets, run_card), daemon=True).start()
+
+    def update_estimate(self, tick=False):
+        """标题栏显示剩余时间和输出大小；tick=True 时转换期间每 5 秒按各任务进度刷新"""
+        if self.plan is None or self.converting_count <= 0:
+            return
+        from planner import describe
+        progress = {rec.path: rec.progress for rec in self.cards if rec.path in self.plan.jobs}
+        self.parent.title(f"{TITLE} — {describe(self.plan.summary(progress))}")
+        if tick:
+            self.parent.after(5000, self.update_estimate, True)
+
+    def on_ok(self, rec, output, strategy=None):
+        rec.output = output
+        if rec.path in self.cards: self.journal.finish(rec.path, output)
+        if self.plan:
+            from planner import output_size
+            self.plan.finish(rec.path, None, output_size(output))
+        remux = strategy is not None and strategy['video'] == "copy"
+        self.set_status(rec, 100, "✓ 封装" if remux else "✓ 完成", "#10b981")
         self.converting_count -= 1
-        self.parent.after(0, self.check_finish)
-
-    def on_fail(self, card, msg):
+        self.check_finish()
+
+    def on_fail(self, rec, msg):
+        # 已从列表移除的任务不再写日志，免得重启后又恢复出来
+        if rec.path in self.cards: self.journal.fail(rec.path, msg)
+        if self.plan: self.plan.finish(rec.path, 0, 0)
+        if msg == CANCELLED:
+            self.set_status(rec, status=CANCELLED, color="#94a3b8")
+        else:
+            self.set_status(rec, status="✗ 失败", color="#ef4444")
         self.converting_count -= 1
-        self.parent.after(0, self.check_finish)
+        self.check_finish()
 
     def check_finish(self):
+        self.update_estimate()
         if self.converting_count <= 0:
+            self.plan = None
+            self.scheduler = None
+            self.parent.title(TITLE)
             self.start_btn.configure(state="normal", text="开始转换")
             self.toast.show_msg()
 
@@ -234,6 +487,7 @@ class UIHandler:
                 "preset_index": self.preset.get(),
                 "blur_checked": self.blur_var.get(),
                 "blur_sigma": self.blur_input.get(),
+                "blur_quality": self.blur_quality.get(),
                 "crf": self.quality_input.get()
             }
             with open(self.config_file, 'w', encoding='utf-8') as f:
@@ -248,6 +502,7 @@ class UIHandler:
                 self.mode.set(s.get("mode_index", "9:16（竖屏）"))
                 self.preset.set(s.get("preset_index", "ultrafast 1080p30"))
                 self.blur_var.set(s.get("blur_checked", False))
+                self.blur_quality.set(s.get("blur_quality", "精细模糊"))
                 self.on_blur_changed()
                 self.blur_input.delete(0, "end")
                 self.blur_input.insert(0, s.get("blur_sigma", "60"))
@@ -0,0 +1,50 @@
+import threading
+from collections import OrderedDict
+
+
+class UIUpdateBus:
+    """线程安全的界面更新总线。
+
+    Tk 控件只能在主线程操作：工作线程调用 post() 把更新放进队列，主线程用一个周期性
+    after() 统一取出并批量执行。同一个 key 在一个周期内只保留最后一次 (比如同一任务的
+    进度条)，因此几十个任务同时上报也只会产生每周期每任务一次控件更新。
+    """
+    def __init__(self, root, interval_ms=50):
+        self.root = root
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._after_id = None
+
+    def post(self, key, fn, *args):
+        """登记一次更新；key 为 None 表示不可合并 (如完成通知)，按顺序逐个执行"""
+        if key is None:
+            key = object()
+        with self._lock:
+            # 先删再插，保证执行顺序与最后一次登记的顺序一致
+            self._pending.pop(key, None)
+            self._pending[key] = (fn, args)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def flush(self):
+        """在主线程中立即执行所有待处理更新"""
+        with self._lock:
+            batch, self._pending = self._pending, OrderedDict()
+        for fn, args in batch.values():
+            try:
+                fn(*args)
+            except Exception:
+                # 控件可能已被删除 (任务被移除)，忽略即可
+                pass
+
+    def _tick(self):
+        self.flush()
+        self._after_id = self.root.after(self.interval_ms, self._tick)
@@ -0,0 +1,190 @@
+import sys
+import bisect
+
+import customtkinter as ctk
+
+
+class JobRecord:
+    """任务列表中一行的纯数据 (不持有任何控件)，一万个任务也只占很少内存"""
+    __slots__ = ("path", "duration", "width", "height", "info", "progress", "status", "color",
+                 "output", "meta")
+
+    def __init__(self, path):
+        self.path = path
+        self.duration = 0.0
+        self.width = 0
+        self.height = 0
+        self.info = "读取中..."
+        self.progress = 0
+        self.status = "等待"
+        self.color = None
+        self.output = ""
+        self.meta = None
+
+
+class JobTable:
+    """保持插入顺序的任务表。
+
+    删除只在原位置留下空位并记进有序的空位表，空位超过 1/4 时才整体压缩一次，
+    所以删除是均摊 O(1)；序号由位置推算 (rank)，删除后无需逐行重新编号。
+    """
+    def __init__(self):
+        self._rows = []
+        self._dead = []
+        self._pos = {}
+
+    def __len__(self):
+        return len(self._rows) - len(self._dead)
+
+    def __contains__(self, path):
+        return path in self._pos
+
+    def __iter__(self):
+        return (r for r in self._rows if r is not None)
+
+    def get(self, path):
+        pos = self._pos.get(path)
+        return None if pos is None else self._rows[pos]
+
+    def append(self, rec):
+        self._pos[rec.path] = len(self._rows)
+        self._rows.append(rec)
+
+    def remove(self, path):
+        pos = self._pos.pop(path, None)
+        if pos is None:
+            return
+        self._rows[pos] = None
+        bisect.insort(self._dead, pos)
+        if len(self._dead) > max(32, len(self._rows) // 4):
+            self._compact()
+
+    def clear(self):
+        self._rows, self._dead, self._pos = [], [], {}
+
+    def _compact(self):
+        self._rows = [r for r in self._rows if r is not None]
+        self._dead = []
+        self._pos = {r.path: i for i, r in enumerate(self._rows)}
+
+    def rank(self, rec):
+        """rec 在存活任务中的序号 (从 0 开始)"""
+        pos = self._pos[rec.path]
+        return pos - bisect.bisect_left(self._dead, pos)
+
+    def _position(self, rank):
+        # 找到第 rank 个存活记录的物理位置：二分查找 [0, p] 内存活数 == rank + 1 的最小 p
+        lo, hi = rank, rank + len(self._dead)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mid + 1 - bisect.bisect_right(self._dead, mid) >= rank + 1:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def window(self, start, count):
+        """取从第 start 个存活任务起的 count 个记录"""
+        out = []
+        pos = self._position(start)
+        while pos < len(self._rows) and len(out) < count:
+            if self._rows[pos] is not None:
+                out.append(self._rows[pos])
+            pos += 1
+        return out
+
+
+class VirtualList(ctk.CTkFrame):
+    """只为可见行创建控件的虚拟列表，滚动时复用同一批行控件重新绑定数据。
+
+    make_row(parent) 创建一个行控件；bind_row(widget, rec, index) 把记录画到控件上。
+    行高固定为 row_height (含行间距 gap)，滚动粒度为一行。
+    """
+    def __init__(self, master, table, row_height, make_row, bind_row, gap=0, **kwargs):
+        kwargs.setdefault("fg_color", "transparent")
+        super().__init__(master, **kwargs)
+        self.table = table
+        self.row_height = row_height
+        self.make_row = make_row
+        self.bind_row = bind_row
+        self.gap = gap
+        self.top = 0
+        self.pool = []
+        self.visible = {}   # id(记录) -> 当前显示它的行控件
+        self._pending = None
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent", corner_radius=0)
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.body.bind("<Configure>", lambda e: self.refresh())
+        # 鼠标在列表上方时才接管滚轮
+        self.bind("<Enter>", lambda e: self._bind_wheel(True))
+        self.bind("<Leave>", lambda e: self._bind_wheel(False))
+
+    # ---- 滚动 ----
+    def _bind_wheel(self, on):
+        if on:
+            self.bind_all("<MouseWheel>", self._on_wheel)
+            if sys.platform.startswith("linux"):
+                self.bind_all("<Button-4>", lambda e: self.scroll_to(self.top - 3))
+                self.bind_all("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        else:
+            self.unbind_all("<MouseWheel>")
+            if sys.platform.startswith("linux"):
+                self.unbind_all("<Button-4>")
+                self.unbind_all("<Button-5>")
+
+    def _on_wheel(self, event):
+        step = -event.delta // 120 if sys.platform == "win32" else -event.delta
+        self.scroll_to(self.top + (step or (-1 if event.delta > 0 else 1)) * 3)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.table)))
+        elif args[0] == "scroll":
+            amount = int(args[1]) * (self.page_size() if args[2] == "pages" else 1)
+            self.scroll_to(self.top + amount)
+
+    def page_size(self):
+        return max(1, self.body.winfo_height() // self.row_height)
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, len(self.table) - self.page_size()))
+        self._redraw()
+
+    # ---- 绘制 ----
+    def refresh(self):
+        """数据变化后调用；同一轮事件循环内多次调用只重绘一次"""
+        if self._pending is None:
+            self._pending = self.after_idle(self._redraw)
+
+    def refresh_record(self, rec):
+        """只重画某条记录 (不可见时什么也不做)"""
+        widget = self.visible.get(id(rec))
+        if widget is not None and widget.rec is rec:
+            self.bind_row(widget, rec, self.table.rank(rec) + 1)
+
+    def _redraw(self):
+        self._pending = None
+        total = len(self.table)
+        page = self.page_size()
+        self.top = max(0, min(self.top, total - page))
+        # 多建一行，避免半行可见时出现空白
+        while len(self.pool) < page + 1:
+            self.pool.append(self.make_row(self.body))
+        recs = self.table.window(self.top, len(self.pool))
+        self.visible = {}
+        for i, widget in enumerate(self.pool):
+            if i < len(recs):
+                widget.rec = recs[i]
+                self.bind_row(widget, recs[i], self.top + i + 1)
+                self.visible[id(recs[i])] = widget
+                widget.place(x=0, y=i * self.row_height, relwidth=1, height=self.row_height - self.gap)
+            else:
+                widget.place_forget()
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + page) / total))
+        else:
+            self.scrollbar.set(0, 1)
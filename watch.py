@@ -0,0 +1,256 @@
+"""监视文件夹：新文件写完即自动转换 (python -m engine --watch 使用)
+
+Linux 上用 inotify (ctypes 直接调用 libc，不依赖第三方库) 及时发现新文件，其他平台或
+inotify 不可用时退化为每 poll_interval 秒扫描一次目录树。无论哪种方式，文件都要在 settle 秒内大小和修改时间都不再
+变化才算写完 (网络共享上拷贝大文件时 close 事件并不可靠)，写完后立刻交给调度器转换。
+"""
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+
+from worker import VIDEO_EXTS
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+_EVENT = struct.Struct("iIII")
+# 没有 inotify 时整棵目录树的扫描间隔 (秒)：共享目录上有成千上万个文件时，每次扫描都要列目录并取每个文件的大小
+POLL_INTERVAL = 10.0
+
+
+class Inotify:
+    """最小的 inotify 封装：add(dir) 加监视，read(timeout) 返回 [(完整路径, mask)]"""
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def add(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {path}")
+        self._dirs[wd] = path
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events, pos = [], 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + length].rstrip(b"\0")
+            pos += length
+            parent = self._dirs.get(wd)
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+            elif parent is not None:
+                events.append((os.path.join(parent, os.fsdecode(name)), mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """监视若干目录 (含子目录)，文件稳定后回调 on_ready(path, root)。
+
+    已交出去的文件记住 (大小, 修改时间)，之后被整个替换成新内容时会再次交出；扫描时大小和修改时间
+    都没变的已交出文件直接跳过，不再进入候选逐个检查。interval 为检查候选文件是否稳定的间隔，
+    poll_interval 为没有 inotify 时重新扫描整棵目录树的间隔。
+    exclude 中的目录 (比如输出目录) 和名为 Converted_Videos 的目录不监视。
+    """
+    def __init__(self, roots, on_ready, settle=5.0, interval=1.0, exclude=(), use_inotify=None,
+                 poll_interval=POLL_INTERVAL):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.on_ready = on_ready
+        self.settle = settle
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self.exclude = [os.path.abspath(p) for p in exclude if p]
+        self._candidates = {}   # 路径 -> [大小, mtime_ns, 开始稳定的时间]
+        self._handed = {}       # 路径 -> 交出时的 (大小, mtime_ns)
+        self.inotify = None
+        if use_inotify is not False:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                if use_inotify:
+                    raise
+
+    def _excluded(self, path):
+        for ex in self.exclude:
+            if path == ex or path.startswith(ex + os.sep):
+                return True
+        return "Converted_Videos" in path.split(os.sep)
+
+    def _root_of(self, path):
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                return root
+        return None
+
+    def _consider(self, path, sig=None):
+        """sig 为扫描时读到的 (大小, mtime_ns)；与交出时相同说明文件没变，跳过"""
+        if path in self._candidates:
+            return
+        name = os.path.basename(path)
+        # 临时文件 (分段目录、日志临时文件、下载中的隐藏文件) 不处理
+        if name.startswith(".") or not name.lower().endswith(VIDEO_EXTS) or self._excluded(path):
+            return
+        if sig is not None and self._handed.get(path) == sig:
+            return
+        self._candidates[path] = [None, None, 0.0]
+
+    def _scan(self, top):
+        # scandir 的目录项自带大小和修改时间 (Windows 上不用再单独 stat)
+        try:
+            entries = sorted(os.scandir(top), key=lambda e: e.name)
+        except OSError:
+            return
+        if self.inotify:
+            try:
+                self.inotify.add(top)
+            except OSError:
+                pass
+        dirs = []
+        for e in entries:
+            try:
+                if e.is_dir():
+                    if not e.is_symlink() and not e.name.startswith(".") and not self._excluded(e.path):
+                        dirs.append(e.path)
+                elif e.is_file():
+                    st = e.stat()
+                    self._consider(e.path, (st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+        for d in dirs:
+            self._scan(d)
+
+    def _check(self):
+        now = time.time()
+        for path, c in list(self._candidates.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._candidates[path]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if self._handed.get(path) == sig:
+                del self._candidates[path]
+                continue
+            if (c[0], c[1]) != sig:
+                c[0], c[1], c[2] = sig[0], sig[1], now
+            elif st.st_size > 0 and now - c[2] >= self.settle:
+                del self._candidates[path]
+                self._handed[path] = sig
+                self.on_ready(path, self._root_of(path))
+
+    def run(self, stop=None):
+        """阻塞运行直到 stop (threading.Event) 被设置"""
+        stop = stop or threading.Event()
+        for root in self.roots:
+            self._scan(root)
+        last_scan = time.time()
+        try:
+            while not stop.is_set():
+                if self.inotify:
+                    for path, mask in self.inotify.read(self.interval):
+                        if path is None:
+                            # 事件队列溢出：整体重扫一遍
+                            for root in self.roots:
+                                self._scan(root)
+                        elif mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(path):
+                                self._scan(path)
+                        else:
+                            self._consider(path)
+                else:
+                    stop.wait(self.interval)
+                    # 没有 inotify 时每 poll_interval 扫描一次整棵目录树，其间只检查候选文件
+                    if time.time() - last_scan >= self.poll_interval:
+                        for root in self.roots:
+                            self._scan(root)
+                        last_scan = time.time()
+                self._check()
+        finally:
+            if self.inotify:
+                self.inotify.close()
+
+
+def serve(engine, roots, out_root=None, settle=5.0, poll=False, stop=None, poll_interval=POLL_INTERVAL):
+    """监视 roots，文件写完后用 engine (BatchEngine) 立即转换。
+
+    out_root 不为空时输出按源文件相对监视目录的路径镜像到 out_root 下；否则沿用默认的
+    源文件旁 Converted_Videos。已记录在任务日志里、源文件未变且输出校验通过的文件不会重复转换。
+    """
+    journal = engine.journal
+    done = {}
+    if journal:
+        for job in journal.restore():
+            if job["state"] == "done":
+                done[job["path"]] = job.get("source")
+    jobs = queue.Queue()
+
+    def on_ready(path, root):
+        st = os.stat(path)
+        source = [st.st_size, st.st_mtime_ns]
+        if done.pop(path, None) == source:
+            engine.emit("skip", file=path, output=journal.get(path)["output"])
+            return
+        config = dict(engine.config)
+        if out_root:
+            config["out_dir"] = os.path.normpath(os.path.join(out_root, os.path.relpath(os.path.dirname(path), root)))
+        engine.job_configs[path] = config
+        if journal:
+            journal.add(path)
+            journal.queue(path, config, source=source)
+        engine.queued_at[path] = time.time()
+        engine.emit("queued", file=path)
+        jobs.put(path)
+
+    def job(path, slot):
+        try:
+            engine.run_one(path, slot)
+        finally:
+            engine.scheduler.release(slot)
+
+    def dispatch():
+        # 有空闲槽位就立即开始，不等凑批
+        while True:
+            path = jobs.get()
+            if path is None:
+                return
+            slot = engine.scheduler.acquire(jobs.qsize() + 1)
+            threading.Thread(target=job, args=(path, slot), daemon=True).start()
+
+    dispatcher = threading.Thread(target=dispatch, daemon=True)
+    dispatcher.start()
+    watcher = FolderWatcher(roots, on_ready, settle=settle, exclude=[out_root],
+                            use_inotify=False if poll else None, poll_interval=poll_interval)
+    engine.emit("watch", roots=watcher.roots, out_root=out_root,
+                backend="inotify" if watcher.inotify else "poll", settle=settle)
+    try:
+        watcher.run(stop)
+    finally:
+        jobs.put(None)
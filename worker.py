@@ -0,0 +1,333 @@
+import os
+import subprocess
+import json
+import sys
+
+from filtergraph import compile_filter, compile_renditions, display_size, has_pixel_filters, target_size
+from outputs import get_allocator, temp_path
+from mediainfo import read_header
+import supervisor
+
+# 注意：本模块不依赖任何界面库 (customtkinter / PIL)，无显示器的渲染机也能直接使用
+
+VIDEO_EXTS = ('.mp4', '.mov', '.mkv', '.avi', '.flv', '.ts')
+
+NO_WINDOW = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+
+# 超过该时长 (秒) 的视频自动切成关键帧分段并行编码，见 segments.py
+SEGMENT_THRESHOLD = 20 * 60
+
+
+# --- 路径识别逻辑：确保打包后能找到 ffmpeg ---
+def get_ffmpeg_exe():
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+        return os.path.join(base_path, "ffmpeg.exe")
+    return 'ffmpeg'
+
+def get_ffprobe_exe():
+    if getattr(sys, 'frozen', False):
+        base_path = os.path.dirname(sys.executable)
+        return os.path.join(base_path, "ffprobe.exe")
+    return 'ffprobe'
+
+
+def ffmpeg_version():
+    """ffmpeg -version 的第一行 (基准结果和遥测标签用)，取不到时为空字符串"""
+    try:
+        out = subprocess.run([get_ffmpeg_exe(), '-version'], stdout=subprocess.PIPE,
+                             stderr=subprocess.DEVNULL, creationflags=NO_WINDOW).stdout
+        return out.decode('utf-8', 'replace').splitlines()[0]
+    except (OSError, IndexError):
+        return ""
+
+
+def cache_dir():
+    """本地缓存目录 (元数据库、缩略图等)，可用环境变量 YASUO_CACHE_DIR 覆盖"""
+    path = os.environ.get("YASUO_CACHE_DIR")
+    if not path:
+        if sys.platform == "win32":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "yasuo")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _parse_rate(rate):
+    try:
+        num, den = rate.split("/")
+        return round(float(num) / float(den), 3) if float(den) else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def _rotation(video):
+    # 旧版 ffmpeg 写在 tags.rotate，新版写在 side_data_list 的 displaymatrix 里
+    rotate = video.get('tags', {}).get('rotate')
+    if rotate is None:
+        rotate = next((sd.get('rotation') for sd in video.get('side_data_list', []) if 'rotation' in sd), 0)
+    return int(float(rotate or 0)) % 360
+
+
+def ffprobe_video(path):
+    """调用 ffprobe 读取视频元数据，返回 dict；没有视频流时返回 None"""
+    cmd = [get_ffprobe_exe(), '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path]
+    result = supervisor.run(cmd, capture_output=True, text=True, encoding='utf-8', creationflags=NO_WINDOW)
+    data = json.loads(result.stdout)
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    if not video:
+        return None
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    fmt = data.get('format', {})
+    return {
+        "width": int(video.get('width', 0)),
+        "height": int(video.get('height', 0)),
+        "duration": float(fmt.get('duration', 0) or 0),
+        "vcodec": video.get('codec_name', ''),
+        "pix_fmt": video.get('pix_fmt', ''),
+        "acodec": audio.get('codec_name', '') if audio else '',
+        "rotation": _rotation(video),
+        "fps": _parse_rate(video.get('avg_frame_rate')) or _parse_rate(video.get('r_frame_rate')),
+        "bitrate": int(fmt.get('bit_rate', 0) or 0),
+    }
+
+
+def probe_video(path, use_cache=True):
+    """读取视频元数据：先查本地元数据缓存 (路径 + 大小 + 修改时间)，再直接解析容器头 (mediainfo)，
+    两者都拿不到时才启动 ffprobe"""
+    if not use_cache:
+        return read_header(path) or ffprobe_video(path)
+    from metacache import get_cache
+    cache = get_cache()
+    meta = cache.get(path)
+    if meta is None:
+        meta = read_header(path) or ffprobe_video(path)
+        if meta:
+            cache.put(path, meta)
+    return meta
+
+
+def choose_strategy(meta, target, filters=False, enabled=True):
+    """按探测结果为每路流选择处理方式：copy (直接复制) / transcode (重新编码) / none (无此流)。
+
+    视频只有在已是 H.264 yuv420p、分辨率正好等于目标、无旋转且没有 eq / 旋转等额外滤镜时才复制；
+    音频已是 AAC 就复制。两路都复制时整个任务就是一次重新封装。
+    """
+    if not enabled or not meta:
+        return {"video": "transcode", "audio": "transcode"}
+    video_copy = (not filters and meta.get('vcodec') == 'h264' and meta.get('pix_fmt') == 'yuv420p'
+                  and (meta.get('width'), meta.get('height')) == tuple(target) and not meta.get('rotation'))
+    acodec = meta.get('acodec')
+    audio = "none" if acodec == '' else ("copy" if acodec == 'aac' else "transcode")
+    return {"video": "copy" if video_copy else "transcode", "audio": audio}
+
+
+def audio_args(strategy):
+    return ['-c:a', 'copy'] if strategy['audio'] == "copy" else ['-c:a', 'aac', '-b:a', '192k']
+
+
+def output_path(file_path, config, suffix=None):
+    """分配并占住输出路径 (见 outputs.py)；ffmpeg 应写到 temp_path(输出)，成功后 commit，失败时 release"""
+    # 未指定 out_dir 时沿用原逻辑：源文件旁的 Converted_Videos 目录
+    out_dir = config.get('out_dir') or os.path.join(os.path.dirname(file_path), "Converted_Videos")
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    suffix = suffix or ("9-16" if config['mode'] == "9:16" else "16-9")
+    return get_allocator().reserve(out_dir, f"{base_name}_{suffix}")
+
+
+# 任务被 JobControl 取消时 on_error 收到的消息
+CANCELLED = "已取消"
+
+
+def _error_text(worker, returncode):
+    if worker.control is not None and worker.control.cancelled:
+        return CANCELLED
+    # 附上 stderr 最后一行，便于定位失败原因
+    last = worker.stderr_tail.splitlines()[-1] if worker.stderr_tail else ""
+    return f"FFmpeg Error {returncode}" + (f": {last}" if last else "")
+
+
+class VideoWorker:
+    """处理视频转换的逻辑类 (普通 Python 类，不继承 QRunnable)"""
+    def __init__(self, file_path, config, duration, meta=None):
+        self.file_path = file_path
+        self.config = config
+        self.duration = duration
+        self.meta = meta
+        # 有探测结果时决定每路流是复制还是重新编码 (config['passthrough'] = False 可强制全部重新编码)
+        self.strategy = choose_strategy(meta, self.target_size(), filters=has_pixel_filters(config),
+                                        enabled=config.get('passthrough', True))
+        # 定义回调函数
+        self.on_progress = None
+        self.on_fps = None
+        self.on_stats = None    # 结构化进度 (见 progress.ProgressParser)
+        self.on_start = None    # 确定输出路径、开始写文件前调用 on_start(output)
+        self.on_finished = None
+        self.on_error = None
+        self.control = None     # jobctl.JobControl：取消 / 暂停；被取消时 on_error 收到 CANCELLED
+        self.stderr_tail = ""
+
+    def output_path(self):
+        return output_path(self.file_path, self.config)
+
+    def target_size(self):
+        return target_size(self.config['mode'])
+
+    def build_filter(self):
+        # 滤镜链由 filtergraph 统一编译 (同配置同分辨率的文件共用缓存)
+        w, h = display_size(self.meta) if self.meta else (0, 0)
+        return compile_filter(self.config, w, h)
+
+    def build_command(self, output):
+        if self.strategy['video'] == "copy":
+            # 源已符合目标规格：视频直接复制，只处理音频 / 重新封装
+            video = ['-c:v', 'copy']
+        else:
+            video = ['-vf', self.build_filter(), '-c:v', 'libx264',
+                     '-preset', self.config.get('preset', 'ultrafast'),
+                     '-crf', str(self.config.get('crf', 23)),
+                     '-pix_fmt', 'yuv420p']
+        return [
+            get_ffmpeg_exe(), '-y', '-i', self.file_path,
+            *video, *audio_args(self.strategy),
+            '-map', '0:v?', '-map', '0:a?',
+            # 由调度器分配的编码线程数；未分配时保持原来的 0 (自动)
+            '-threads', str(self.config.get('threads', 0)), output
+        ]
+
+    def use_segments(self):
+        threshold = self.config.get('segment_threshold', SEGMENT_THRESHOLD)
+        return (self.strategy['video'] != "copy" and self.config.get('segment', True)
+                and threshold and self.duration >= threshold)
+
+    def _encode(self, output):
+        from progress import run_ffmpeg
+
+        def on_event(ev):
+            if self.on_fps and ev['fps']: self.on_fps(ev['fps'])
+            if self.on_stats: self.on_stats(ev)
+            if self.on_progress and self.duration > 0: self.on_progress(ev['percent'])
+
+        returncode, self.stderr_tail = run_ffmpeg(self.build_command(output), self.duration, on_event,
+                                                  control=self.control)
+        return returncode
+
+    def run(self):
+        output = None
+        try:
+            output = self.output_path()
+            if self.on_start: self.on_start(output)
+            # 先写临时文件，成功后才替换到输出路径上
+            if self.use_segments():
+                # 长视频：关键帧分段 → 并行编码 → concat 无损拼接
+                from segments import encode_segmented
+                returncode = encode_segmented(self.file_path, temp_path(output), self.build_filter(), self.duration,
+                                              self.config, self.on_progress, self.on_fps, self.on_stats,
+                                              audio=audio_args(self.strategy), control=self.control)
+            else:
+                returncode = self._encode(temp_path(output))
+            if returncode == 0:
+                get_allocator().commit(output)
+                if self.on_progress: self.on_progress(100)
+                if self.on_finished: self.on_finished(output)
+            else:
+                get_allocator().release(output)
+                if self.on_error: self.on_error(_error_text(self, returncode))
+        except Exception as e:
+            if output: get_allocator().release(output)
+            if self.on_error: self.on_error(CANCELLED if self.control and self.control.cancelled else str(e))
+
+
+class RenditionWorker:
+    """同一个源一次解码输出多个规格 (比如 9:16 + 16:9，或同一比例的两档 crf)。
+
+    specs 为输出规格列表，每项可含 mode / blur / blur_sigma / blur_downscale / crf / preset，
+    未给出的沿用 config；旋转、调色、out_dir、threads 取自 config，所有输出共用。
+    回调与 VideoWorker 相同，区别是 on_stats(index, ev) 带输出序号，on_finished 收到输出路径列表。
+    """
+    def __init__(self, file_path, specs, config, duration, meta=None):
+        self.file_path = file_path
+        self.specs = [dict(config, **spec) for spec in specs]
+        self.config = config
+        self.duration = duration
+        self.meta = meta
+        # 视频每个输出都要重新编码；音频仍按源决定是否复制
+        self.strategy = choose_strategy(meta, (0, 0), enabled=config.get('passthrough', True))
+        self.on_progress = None
+        self.on_fps = None
+        self.on_stats = None
+        self.on_start = None
+        self.on_finished = None
+        self.on_error = None
+        self.control = None
+        self.stderr_tail = ""
+
+    def suffixes(self):
+        """输出文件名后缀：比例相同的输出再用 crf 区分"""
+        names = []
+        for spec in self.specs:
+            name = "9-16" if spec['mode'] == "9:16" else "16-9"
+            if sum(1 for s in self.specs if s['mode'] == spec['mode']) > 1:
+                name += f"_crf{spec.get('crf', 23)}"
+                if spec.get('blur'):
+                    name += "_blur"
+            if name in names:
+                name += f"_{len(names)}"
+            names.append(name)
+        return names
+
+    def output_paths(self):
+        return [output_path(self.file_path, self.config, suffix) for suffix in self.suffixes()]
+
+    def build_command(self, outputs):
+        w, h = display_size(self.meta) if self.meta else (0, 0)
+        cmd = [get_ffmpeg_exe(), '-y', '-i', self.file_path,
+               '-filter_complex', compile_renditions(self.config, self.specs, w, h)]
+        # 调度器分给本任务的线程数由各输出的编码器平分 (0 表示由 x264 自动决定)
+        threads = self.config.get('threads', 0)
+        threads = max(1, threads // len(self.specs)) if threads else 0
+        for i, (spec, output) in enumerate(zip(self.specs, outputs)):
+            cmd += ['-map', f'[v{i}]', '-map', '0:a?', '-c:v', 'libx264',
+                    '-preset', spec.get('preset', 'ultrafast'), '-crf', str(spec.get('crf', 23)),
+                    '-pix_fmt', 'yuv420p', *audio_args(self.strategy), '-threads', str(threads), output]
+        return cmd
+
+    def run(self):
+        from progress import run_ffmpeg
+        allocator = get_allocator()
+        outputs = []
+        try:
+            outputs = self.output_paths()
+            if self.on_start: self.on_start(outputs)
+            temps = [temp_path(p) for p in outputs]
+
+            def on_event(ev):
+                if self.on_fps and ev['fps']: self.on_fps(ev['fps'])
+                if self.on_progress and self.duration > 0: self.on_progress(ev['percent'])
+                if self.on_stats:
+                    # 所有输出共用一次解码，进度一致；大小按各自文件实际写入量
+                    for i, output in enumerate(outputs):
+                        try:
+                            size = os.path.getsize(temps[i])
+                        except OSError:
+                            size = 0
+                        self.on_stats(i, dict(ev, total_size=size, output=output))
+
+            returncode, self.stderr_tail = run_ffmpeg(self.build_command(temps), self.duration, on_event,
+                                                      control=self.control)
+            if returncode == 0:
+                for output in outputs:
+                    allocator.commit(output)
+                if self.on_progress: self.on_progress(100)
+                if self.on_finished: self.on_finished(outputs)
+            else:
+                for output in outputs:
+                    allocator.release(output)
+                if self.on_error: self.on_error(_error_text(self, returncode))
+        except Exception as e:
+            for output in outputs:
+                allocator.release(output)
+            if self.on_error: self.on_error(CANCELLED if self.control and self.control.cancelled else str(e))